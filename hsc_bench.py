@@ -0,0 +1,374 @@
+import os
+import sys
+import click
+import traceback
+import json
+import time
+import tempfile
+import statistics
+from contextlib import contextmanager
+
+import hsc_deploy
+
+hsc_dir, _ = os.path.split(os.path.realpath(__file__))
+HSC_BENCH_REPORT_FILE = os.path.join(hsc_dir, "./hsc.bench.json")
+HSC_BENCH_SIZES = "10,100,1000"
+HSC_BENCH_REPEAT = 5
+HSC_BENCH_MACHINES_PER_CLUSTER = 10
+HSC_BENCH_NODES_PER_CHAIN = 10
+HSC_BENCH_COMMANDS_PER_SYSTEM_COMMAND = 10
+HSC_BENCH_STANDIN = "standin"
+
+QUIET_MODE = False
+
+
+def out_print(*args, **kwargs):
+    if not QUIET_MODE:
+        print(*args, **kwargs)
+
+
+def err_print(*args, **kwargs):
+    if not QUIET_MODE:
+        print(*args, file=sys.stderr, **kwargs)
+
+
+class Bench:
+    """
+    Seed HSC tables to a size and measure every public HSC function.
+    """
+    def __init__(self, aergo, hsc_address, node=None, repeat=HSC_BENCH_REPEAT):
+        self.aergo = aergo
+        self.hsc_address = hsc_address
+        self.node = node
+        self.repeat = repeat
+        self.address = str(aergo.account.address)
+        self.rows = {
+            'horde_users': 0,
+            'clusters': 0,
+            'machines': 0,
+            'chains': 0,
+            'nodes': 0,
+            'commands': 0,
+            'command_targets': 0,
+            'command_results': 0,
+        }
+        self.cmd_ids = []
+        self.records = {}
+
+    @contextmanager
+    def count_sql_steps(self):
+        """
+        Count SQLite VM steps of every contract on the stand-in node, gas
+        only counts Lua instructions and misses the cost of SQL.
+        :return: a list, which holds the count at the end
+        """
+        steps = [0]
+        if self.node is None:
+            steps[0] = None
+            yield steps
+            return
+
+        def count():
+            steps[0] += 1
+            return 0
+
+        dbs = [c.db for c in self.node.contracts.values()]
+        for db in dbs:
+            db.set_progress_handler(count, 1)
+        try:
+            yield steps
+        finally:
+            for db in dbs:
+                db.set_progress_handler(None, 1)
+
+    def _record(self, module, func_name, kind, elapsed, gas, sql_steps, tx_size, response):
+        key = "{}.{}".format(module, func_name)
+        if key not in self.records:
+            self.records[key] = {'kind': kind, 'latency': [], 'gas': [], 'sql_steps': [], 'tx_size': [],
+                                 'response_size': [], 'status': set()}
+        record = self.records[key]
+        record['latency'].append(elapsed * 1000)
+        if gas is not None:
+            record['gas'].append(gas)
+        if sql_steps is not None:
+            record['sql_steps'].append(sql_steps)
+        record['tx_size'].append(tx_size)
+        record['response_size'].append(len(response))
+        try:
+            record['status'].add(str(json.loads(response).get('__status_code')))
+        except (ValueError, AttributeError):
+            pass
+
+    def call(self, module, func_name, *args, record=True):
+        args = [module, func_name] + list(args)
+        with self.count_sql_steps() as steps:
+            start = time.time()
+            result = hsc_deploy.call_sc(self.aergo, self.hsc_address, 'callFunction', args)
+            elapsed = time.time() - start
+
+        response = result.detail or ''
+        for event in (result.event_list or []):
+            if event.name == 'HSC':
+                response = event.arguments[2]
+        if record:
+            self._record(module, func_name, 'call', elapsed, result.gas_used, steps[0],
+                         len(json.dumps(args)), response)
+        return json.loads(response) if response else None
+
+    def query(self, module, func_name, *args):
+        args = [module, func_name] + list(args)
+        with self.count_sql_steps() as steps:
+            start = time.time()
+            response = hsc_deploy.query_sc(self.aergo, self.hsc_address, 'queryFunction', args)
+            elapsed = time.time() - start
+
+        response = response.decode('utf-8')
+        gas = getattr(self.node, 'query_gas', None)
+        self._record(module, func_name, 'query', elapsed, gas, steps[0], len(json.dumps(args)), response)
+        return json.loads(response)
+
+    @staticmethod
+    def cluster_id(i):
+        return 'bench-cluster-{}'.format(i // HSC_BENCH_MACHINES_PER_CLUSTER)
+
+    @staticmethod
+    def machine_id(i):
+        return 'bench-machine-{}'.format(i)
+
+    def node_metadata(self, i):
+        return {
+            'cluster': {'id': self.cluster_id(i)},
+            'machine': {'id': self.machine_id(i)},
+        }
+
+    def seed(self, size):
+        """
+        Grow tables to 'size' machines, nodes, and commands (with results).
+        """
+        if self.rows['horde_users'] == 0:
+            self.call('__HSC_USER__', 'createUser', 'bench-user', self.address, '{}', record=False)
+            self.rows['horde_users'] = 1
+
+        for i in range(self.rows['machines'], size):
+            if i % HSC_BENCH_MACHINES_PER_CLUSTER == 0:
+                self.call('__HSC_SPACE_COMPUTING__', 'addCluster', self.cluster_id(i),
+                          self.cluster_id(i), i % 2 == 0, '{}', record=False)
+                self.rows['clusters'] += 1
+            self.call('__HSC_SPACE_COMPUTING__', 'addMachine', self.cluster_id(i), self.machine_id(i),
+                      self.machine_id(i), '{}', record=False)
+            self.rows['machines'] += 1
+
+        for i in range(self.rows['nodes'], size):
+            chain_id = 'bench-chain-{}'.format(i // HSC_BENCH_NODES_PER_CHAIN)
+            if i % HSC_BENCH_NODES_PER_CHAIN == 0:
+                self.call('__HSC_SPACE_BLOCKCHAIN__', 'createChain', chain_id, chain_id,
+                          i % 2 == 0, '{}', record=False)
+                self.rows['chains'] += 1
+            self.call('__HSC_SPACE_BLOCKCHAIN__', 'createNode', chain_id, 'bench-node-{}'.format(i),
+                      'bench-node-{}'.format(i), json.dumps(self.node_metadata(i)), record=False)
+            self.rows['nodes'] += 1
+
+        for i in range(len(self.cmd_ids), size):
+            if i % HSC_BENCH_COMMANDS_PER_SYSTEM_COMMAND == 0:
+                # a system command has no target
+                self.call('__HSC_COMMAND__', 'addCommand', 'bench-system', '{}', '[]', record=False)
+                self.rows['commands'] += 1
+                self.rows['command_targets'] += 1
+
+            target_list = [{'target_index': 0, 'cluster_id': self.cluster_id(i), 'machine_id': self.machine_id(i)}]
+            res = self.call('__HSC_COMMAND__', 'addCommand', 'bench', '{}', json.dumps(target_list),
+                            record=False)
+            self.cmd_ids.append(res['cmd_id'])
+            self.call('__HSC_COMMAND__', 'addCommandResult', res['cmd_id'], self.cluster_id(i),
+                      self.machine_id(i), 0, '{}', record=False)
+            self.rows['commands'] += 1
+            self.rows['command_targets'] += 1
+            self.rows['command_results'] += 1
+
+    def measure(self, size):
+        """
+        Run every public function 'repeat' times on the current tables.
+        """
+        self.records = {}
+        i = size - 1
+        cluster_id = self.cluster_id(i)
+        machine_id = self.machine_id(i)
+        chain_id = 'bench-chain-{}'.format(i // HSC_BENCH_NODES_PER_CHAIN)
+        cmd_id = self.cmd_ids[-1]
+
+        for _ in range(self.repeat):
+            self.query('__HSC_USER__', 'findUser', self.address)
+            self.query('__HSC_USER__', 'getUser', 'bench-user')
+            self.query('__HSC_SPACE_COMPUTING__', 'getPublicClusters')
+            self.query('__HSC_SPACE_COMPUTING__', 'getAllClusters', self.address)
+            self.query('__HSC_SPACE_COMPUTING__', 'getCluster', cluster_id)
+            self.query('__HSC_SPACE_COMPUTING__', 'getAllMachines', cluster_id)
+            self.query('__HSC_SPACE_COMPUTING__', 'getMachine', cluster_id, machine_id)
+            self.query('__HSC_SPACE_BLOCKCHAIN__', 'getPublicChains')
+            self.query('__HSC_SPACE_BLOCKCHAIN__', 'getAllChains', self.address)
+            self.query('__HSC_SPACE_BLOCKCHAIN__', 'getChain', chain_id)
+            self.query('__HSC_SPACE_BLOCKCHAIN__', 'getAllNodes', chain_id)
+            self.query('__HSC_SPACE_BLOCKCHAIN__', 'getNode', chain_id, 'bench-node-{}'.format(i))
+            self.query('__HSC_COMMAND__', 'getSystemCommands')
+            self.query('__HSC_COMMAND__', 'getCommand', cmd_id)
+            self.query('__HSC_COMMAND__', 'getCommandsOfTarget', cluster_id, machine_id)
+            self.query('__HSC_COMMAND__', 'getCommandsOfTargetSince', cluster_id, machine_id, 0)
+            self.query('__HSC_COMMAND__', 'getCommandsOfTargetSince', cluster_id, None, 0)
+            self.query('__HSC_SPACE_COMPUTING__', 'getOwners',
+                       [{'cluster_id': cluster_id, 'machine_id': machine_id}, {'cluster_id': cluster_id}])
+            self.query('__HSC_COMMAND__', 'getCommandResult', cmd_id)
+
+        for n in range(self.repeat):
+            # write functions on new rows, which are removed at the end
+            user_id = 'bench-user-{}-{}'.format(size, n)
+            new_cluster_id = 'bench-cluster-{}-{}'.format(size, n)
+            new_machine_id = 'bench-machine-{}-{}'.format(size, n)
+            new_chain_id = 'bench-chain-{}-{}'.format(size, n)
+            new_node_id = 'bench-node-{}-{}'.format(size, n)
+            node_metadata = {'cluster': {'id': new_cluster_id}, 'machine': {'id': new_machine_id}}
+            target_list = [{'target_index': 0, 'cluster_id': new_cluster_id, 'machine_id': new_machine_id}]
+
+            self.call('__HSC_USER__', 'createUser', user_id, self.address, '{}')
+            self.call('__HSC_USER__', 'updateUser', user_id, self.address, '{"bench": true}')
+            self.call('__HSC_SPACE_COMPUTING__', 'addCluster', new_cluster_id, new_cluster_id, True, '{}')
+            self.call('__HSC_SPACE_COMPUTING__', 'updateCluster', new_cluster_id, new_cluster_id, True,
+                      '{"bench": true}')
+            self.call('__HSC_SPACE_COMPUTING__', 'addMachine', new_cluster_id, new_machine_id,
+                      new_machine_id, '{}')
+            self.call('__HSC_SPACE_COMPUTING__', 'updateMachine', new_cluster_id, new_machine_id,
+                      new_machine_id, '{"bench": true}')
+            self.call('__HSC_SPACE_BLOCKCHAIN__', 'createChain', new_chain_id, new_chain_id, True, '{}')
+            self.call('__HSC_SPACE_BLOCKCHAIN__', 'createNode', new_chain_id, new_node_id, new_node_id,
+                      json.dumps(node_metadata))
+            self.call('__HSC_SPACE_BLOCKCHAIN__', 'updateChain', new_chain_id, new_chain_id, True,
+                      json.dumps({'node_list': [{'node_metadata': node_metadata}]}))
+            self.call('__HSC_SPACE_BLOCKCHAIN__', 'updateNode', new_chain_id, new_node_id, new_node_id,
+                      json.dumps(node_metadata))
+            res = self.call('__HSC_COMMAND__', 'addCommand', 'bench', '{}', json.dumps(target_list))
+            new_cmd_id = res.get('cmd_id', '')
+            self.call('__HSC_COMMAND__', 'addCommandResult', new_cmd_id, new_cluster_id, new_machine_id, 0,
+                      '{"bench": true}')
+            self.call('__HSC_COMMAND__', 'updateTarget', new_cmd_id, new_cluster_id, new_machine_id, 0, 'DONE')
+            self.call('__HSC_SPACE_BLOCKCHAIN__', 'deleteNode', new_chain_id, new_node_id)
+            self.call('__HSC_SPACE_BLOCKCHAIN__', 'deleteChain', new_chain_id)
+            self.call('__HSC_SPACE_COMPUTING__', 'dropMachine', new_cluster_id, new_machine_id)
+            self.call('__HSC_SPACE_COMPUTING__', 'dropCluster', new_cluster_id)
+            self.call('__HSC_USER__', 'deleteUser', user_id, self.address)
+
+        return summarize(self.records)
+
+
+def summarize(records):
+    functions = {}
+    for key, record in sorted(records.items()):
+        latency = record['latency']
+        functions[key] = {
+            'kind': record['kind'],
+            'latency_ms': {
+                'min': round(min(latency), 3),
+                'median': round(statistics.median(latency), 3),
+                'max': round(max(latency), 3),
+            },
+            'gas': int(statistics.median(record['gas'])) if record['gas'] else None,
+            'sql_steps': int(statistics.median(record['sql_steps'])) if record['sql_steps'] else None,
+            'tx_size': int(statistics.median(record['tx_size'])),
+            'response_size': int(statistics.median(record['response_size'])),
+            'status': sorted(record['status']),
+        }
+    return functions
+
+
+def print_summary(size, functions):
+    out_print("Size: {}".format(size))
+    out_print("  {:<48} {:>6} {:>10} {:>10} {:>10} {:>10}".format('function', 'kind', 'ms', 'gas', 'sql',
+                                                                  'bytes'))
+    for key, f in functions.items():
+        out_print("  {:<48} {:>6} {:>10} {:>10} {:>10} {:>10}".format(
+            key, f['kind'], f['latency_ms']['median'],
+            '-' if f['gas'] is None else f['gas'],
+            '-' if f['sql_steps'] is None else f['sql_steps'],
+            f['response_size']))
+    out_print()
+
+
+def connect(target, exported_key, password, work_dir):
+    """
+    Deploy a new HSC for the benchmark, not to touch the HSC in use.
+    :return: (client, HSC address, stand-in node or None)
+    """
+    if target == HSC_BENCH_STANDIN:
+        try:
+            import hsc_standin
+        except ImportError as e:
+            raise ImportError("the stand-in node needs lupa of the dev packages (pipenv install --dev), "
+                              "or set --target: {}".format(e))
+        node = hsc_standin.StandinNode()
+        aergo, hsc_address = hsc_standin.deploy_hsc(node, work_dir)
+        return aergo, hsc_address, node
+
+    aergo = hsc_deploy.check_aergo_conn_info(target, exported_key, password)
+    aergo.get_account()
+    hsc_address = hsc_deploy.hsc_deploy(aergo=aergo,
+                                        compiled_payload_file_path=hsc_deploy.HSC_COMPILED_PAYLOAD_DATA_FILE,
+                                        deployed_payload_file_path=os.path.join(work_dir,
+                                                                                'hsc.deployed.payload.dat'))
+    return aergo, hsc_address, None
+
+
+def hsc_bench(aergo, hsc_address, sizes, repeat=HSC_BENCH_REPEAT, node=None):
+    bench = Bench(aergo, hsc_address, node=node, repeat=repeat)
+    report = {
+        'repeat': repeat,
+        'sizes': [],
+    }
+    for size in sorted(sizes):
+        out_print("Seeding {} rows".format(size))
+        start = time.time()
+        bench.seed(size)
+        out_print("  > seeded in {:.1f} seconds".format(time.time() - start))
+
+        functions = bench.measure(size)
+        print_summary(size, functions)
+        report['sizes'].append({
+            'size': size,
+            'rows': dict(bench.rows),
+            'functions': functions,
+        })
+    return report
+
+
+@click.command()
+@click.option('--target', default=HSC_BENCH_STANDIN,
+              help='target AERGO to benchmark, or "standin" for the local stand-in node')
+@click.option('--exported-key', help='the exported/encrypted key')
+@click.option('--password', help='the password of the exported/encrypted key')
+@click.option('--sizes', default=HSC_BENCH_SIZES,
+              help='comma separated numbers of machines/nodes/commands to seed')
+@click.option('--repeat', default=HSC_BENCH_REPEAT, type=int, help='the number of runs for each function')
+@click.option('--output', default=HSC_BENCH_REPORT_FILE, help='the JSON report file')
+def main(target, exported_key, password, sizes, repeat, output):
+    sizes = [int(s) for s in sizes.split(',') if s.strip()]
+
+    aergo = None
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            aergo, hsc_address, node = connect(target, exported_key, password, work_dir)
+            report = hsc_bench(aergo, hsc_address, sizes, repeat=repeat, node=node)
+
+        report['target'] = target
+        with open(output, 'w') as f:
+            f.write(json.dumps(report, indent=2, sort_keys=True))
+            f.write('\n')
+        out_print("Report: {}".format(output))
+    except Exception as e:
+        err_print(e)
+        if not QUIET_MODE:
+            traceback.print_exception(*sys.exc_info())
+        sys.exit(1)
+    finally:
+        if aergo is not None:
+            aergo.disconnect()
+
+
+if __name__ == '__main__':
+    main()
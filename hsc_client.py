@@ -0,0 +1,514 @@
+import asyncio
+import json
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import aergo.herapy as herapy
+from aergo.herapy.errors.exception import CommunicationException
+
+import hsc_deploy
+import hsc_trace
+
+HSC_CLIENT_MAX_WORKERS = 32
+HSC_CLIENT_POOL_SIZE = 8
+HSC_CLIENT_POOL_TIMEOUT = 30
+HSC_CLIENT_HEALTH_CHECK_INTERVAL = 30
+HSC_QUERY_CACHE_SIZE = 1024
+HSC_QUERY_CACHE_HEIGHT_INTERVAL = 0.2
+HSC_CLIENT_PAGE_SIZE = 100
+HSC_COMMAND_POLL_INTERVAL = 1.0
+HSC_EVENT_NAME = "HSC"
+
+
+class HscError(Exception):
+    """
+    An error response of HSC: '__status_code' is not 2xx.
+    The whole decoded response is kept in 'response'.
+    """
+    def __init__(self, response):
+        self.response = response
+        self.status_code = int(response.get("__status_code", 0))
+        self.status_sub_code = response.get("__status_sub_code", "")
+        self.err_msg = response.get("__err_msg", "")
+        super().__init__("[{0}] {1}: {2}".format(self.status_code,
+                                                 response.get("__func_name", ""),
+                                                 self.err_msg))
+
+
+class HscBadRequest(HscError):
+    pass
+
+
+class HscForbidden(HscError):
+    pass
+
+
+class HscNotFound(HscError):
+    pass
+
+
+HSC_ERRORS = {
+    400: HscBadRequest,
+    403: HscForbidden,
+    404: HscNotFound,
+}
+
+
+def decode_response(raw):
+    """
+    Decode a response of 'callFunction'/'queryFunction' and raise HscError
+    (or its subclass by the status code) when it is an error.
+    """
+    if isinstance(raw, (bytes, bytearray)):
+        raw = raw.decode('utf-8')
+    if isinstance(raw, str):
+        response = json.loads(raw)
+    else:
+        response = raw
+
+    if not isinstance(response, dict) or "__status_code" not in response:
+        return response
+
+    status_code = int(response["__status_code"])
+    if status_code < 200 or status_code >= 300:
+        raise HSC_ERRORS.get(status_code, HscError)(response)
+    return response
+
+
+def get_tx_response(tx_result):
+    """
+    Get the response of 'callFunction' from the receipt. 'callFunction' emits
+    the response as the "HSC" event, so the event is used when the receipt
+    doesn't have a return value.
+    """
+    if tx_result.detail:
+        return tx_result.detail
+    for event in (tx_result.event_list or []):
+        if event.name == HSC_EVENT_NAME and len(event.arguments) >= 3:
+            return event.arguments[2]
+    raise RuntimeError("cannot find the response of TX ({0})".format(tx_result.tx_id))
+
+
+class AsyncHscClient:
+    """
+    An asyncio client of HSC.
+    herapy is blocking, so every request runs on a thread pool and many
+    queries and TX confirmations can be in-flight at once. Only the TX
+    submissions are serialized to keep the account nonce consecutive.
+    """
+    def __init__(self, aergo, hsc_address, max_workers=HSC_CLIENT_MAX_WORKERS, waiting_time=None):
+        self.aergo = aergo
+        self.hsc_address = hsc_address
+        self.waiting_time = waiting_time
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._nonce_lock = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, lambda: func(*args, **kwargs))
+
+    async def query(self, module, func_name, *args):
+        if isinstance(self.aergo, HscClient) and self.aergo.hsc_address == self.hsc_address:
+            # use its query cache
+            return await self._run(self.aergo.query, module, func_name, *args)
+        raw = await self._run(hsc_deploy.query_sc, self.aergo, self.hsc_address, 'queryFunction',
+                              [module, func_name] + list(args))
+        return decode_response(raw)
+
+    async def submit(self, module, func_name, *args):
+        # an asyncio.Lock is bound to the loop running it, so create it lazily
+        if self._nonce_lock is None:
+            self._nonce_lock = asyncio.Lock()
+
+        args = [module, func_name] + list(args)
+        async with self._nonce_lock:
+            tx, result = await self._run(self.aergo.call_sc, self.hsc_address, 'callFunction', args=args)
+            if result.status != herapy.CommitStatus.TX_OK:
+                # the local nonce can be out of sync, reload it for the next TX
+                await self._run(self.aergo.get_account)
+                raise RuntimeError("[{0}]: {1}".format(result.status, result.detail))
+        hsc_trace.submitted(tx.tx_hash, 'call', module, func_name, hsc_trace.get_call_size('callFunction', args))
+        return tx.tx_hash
+
+    async def wait_tx_result(self, tx_hash):
+        # the backoff of hsc_deploy.wait_tx_result, on a thread of the pool
+        return await self._run(hsc_deploy.wait_tx_result, self.aergo, tx_hash, self.waiting_time)
+
+    async def query_pages(self, module, func_name, *args, page_size=HSC_CLIENT_PAGE_SIZE):
+        # same as HscClient.query_pages
+        cursor = None
+        while True:
+            try:
+                page = await self.query(module, func_name, *args, page_size, cursor)
+            except HscNotFound:
+                if cursor is None:
+                    raise
+                return
+            yield page
+            cursor = page.get('next_cursor')
+            if not cursor:
+                return
+
+    async def call(self, module, func_name, *args):
+        tx_hash = await self.submit(module, func_name, *args)
+        result = await self.wait_tx_result(tx_hash)
+        hsc_trace.confirmed(tx_hash, result, hsc_trace.get_response_size(result))
+        if result.status != herapy.TxResultStatus.SUCCESS:
+            raise RuntimeError("[{0}]:{1}: {2}".format(result.contract_address, result.status, result.detail))
+        if isinstance(self.aergo, HscClient) and self.aergo.query_cache is not None:
+            self.aergo.query_cache.on_events(result.event_list)
+        return decode_response(get_tx_response(result))
+
+
+class QueryCache:
+    """
+    A LRU cache of query results. HSC state changes only in a new block, so
+    a result is valid while the best block height is the same. All entries
+    are dropped when the height advances, and entries of a module are
+    dropped when an "HSC" event of the module is seen.
+    """
+    def __init__(self, max_size=HSC_QUERY_CACHE_SIZE, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.height = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _update_height(self, height):
+        if self.height is None or height > self.height:
+            self._entries.clear()
+            self.height = height
+
+    def get(self, key, height):
+        """
+        :return: (True, value) or (False, None) if not cached
+        """
+        with self._lock:
+            self._update_height(height)
+            entry = self._entries.get(key)
+            if entry is not None and height == entry[0] \
+                    and (self.ttl is None or time.time() - entry[1] < self.ttl):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, entry[2]
+            self._entries.pop(key, None)
+            self.misses += 1
+            return False, None
+
+    def put(self, key, height, value):
+        with self._lock:
+            self._update_height(height)
+            if height != self.height:
+                # it is already old
+                return
+            self._entries[key] = (height, time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate_module(self, module):
+        # key = (contract, module, function, args)
+        with self._lock:
+            for key in [key for key in self._entries if key[1] == module]:
+                del self._entries[key]
+
+    def on_events(self, event_list):
+        for event in (event_list or []):
+            if event.name == HSC_EVENT_NAME and len(event.arguments) > 0:
+                self.invalidate_module(event.arguments[0])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def is_broken(e):
+    # an unknown TX isn't a connection problem, it is polled again
+    return 'not found' not in str(e)
+
+
+class HscConnection:
+    """
+    A connection to one of the Aergo endpoints. It is checked with
+    'get_blockchain_status' when it has been idle for a while, and a broken
+    one is reconnected, trying the next endpoint if it fails.
+    """
+    def __init__(self, targets, index=0, new_aergo=herapy.Aergo):
+        self.targets = targets
+        self.index = index
+        self.new_aergo = new_aergo
+        self.aergo = None
+        self.target = None
+        self.last_used = 0
+        self.broken = False
+
+    def connect(self):
+        self.close()
+        error = None
+        for i in range(len(self.targets)):
+            target = self.targets[(self.index + i) % len(self.targets)]
+            try:
+                aergo = self.new_aergo()
+                aergo.connect(target)
+                aergo.get_blockchain_status()
+            except Exception as e:
+                error = e
+                continue
+            self.aergo = aergo
+            self.target = target
+            self.last_used = time.time()
+            self.broken = False
+            return self.aergo
+        raise ConnectionError("cannot connect to any of {0}: {1}".format(self.targets, error))
+
+    def check(self, interval=HSC_CLIENT_HEALTH_CHECK_INTERVAL):
+        if self.aergo is None or self.broken:
+            return self.connect()
+        if time.time() - self.last_used >= interval:
+            try:
+                self.aergo.get_blockchain_status()
+            except Exception:
+                return self.connect()
+        return self.aergo
+
+    def close(self):
+        if self.aergo is not None:
+            try:
+                self.aergo.disconnect()
+            except Exception:
+                pass
+            self.aergo = None
+
+
+class HscClient:
+    """
+    A long-lived client owning a bounded pool of connections to one or more
+    Aergo endpoints. Queries borrow any connection of the pool. TXs need the
+    account and its nonce, so they use a single signer connection one by one.
+
+    It has the same 'query_sc'/'call_sc'/'get_tx_result'/'get_account' as
+    herapy.Aergo, so it can be used by AsyncHscClient and hsc_deploy helpers.
+
+    With 'query_cache', results of 'query' are cached for the best block
+    height, which is read at most once per 'height_interval' seconds.
+    """
+    def __init__(self, targets, hsc_address=None, exported_key=None, password=None,
+                 pool_size=HSC_CLIENT_POOL_SIZE, pool_timeout=HSC_CLIENT_POOL_TIMEOUT,
+                 new_aergo=herapy.Aergo, query_cache=None,
+                 height_interval=HSC_QUERY_CACHE_HEIGHT_INTERVAL):
+        if isinstance(targets, str):
+            targets = [targets]
+        self.targets = list(targets)
+        self.hsc_address = hsc_address
+        self.exported_key = exported_key
+        self.password = password
+        self.pool_timeout = pool_timeout
+        self.new_aergo = new_aergo
+        self.query_cache = query_cache
+        self.height_interval = height_interval
+        self._height = None
+        self._height_time = 0
+        self._height_lock = threading.Lock()
+
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        for i in range(pool_size):
+            # connect lazily when it is used at first
+            self._pool.put(HscConnection(self.targets, index=i, new_aergo=new_aergo))
+        self._connections = list(self._pool.queue)
+        self._signer = None
+        self._account = None
+        self._signer_lock = threading.RLock()
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @contextmanager
+    def connection(self):
+        if self._closed:
+            raise RuntimeError("HscClient is closed")
+        try:
+            conn = self._pool.get(timeout=self.pool_timeout)
+        except queue.Empty:
+            raise TimeoutError("no available connection in {0} seconds".format(self.pool_timeout))
+        try:
+            aergo = conn.check()
+            try:
+                yield aergo
+            except CommunicationException as e:
+                conn.broken = is_broken(e)
+                raise
+            conn.last_used = time.time()
+        finally:
+            self._pool.put(conn)
+
+    @contextmanager
+    def signer(self):
+        if self._closed:
+            raise RuntimeError("HscClient is closed")
+        if self.exported_key is None:
+            raise RuntimeError("HscClient needs an exported key to send TXs")
+        with self._signer_lock:
+            if self._signer is None:
+                self._signer = HscConnection(self.targets, new_aergo=self.new_aergo)
+            conn = self._signer
+            if conn.aergo is None or conn.broken:
+                aergo = conn.connect()
+                # the account is imported once, then only its state is reloaded
+                if self._account is None:
+                    self._account = aergo.import_account(exported_data=self.exported_key,
+                                                         password=self.password)
+                else:
+                    aergo.account = self._account
+                    aergo.get_account()
+            else:
+                aergo = conn.check()
+            try:
+                yield aergo
+            except CommunicationException as e:
+                conn.broken = is_broken(e)
+                raise
+            conn.last_used = time.time()
+
+    def _read(self, func_name, *args, **kwargs):
+        # reads are idempotent, so retry once with a reconnected connection
+        for retry in (True, False):
+            try:
+                with self.connection() as aergo:
+                    return getattr(aergo, func_name)(*args, **kwargs)
+            except CommunicationException as e:
+                if not retry or not is_broken(e):
+                    raise
+
+    def query_sc(self, sc_address, func_name, args=None):
+        return self._read('query_sc', sc_address, func_name, args=args)
+
+    def get_tx_result(self, tx_hash):
+        return self._read('get_tx_result', tx_hash)
+
+    def call_sc(self, sc_address, func_name, args=None):
+        with self.signer() as aergo:
+            return aergo.call_sc(sc_address, func_name, args=args)
+
+    def get_account(self):
+        with self.signer() as aergo:
+            return aergo.get_account()
+
+    def get_best_height(self):
+        with self._height_lock:
+            if self._height is None or time.time() - self._height_time >= self.height_interval:
+                _, height = self._read('get_blockchain_status')
+                self._height = height
+                self._height_time = time.time()
+            return self._height
+
+    def query(self, module, func_name, *args):
+        args = [module, func_name] + list(args)
+        if self.query_cache is None:
+            return decode_response(hsc_deploy.query_sc(self, self.hsc_address, 'queryFunction', args))
+
+        # the height is read before the query, so a result is never newer than its height
+        key = (self.hsc_address, module, func_name, json.dumps(args[2:]))
+        height = self.get_best_height()
+        hit, raw = self.query_cache.get(key, height)
+        if not hit:
+            raw = hsc_deploy.query_sc(self, self.hsc_address, 'queryFunction', args)
+            self.query_cache.put(key, height, raw)
+        return decode_response(raw)
+
+    def query_pages(self, module, func_name, *args, page_size=HSC_CLIENT_PAGE_SIZE):
+        """
+        Iterate pages of a list function (e.g. getCommandsOfTarget) lazily,
+        a page is read only when it is needed. 'page_size' and the cursor
+        are passed after 'args', so all arguments before them must be given.
+        The first page raises HscNotFound when the list is empty.
+        """
+        cursor = None
+        while True:
+            try:
+                page = self.query(module, func_name, *args, page_size, cursor)
+            except HscNotFound:
+                # rows of the next page are deleted
+                if cursor is None:
+                    raise
+                return
+            yield page
+            cursor = page.get('next_cursor')
+            if not cursor:
+                return
+
+    def call(self, module, func_name, *args):
+        result = hsc_deploy.call_sc(self, self.hsc_address, 'callFunction', [module, func_name] + list(args))
+        if self.query_cache is not None:
+            self.query_cache.on_events(result.event_list)
+        return decode_response(get_tx_response(result))
+
+    def close(self):
+        self._closed = True
+        for conn in self._connections:
+            conn.close()
+        with self._signer_lock:
+            if self._signer is not None:
+                self._signer.close()
+
+
+class CommandPoller:
+    """
+    Poll new commands and target status changes of a cluster (or a machine)
+    with 'getCommandsOfTargetSince'. It keeps the block height watermark of
+    the last poll, so every poll reads only what changed after it.
+    Save 'watermark' to resume polling after a restart.
+    """
+    def __init__(self, client, cluster_id, machine_id=None, watermark=0, page_size=HSC_CLIENT_PAGE_SIZE):
+        self.client = client
+        self.cluster_id = cluster_id
+        self.machine_id = machine_id
+        self.watermark = watermark
+        self.page_size = page_size
+
+    def poll(self):
+        """
+        :return: list of commands (a row per target) changed after the
+                 watermark, in the order of status_block_no
+        """
+        cmd_list = []
+        watermark = self.watermark
+        for page in self.client.query_pages('__HSC_COMMAND__', 'getCommandsOfTargetSince',
+                                            self.cluster_id, self.machine_id or '', self.watermark,
+                                            page_size=self.page_size):
+            cmd_list.extend(page.get('cmd_list') or [])
+            watermark = page.get('watermark', watermark)
+        self.watermark = watermark
+        return cmd_list
+
+    def watch(self, interval=HSC_COMMAND_POLL_INTERVAL):
+        """
+        Yield every non-empty result of 'poll', forever.
+        """
+        while True:
+            cmd_list = self.poll()
+            if cmd_list:
+                yield cmd_list
+            else:
+                time.sleep(interval)
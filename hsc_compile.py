@@ -1,18 +1,45 @@
 import os
 import sys
+import click
 import traceback
 import subprocess
 import json
 import time
+import hashlib
+import shutil
+import tempfile
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    INotify = None
 
 HSC_VERSION="v0.1.2"
 HSC_COMPILE_TIME = time.time()
 
+HSC_PROFILE_DEBUG = "debug"
+HSC_PROFILE_RELEASE = "release"
+HSC_PROFILES = [HSC_PROFILE_DEBUG, HSC_PROFILE_RELEASE]
+HSC_PROFILE = HSC_PROFILE_DEBUG
+
 _MANIFEST = '_manifest.lua'
 _MANIFEST_DB = '_manifest_db.lua'
 
 hsc_dir, _ = os.path.split(os.path.realpath(__file__))
 HSC_COMPILED_PAYLOAD_DATA_FILE = os.path.join(hsc_dir, "./hsc.compiled.payload.dat")
+HSC_COMPILED_PAYLOAD_STORE_DIR = "hsc.compiled.payloads"
+HSC_AERGO_LUAC_STATE_FILE = os.path.join(hsc_dir, "./hsc.aergoluac.dat")
+HSC_SOURCE_INDEX_FILE = os.path.join(hsc_dir, "./hsc.source.index.dat")
+
+AERGO_LUAC_FLAGS = ["--payload"]
+AERGO_LUAC_SEARCH_DEPTH = 6
+AERGO_LUAC_SEARCH_DIRS = 5000
+
+HSC_WATCH_INTERVAL = 0.5
+HSC_WATCH_DEBOUNCE = 0.3
 
 g_aergo_path = ""
 g_aergo_luac_path = ""
@@ -31,24 +58,67 @@ def err_print(*args, **kwargs):
 
 
 def exit(error=True):
+    # the payload info is written atomically, so keep it for the next run
     if error:
-        try:
-            os.remove(HSC_COMPILED_PAYLOAD_DATA_FILE)
-        except FileNotFoundError:
-            pass
         sys.exit(1)
 
     sys.exit(0)
 
 
-def get_all_lua_files(dir, files):
+def read_source_index():
+    if os.path.isfile(HSC_SOURCE_INDEX_FILE):
+        with open(HSC_SOURCE_INDEX_FILE) as f:
+            try:
+                return json.load(f)
+            except ValueError:
+                pass
+    return {}
+
+
+def write_source_index(index):
+    write_atomic(HSC_SOURCE_INDEX_FILE, json.dumps(index, indent=2))
+
+
+def scan_lua_files(dir, prev_index=None):
+    """
+    Walk 'dir' once and index all Lua modules by file name.
+    A module is read and hashed again only if its path, mtime or size differs
+    from 'prev_index'.
+    :return: (index, added, changed, removed)
+    """
+    if prev_index is None:
+        prev_index = {}
+
+    index = {}
     for dirpath, dirnames, filenames in os.walk(dir):
-        for fn in filenames:
-            file_name, file_ext = os.path.splitext(fn)
-            if file_ext == '.lua':
-                files[fn] = os.path.join(dirpath, fn)
-        for dn in dirnames:
-            get_all_lua_files(os.path.join(dirpath, dn), files)
+        dirnames.sort()
+        for fn in sorted(filenames):
+            if os.path.splitext(fn)[1] != '.lua':
+                continue
+            path = os.path.abspath(os.path.join(dirpath, fn))
+            st = os.stat(path)
+
+            prev = prev_index.get(fn)
+            if prev is not None and prev.get('path') == path \
+                    and prev.get('mtime') == st.st_mtime_ns \
+                    and prev.get('size') == st.st_size:
+                src_hash = prev['hash']
+            else:
+                src_hash = get_src_hash(path)
+
+            index[fn] = {
+                'path': path,
+                'mtime': st.st_mtime_ns,
+                'size': st.st_size,
+                'hash': src_hash,
+            }
+
+    added = sorted(fn for fn in index if fn not in prev_index)
+    changed = sorted(fn for fn in index
+                     if fn in prev_index and index[fn]['hash'] != prev_index[fn].get('hash'))
+    removed = sorted(fn for fn in prev_index if fn not in index)
+
+    return index, added, changed, removed
 
 
 def check_aergo_path():
@@ -61,40 +131,192 @@ def check_aergo_path():
     elif 'GOPATH' in os.environ:
         g_aergo_path = (os.environ['GOPATH'])
     else:
-        raise FileNotFoundError("Cannot find AERGO_PATH")
+        g_aergo_path = ""
 
-    out_print("  > AERGO_PATH: ", g_aergo_path)
+    if 0 != len(g_aergo_path):
+        out_print("  > AERGO_PATH: ", g_aergo_path)
 
 
-def search_file(dir):
-    global g_aergo_luac_path
+def is_aergo_luac(path):
+    return os.path.isfile(path) and os.access(path, os.X_OK)
+
 
+def read_aergo_luac_state():
+    # return the cached 'aergoluac' path only if the binary is unchanged
     try:
-        files = os.listdir(dir)
-        for file in files:
-            full = os.path.join(dir, file)
-            if os.path.isdir(full):
-                search_file(full)
-            else:
-                if file == "aergoluac":
-                    g_aergo_luac_path = full
-                    return
-    except PermissionError:
+        with open(HSC_AERGO_LUAC_STATE_FILE) as f:
+            state = json.load(f)
+        path = state['path']
+        st = os.stat(path)
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+    if st.st_size != state.get('size') or st.st_mtime_ns != state.get('mtime'):
+        return None
+    if not is_aergo_luac(path):
+        return None
+    return path
+
+
+def write_aergo_luac_state(path):
+    st = os.stat(path)
+    state = {
+        'path': path,
+        'size': st.st_size,
+        'mtime': st.st_mtime_ns,
+    }
+    try:
+        write_atomic(HSC_AERGO_LUAC_STATE_FILE, json.dumps(state, indent=2))
+    except OSError:
+        # it is only a cache
         pass
 
 
+def get_aergo_luac_candidates():
+    # well-known locations of 'aergoluac'
+    candidates = []
+    if 0 != len(g_aergo_path):
+        candidates.append(g_aergo_path)
+        candidates.append(os.path.join(g_aergo_path, 'bin'))
+    for go_path in [os.getenv('GOPATH'), os.path.expanduser('~/go')]:
+        if go_path is None or 0 == len(go_path):
+            continue
+        candidates.append(os.path.join(go_path, 'bin'))
+        candidates.append(os.path.join(go_path, 'src', 'github.com', 'aergoio', 'aergo', 'bin'))
+    return [os.path.join(d, "aergoluac") for d in candidates]
+
+
+def search_file(dir, max_depth=AERGO_LUAC_SEARCH_DEPTH, max_dirs=AERGO_LUAC_SEARCH_DIRS):
+    # breadth-first, so 'bin' directories near the top are found at first
+    queue = deque([(dir, 0)])
+    n_dirs = 0
+    while 0 != len(queue) and n_dirs < max_dirs:
+        cur_dir, depth = queue.popleft()
+        n_dirs += 1
+        try:
+            entries = sorted(os.scandir(cur_dir), key=lambda e: e.name)
+        except (PermissionError, FileNotFoundError, NotADirectoryError):
+            continue
+
+        for entry in entries:
+            if entry.name == "aergoluac" and is_aergo_luac(entry.path):
+                return entry.path
+
+        if depth >= max_depth:
+            continue
+        for entry in entries:
+            if entry.name.startswith('.'):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    queue.append((entry.path, depth + 1))
+            except OSError:
+                pass
+
+    return None
+
+
 def check_aergo_luac_path():
-    try:
-        search_file(g_aergo_path)
-    except FileNotFoundError:
-        raise FileNotFoundError("Cannot find AERGO_PATH for finding AERGO Lua Compiler (aergoluac)")
+    global g_aergo_luac_path
 
-    if g_aergo_luac_path is None or 0 == len(g_aergo_luac_path):
+    # 1. cached location
+    path = read_aergo_luac_state()
+
+    # 2. PATH
+    if path is None:
+        path = shutil.which("aergoluac")
+
+    # 3. well-known 'bin' directories
+    if path is None:
+        for candidate in get_aergo_luac_candidates():
+            if is_aergo_luac(candidate):
+                path = candidate
+                break
+
+    # 4. bounded search under AERGO_PATH
+    if path is None and 0 != len(g_aergo_path):
+        if not os.path.isdir(g_aergo_path):
+            raise FileNotFoundError("Cannot find AERGO_PATH for finding AERGO Lua Compiler (aergoluac)")
+        path = search_file(g_aergo_path)
+
+    if path is None or 0 == len(path):
         raise FileNotFoundError("Cannot find AERGO Lua Compiler (aergoluac)")
 
+    path = os.path.abspath(path)
+    if path != read_aergo_luac_state():
+        write_aergo_luac_state(path)
+
+    g_aergo_luac_path = path
     out_print("  > 'aergoluac': ", g_aergo_luac_path)
 
 
+def write_atomic(path, data):
+    # write a temporary file and swap it in, readers never see a partial file
+    dir_path = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=dir_path, prefix='.' + os.path.basename(path) + '.')
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def get_payload_store_dir():
+    return os.path.join(os.path.dirname(HSC_COMPILED_PAYLOAD_DATA_FILE),
+                        HSC_COMPILED_PAYLOAD_STORE_DIR)
+
+
+def get_payload_hash(payload):
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def has_payload(info):
+    if 'payload_hash' not in info:
+        return False
+    return os.path.isfile(os.path.join(get_payload_store_dir(), info['payload_hash']))
+
+
+def read_payload(payload_hash):
+    with open(os.path.join(get_payload_store_dir(), payload_hash)) as f:
+        return f.read()
+
+
+def write_payload(payload):
+    # a payload is saved only once under its content hash
+    payload_hash = get_payload_hash(payload)
+    path = os.path.join(get_payload_store_dir(), payload_hash)
+    if not os.path.isfile(path):
+        os.makedirs(get_payload_store_dir(), exist_ok=True)
+        write_atomic(path, payload)
+    return payload_hash
+
+
+def prune_payload_store(payload_info):
+    store_dir = get_payload_store_dir()
+    if not os.path.isdir(store_dir):
+        return
+
+    used = set()
+    for k, v in payload_info.items():
+        if isinstance(v, dict) and 'payload_hash' in v:
+            used.add(v['payload_hash'])
+
+    for fn in os.listdir(store_dir):
+        if fn.startswith('.') or fn in used:
+            continue
+        try:
+            os.remove(os.path.join(store_dir, fn))
+        except OSError:
+            pass
+
+
 def read_payload_info():
     # read previous information
     if os.path.isfile(HSC_COMPILED_PAYLOAD_DATA_FILE):
@@ -108,14 +330,106 @@ def read_payload_info():
 
 def write_payload_info(payload_info):
     # store deploy json
-    with open(HSC_COMPILED_PAYLOAD_DATA_FILE, "w") as f:
-        f.write(json.dumps(payload_info, indent=2))
-        f.close()
+    write_atomic(HSC_COMPILED_PAYLOAD_DATA_FILE, json.dumps(payload_info, indent=2))
+
+
+_LUA_PRINT_RE = re.compile(r'(?<![\w.:])system\s*\.\s*print\s*\(')
+_LUA_LONG_BRACKET_RE = re.compile(r'\[(=*)\[')
+
+
+def skip_lua_string(code, i):
+    """
+    :return: the index after a string or a comment starting at 'i',
+             or 'i' if there is none
+    """
+    if code.startswith('--', i):
+        m = _LUA_LONG_BRACKET_RE.match(code, i + 2)
+        if m:
+            end = code.find(']' + m.group(1) + ']', m.end())
+            return len(code) if end < 0 else end + len(m.group(1)) + 2
+        end = code.find('\n', i)
+        return len(code) if end < 0 else end
+    if code[i] in '"\'':
+        j = i + 1
+        while j < len(code) and code[j] != code[i]:
+            j += 2 if code[j] == '\\' else 1
+        return j + 1
+    m = _LUA_LONG_BRACKET_RE.match(code, i)
+    if m:
+        end = code.find(']' + m.group(1) + ']', m.end())
+        return len(code) if end < 0 else end + len(m.group(1)) + 2
+    return i
+
+
+def strip_lua_prints(code):
+    """
+    Remove every 'system.print(...)' call. The removed call is replaced with
+    its line breaks, so line numbers in errors are kept.
+    """
+    out = []
+    i = 0
+    last = 0
+    while i < len(code):
+        j = skip_lua_string(code, i)
+        if j != i:
+            i = j
+            continue
+
+        m = _LUA_PRINT_RE.match(code, i)
+        if not m:
+            i += 1
+            continue
+
+        # find the closing parenthesis
+        depth = 1
+        j = m.end()
+        while j < len(code) and depth > 0:
+            k = skip_lua_string(code, j)
+            if k != j:
+                j = k
+                continue
+            if code[j] == '(':
+                depth += 1
+            elif code[j] == ')':
+                depth -= 1
+            j += 1
+        if depth > 0:
+            raise SyntaxError("unbalanced 'system.print(' at offset {}".format(i))
+
+        out.append(code[last:i])
+        out.append('\n' * code.count('\n', i, j))
+        i = last = j
+
+    out.append(code[last:])
+    return ''.join(out)
+
+
+def preprocess_src(code, profile):
+    if profile == HSC_PROFILE_RELEASE:
+        # nobody reads the log of a release contract
+        return strip_lua_prints(code)
+    return code
+
+
+def compile_src(src, profile=HSC_PROFILE_DEBUG):
+    if profile != HSC_PROFILE_DEBUG:
+        # compile the pre-processed source, it keeps line numbers of the source
+        with open(src) as f:
+            code = preprocess_src(f.read(), profile)
+        fd, tmp_path = tempfile.mkstemp(prefix=os.path.splitext(os.path.basename(src))[0] + '.', suffix='.lua')
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(code)
+            return run_aergo_luac(tmp_path)
+        finally:
+            os.remove(tmp_path)
 
+    return run_aergo_luac(src)
 
-def compile_src(src):
+
+def run_aergo_luac(src):
     # execute aergoluac
-    process = subprocess.Popen([g_aergo_luac_path, "--payload", src],
+    process = subprocess.Popen([g_aergo_luac_path] + AERGO_LUAC_FLAGS + [src],
                                stdout=subprocess.PIPE,
                                stderr=subprocess.PIPE)
     out, err = process.communicate()
@@ -126,114 +440,370 @@ def compile_src(src):
     return out.decode('utf-8').strip()
 
 
-def check_src_payload(key, path, payload_info, is_manifest=False):
+def get_aergo_luac_id():
+    # identify the compiler binary without reading it
+    st = os.stat(g_aergo_luac_path)
+    return "{0}:{1}:{2}".format(os.path.realpath(g_aergo_luac_path),
+                                st.st_size, st.st_mtime_ns)
+
+
+def get_src_hash(src):
+    h = hashlib.sha256()
+    with open(src, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def get_cache_key(src_hash, aergo_luac_id, profile=HSC_PROFILE_DEBUG):
+    # the payload only depends on the source, the compiler, its flags and the profile
+    h = hashlib.sha256()
+    h.update(src_hash.encode('utf-8'))
+    h.update(b'\0')
+    h.update(aergo_luac_id.encode('utf-8'))
+    h.update(b'\0')
+    h.update(' '.join(AERGO_LUAC_FLAGS).encode('utf-8'))
+    if profile != HSC_PROFILE_DEBUG:
+        # keep cache keys of the debug profile same as before
+        h.update(b'\0')
+        h.update(profile.encode('utf-8'))
+    return h.hexdigest()
+
+
+def check_src_cache(key, path, payload_info, aergo_luac_id, src_hash=None, profile=HSC_PROFILE_DEBUG):
     src = os.path.abspath(path)
-    payload = compile_src(src)
-
-    if key not in payload_info:
-        payload_info[key] = {
-            'src': src,
-            'payload': payload,
-            'is_manifest': is_manifest,
-            'time': HSC_COMPILE_TIME,
-        }
-        return True
-    else:
-        if payload_info[key]['payload'] != payload:
-            payload_info[key] = {
-                'src': src,
-                'payload': payload,
-                'is_manifest': is_manifest,
-                'time': HSC_COMPILE_TIME,
-            }
-            return True
+    if src_hash is None:
+        src_hash = get_src_hash(src)
+    cache_key = get_cache_key(src_hash, aergo_luac_id, profile)
 
-    payload_info[key]['time'] = HSC_COMPILE_TIME
+    if key in payload_info and has_payload(payload_info[key]):
+        if payload_info[key].get('cache_key') == cache_key:
+            return src, cache_key, True
 
-    return False
+    return src, cache_key, False
 
 
-def hsc_compile():
-    # check Aergo environment
-    check_aergo_path()
-    check_aergo_luac_path()
-    out_print()
+def update_src_payload(key, src, cache_key, payload, payload_info, is_manifest=False,
+                       profile=HSC_PROFILE_DEBUG):
+    if payload is None:
+        # cache hit, nothing changed
+        payload_info[key]['src'] = src
+        payload_info[key]['time'] = HSC_COMPILE_TIME
+        return False
 
-    # check lua files
-    lua_dir = os.getenv('HSC_LUA_DIR', './sc')
-    lua_files = {}
-    get_all_lua_files(lua_dir, lua_files)
+    payload_hash = write_payload(payload)
+
+    if key in payload_info and payload_info[key].get('payload_hash') == payload_hash:
+        payload_info[key]['src'] = src
+        payload_info[key]['cache_key'] = cache_key
+        payload_info[key]['profile'] = profile
+        payload_info[key]['time'] = HSC_COMPILE_TIME
+        return False
+
+    payload_info[key] = {
+        'src': src,
+        'payload_hash': payload_hash,
+        'is_manifest': is_manifest,
+        'cache_key': cache_key,
+        'profile': profile,
+        'time': HSC_COMPILE_TIME,
+    }
+    return True
+
+
+def check_src_payload(key, path, payload_info, is_manifest=False, aergo_luac_id=None,
+                      profile=HSC_PROFILE_DEBUG):
+    if aergo_luac_id is None:
+        aergo_luac_id = get_aergo_luac_id()
+    src, cache_key, hit = check_src_cache(key, path, payload_info, aergo_luac_id, profile=profile)
+
+    payload = None
+    if not hit:
+        payload = compile_src(src, profile)
 
-    found_manifest = False
-    found_manifest_db = False
+    return update_src_payload(key, src, cache_key, payload, payload_info,
+                              is_manifest=is_manifest, profile=profile)
 
-    hsc_src_list = {}
-    for fn, fp in lua_files.items():
-        if fn == _MANIFEST:
-            found_manifest = True
-        if fn == _MANIFEST_DB:
-            found_manifest_db = True
 
-        hsc_src_list[fn] = fp
+def timed_compile_src(src, profile=HSC_PROFILE_DEBUG):
+    start = time.time()
+    payload = compile_src(src, profile)
+    return payload, time.time() - start
 
-    if not found_manifest:
+
+def compile_all_src(src_list, jobs=1, profile_list=None):
+    # compile every source with its profile; the order of results follows 'src_list'
+    if profile_list is None:
+        profile_list = [HSC_PROFILE_DEBUG] * len(src_list)
+    if jobs <= 1 or len(src_list) <= 1:
+        return [timed_compile_src(src, profile) for src, profile in zip(src_list, profile_list)]
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(timed_compile_src, src_list, profile_list))
+
+
+def print_module_status(fn, updated, elapsed=None):
+    if not updated:
+        out_print("  > ............", fn)
+    elif elapsed is None:
+        out_print("  > compiled ...", fn)
+    else:
+        out_print("  > compiled ...", fn, "({:.3f}s)".format(elapsed))
+
+
+def hsc_compile(jobs=1, check_env=True, show_timing=False, profile=None):
+    global HSC_COMPILE_TIME
+    HSC_COMPILE_TIME = time.time()
+    if profile is None:
+        profile = HSC_PROFILE
+    if profile not in HSC_PROFILES:
+        raise ValueError("unknown profile: {}".format(profile))
+
+    # check Aergo environment
+    if check_env or 0 == len(g_aergo_luac_path):
+        check_aergo_path()
+        check_aergo_luac_path()
+        out_print()
+
+    # check lua files
+    lua_dir = os.getenv('HSC_LUA_DIR', './sc')
+    lua_files, _, _, removed = scan_lua_files(lua_dir, read_source_index())
+
+    if _MANIFEST not in lua_files:
         raise FileNotFoundError("Cannot find Manifest")
-    if not found_manifest_db:
+    if _MANIFEST_DB not in lua_files:
         raise FileNotFoundError("Cannot find Manifest DB")
 
-    out_print("Compiling Manifest")
+    # the Manifest modules at first, then others in name order
+    module_list = [(_MANIFEST, True), (_MANIFEST_DB, True)]
+    for fn in sorted(lua_files):
+        if fn == _MANIFEST or fn == _MANIFEST_DB:
+            continue
+        module_list.append((fn, False))
 
     payload_info = read_payload_info()
     payload_info["hsc_version"] = HSC_VERSION
+    payload_info["hsc_profile"] = profile
+    aergo_luac_id = get_aergo_luac_id()
+
+    # the Manifest modules are always compiled as they are, because a new
+    # payload of them deploys a new HSC address and a new DB
+    module_profile = {}
+    for fn, is_manifest in module_list:
+        module_profile[fn] = HSC_PROFILE_DEBUG if is_manifest else profile
+
+    # find modules which need to compile
+    checked = {}
+    compile_list = []
+    for fn, _ in module_list:
+        checked[fn] = check_src_cache(fn, lua_files[fn]['path'], payload_info, aergo_luac_id,
+                                      src_hash=lua_files[fn]['hash'], profile=module_profile[fn])
+        if not checked[fn][2]:
+            compile_list.append(fn)
+
+    # modules don't depend on each other, so compile them all at once
+    results = compile_all_src([checked[fn][0] for fn in compile_list], jobs=jobs,
+                              profile_list=[module_profile[fn] for fn in compile_list])
+    results = dict(zip(compile_list, results))
+
+    # merge results in one step
+    updated = {}
+    for fn, is_manifest in module_list:
+        src, cache_key, _ = checked[fn]
+        payload, _ = results.get(fn, (None, None))
+        updated[fn] = update_src_payload(fn, src, cache_key, payload, payload_info,
+                                         is_manifest=is_manifest, profile=module_profile[fn])
 
-    # at first always check _MANIFEST
-    if check_src_payload(_MANIFEST, hsc_src_list[_MANIFEST], payload_info, is_manifest=True):
-        out_print("  > compiled ...", _MANIFEST)
-    else:
-        out_print("  > ............", _MANIFEST)
-
-    # check _MANIFEST_DB
-    if check_src_payload(_MANIFEST_DB, hsc_src_list[_MANIFEST_DB], payload_info, is_manifest=True):
-        out_print("  > compiled ...", _MANIFEST_DB)
-    else:
-        out_print("  > ............", _MANIFEST_DB)
+    out_print("Compiling Manifest")
+    for fn, is_manifest in module_list:
+        if not is_manifest:
+            continue
+        elapsed = results[fn][1] if show_timing and fn in results else None
+        print_module_status(fn, updated[fn], elapsed)
 
     out_print('')
     out_print("Compiling Horde Smart Contract (HSC)")
-
-    # check other sources
-    for fn, fp in hsc_src_list.items():
-        if fn == _MANIFEST or fn == _MANIFEST_DB:
+    for fn, is_manifest in module_list:
+        if is_manifest:
             continue
-
-        if check_src_payload(fn, fp, payload_info):
-            if fn not in payload_info:
-                out_print("  > ERROR ......", fn)
-                continue
-            else:
-                out_print("  > compiled ...", fn)
-        else:
-            out_print("  > ............", fn)
+        elapsed = results[fn][1] if show_timing and fn in results else None
+        print_module_status(fn, updated[fn], elapsed)
+    for fn in removed:
+        out_print("  > removed ....", fn)
 
     copy_payload_info = payload_info.copy()
     for k, v in copy_payload_info.items():
         if 'time' in v:
             if v['time'] != HSC_COMPILE_TIME:
                 payload_info.pop(k)
-        elif 'hsc_version' != k:
+        elif k not in ('hsc_version', 'hsc_profile'):
             payload_info.pop(k)
 
     # save payload info.
     write_payload_info(payload_info)
+    prune_payload_store(payload_info)
+    write_source_index(lua_files)
     out_print('')
 
+    return [fn for fn, _ in module_list if updated[fn]]
 
-if __name__ == '__main__':
+
+def snapshot_lua_files(dir):
+    snapshot = {}
+    for dirpath, dirnames, filenames in os.walk(dir):
+        for fn in filenames:
+            if os.path.splitext(fn)[1] != '.lua':
+                continue
+            path = os.path.join(dirpath, fn)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            snapshot[path] = (st.st_mtime_ns, st.st_size)
+    return snapshot
+
+
+class PollingWatcher:
+    def __init__(self, dir, interval=HSC_WATCH_INTERVAL):
+        self.dir = dir
+        self.interval = interval
+        self.snapshot = snapshot_lua_files(dir)
+
+    def wait(self, timeout=None):
+        """
+        Wait until any Lua file changes.
+        :return: False if nothing changed within 'timeout' seconds
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            snapshot = snapshot_lua_files(self.dir)
+            if snapshot != self.snapshot:
+                self.snapshot = snapshot
+                return True
+            if deadline is not None and time.time() >= deadline:
+                return False
+            sleep_time = self.interval
+            if deadline is not None:
+                sleep_time = max(0, min(sleep_time, deadline - time.time()))
+            time.sleep(sleep_time)
+
+    def close(self):
+        pass
+
+
+class INotifyWatcher:
+    def __init__(self, dir):
+        self.dir = dir
+        self.inotify = INotify()
+        self.flags = inotify_flags.CREATE | inotify_flags.DELETE | inotify_flags.MODIFY \
+            | inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_FROM | inotify_flags.MOVED_TO \
+            | inotify_flags.DELETE_SELF
+        # path: watch descriptor
+        self.watched = {}
+        self.add_watches()
+
+    def add_watches(self):
+        # inotify is not recursive, so watch every directory
+        for dirpath, dirnames, filenames in os.walk(self.dir):
+            if dirpath not in self.watched:
+                self.watched[dirpath] = self.inotify.add_watch(dirpath, self.flags)
+
+    def remove_watch(self, wd):
+        # the watch of a deleted directory is gone, so a recreated one is watched again
+        for path, watched_wd in list(self.watched.items()):
+            if watched_wd == wd:
+                del self.watched[path]
+
+    def wait(self, timeout=None):
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            read_timeout = None
+            if deadline is not None:
+                read_timeout = max(0, int((deadline - time.time()) * 1000))
+            events = self.inotify.read(timeout=read_timeout)
+            if 0 == len(events):
+                return False
+
+            for event in events:
+                if event.mask & (inotify_flags.DELETE_SELF | inotify_flags.IGNORED):
+                    self.remove_watch(event.wd)
+            self.add_watches()
+            for event in events:
+                # ignore editor swap files and so on
+                if event.name.endswith('.lua') or event.mask & inotify_flags.ISDIR:
+                    return True
+
+    def close(self):
+        self.inotify.close()
+
+
+def new_watcher(dir, interval=HSC_WATCH_INTERVAL):
+    if INotify is not None:
+        try:
+            return INotifyWatcher(dir)
+        except OSError:
+            pass
+    return PollingWatcher(dir, interval)
+
+
+def hsc_watch(jobs=1, interval=HSC_WATCH_INTERVAL, debounce=HSC_WATCH_DEBOUNCE, profile=None):
+    lua_dir = os.getenv('HSC_LUA_DIR', './sc')
+    watcher = new_watcher(lua_dir, interval)
+
+    try:
+        try:
+            hsc_compile(jobs=jobs, show_timing=True, profile=profile)
+        except Exception as e:
+            # keep watching, the next save may fix it
+            err_print(e)
+
+        while True:
+            out_print("Watching '{}' ({}) ...".format(lua_dir, type(watcher).__name__))
+            watcher.wait()
+
+            # wait until a burst of saves calms down
+            while watcher.wait(debounce):
+                pass
+
+            start = time.time()
+            try:
+                updated = hsc_compile(jobs=jobs, check_env=False, show_timing=True, profile=profile)
+            except Exception as e:
+                # keep watching, the next save may fix it
+                err_print(e)
+                continue
+            out_print("Rebuilt {0} module(s) in {1:.3f}s".format(len(updated), time.time() - start))
+            out_print('')
+    except KeyboardInterrupt:
+        out_print('')
+    finally:
+        watcher.close()
+
+
+@click.command()
+@click.option('--jobs', '-j', default=1, type=int,
+              help='the number of modules to compile concurrently')
+@click.option('--watch', is_flag=True,
+              help='keep running and recompile changed modules on every save')
+@click.option('--interval', default=HSC_WATCH_INTERVAL, type=float,
+              help='the polling interval (seconds) of the watch mode without inotify')
+@click.option('--debounce', default=HSC_WATCH_DEBOUNCE, type=float,
+              help='the quiet time (seconds) to wait for before recompiling')
+@click.option('--profile', default=HSC_PROFILE, type=click.Choice(HSC_PROFILES),
+              help='the build profile, "release" removes system.print calls')
+def main(jobs, watch, interval, debounce, profile):
     try:
-        hsc_compile()
+        if watch:
+            hsc_watch(jobs=jobs, interval=interval, debounce=debounce, profile=profile)
+        else:
+            hsc_compile(jobs=jobs, profile=profile)
         exit(False)
     except Exception as e:
         err_print(e)
         if not QUIET_MODE:
             traceback.print_exception(*sys.exc_info())
         exit(True)
+
+
+if __name__ == '__main__':
+    main()
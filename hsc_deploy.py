@@ -4,9 +4,16 @@ import click
 import traceback
 import json
 import aergo.herapy as herapy
+from aergo.herapy.errors.exception import CommunicationException
 import time
 import string
 import random
+import hashlib
+import re
+from functools import partial
+
+import hsc_compile
+import hsc_trace
 
 AERGO_TESTNET = "testnet.aergo.io:7845"
 #AERGO_SQLTESTNET = "sqltestnet.aergo.io:7845"
@@ -15,7 +22,9 @@ AERGO_SQLTESTNET = "13.209.137.193:7845"
 AERGO_TARGET = AERGO_TESTNET
 #AERGO_TARGET = AERGO_SQLTESTNET
 #AERGO_TARGET = "localhost:7845"
-AERGO_WAITING_TIME = 3
+AERGO_WAITING_TIME = 30
+AERGO_POLLING_INTERVAL = 0.1
+AERGO_POLLING_MAX_INTERVAL = 1.0
 
 if 'AERGO_TARGET' in os.environ:
     AERGO_TARGET = os.environ['AERGO_TARGET']
@@ -23,11 +32,18 @@ if 'AERGO_TARGET' in os.environ:
 if 'AERGO_WAITING_TIME' in os.environ:
     AERGO_WAITING_TIME = os.environ['AERGO_WAITING_TIME']
 
+HSC_TRACE_FILE = os.environ.get('HSC_TRACE')
+
+# the profile when the compiled payload info doesn't have it
+HSC_PROFILE_DEBUG = "debug"
+
 hsc_dir, _ = os.path.split(os.path.realpath(__file__))
 HSC_COMPILED_PAYLOAD_DATA_FILE = os.path.join(hsc_dir, "./hsc.compiled.payload.dat")
 HSC_DEPLOYED_PAYLOAD_DATA_FILE = os.path.join(hsc_dir, "./hsc.deployed.payload.dat")
+HSC_COMPILED_PAYLOAD_STORE_DIR = "hsc.compiled.payloads"
 
 _MANIFEST = '_manifest.lua'
+_MANIFEST_DB = '_manifest_db.lua'
 QUIET_MODE = False
 
 
@@ -66,10 +82,29 @@ def read_payload_info(payload_path):
 
 
 def write_payload_info(payload_info, payload_path):
-    # store deploy json
-    with open(payload_path, "w") as f:
-        f.write(json.dumps(payload_info, indent=2))
-        f.close()
+    # store deploy json, swap it in atomically
+    hsc_compile.write_atomic(payload_path, json.dumps(payload_info, indent=2))
+
+
+def get_payload_hash(payload):
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def get_compiled_payload_hash(compiled):
+    if 'payload_hash' in compiled:
+        return compiled['payload_hash']
+    # compiled by an old version, the payload is inline
+    return get_payload_hash(compiled['payload'])
+
+
+def read_compiled_payload(compiled_payload_file_path, compiled):
+    # load only the payload of one module from the payload store
+    if 'payload' in compiled:
+        return compiled['payload']
+    path = os.path.join(os.path.dirname(compiled_payload_file_path),
+                        HSC_COMPILED_PAYLOAD_STORE_DIR, compiled['payload_hash'])
+    with open(path) as f:
+        return f.read()
 
 
 def check_aergo_conn_info(target, exported_key, password):
@@ -95,32 +130,69 @@ def check_aergo_conn_info(target, exported_key, password):
     return aergo
 
 
-def deploy_sc(aergo, payload, args=None):
+def wait_tx_result(aergo, tx_hash, timeout=None):
+    """
+    Poll the receipt of a transaction with an adaptive backoff.
+    It returns as soon as the receipt exists, so a fast block costs only a few
+    polls and a slow block doesn't fail before 'timeout' seconds.
+    """
+    if timeout is None:
+        timeout = float(AERGO_WAITING_TIME)
+    deadline = time.time() + timeout
+    interval = AERGO_POLLING_INTERVAL
+
+    while True:
+        try:
+            result = aergo.get_tx_result(tx_hash)
+            if result is not None:
+                return result
+        except CommunicationException as e:
+            # the TX is not in a block yet
+            if 'not found' not in str(e):
+                raise
+
+        now = time.time()
+        if now >= deadline:
+            raise TimeoutError("cannot get the receipt of TX ({0}) in {1} seconds".format(tx_hash, timeout))
+        time.sleep(min(interval, deadline - now))
+        interval = min(interval * 2, AERGO_POLLING_MAX_INTERVAL)
+
+
+def submit_deploy_sc(aergo, payload, args=None, name=''):
     # send TX
     tx, result = aergo.deploy_sc(payload=payload, args=args)
     if result.status != herapy.CommitStatus.TX_OK:
         raise RuntimeError("[{0}]: {1}".format(result.status, result.detail))
+    hsc_trace.submitted(tx.tx_hash, 'deploy', name, 'constructor', len(payload) + len(json.dumps(args)))
+    return tx
 
-    time.sleep(int(AERGO_WAITING_TIME))
 
+def confirm_deploy_sc(aergo, tx):
     # check TX
-    result = aergo.get_tx_result(tx.tx_hash)
+    result = wait_tx_result(aergo, tx.tx_hash)
+    hsc_trace.confirmed(tx.tx_hash, result)
     if result.status != herapy.TxResultStatus.CREATED:
         raise RuntimeError("[{0}]:{1}: {2}".format(result.contract_address, result.status, result.detail))
 
     return result.contract_address
 
 
+def deploy_sc(aergo, payload, args=None, name=''):
+    tx = submit_deploy_sc(aergo, payload, args, name)
+    return confirm_deploy_sc(aergo, tx)
+
+
 def call_sc(aergo, hsc_address, func_name, args=None):
     # send TX
     tx, result = aergo.call_sc(hsc_address, func_name, args=args)
     if result.status != herapy.CommitStatus.TX_OK:
         raise RuntimeError("[{0}]: {1}".format(result.status, result.detail))
-
-    time.sleep(int(AERGO_WAITING_TIME))
+    module, hsc_func_name = hsc_trace.split_hsc_function(func_name, args)
+    hsc_trace.submitted(tx.tx_hash, 'call', module, hsc_func_name, hsc_trace.get_call_size(func_name, args))
 
     # check TX
-    result = aergo.get_tx_result(tx.tx_hash)
+    result = wait_tx_result(aergo, tx.tx_hash)
+    hsc_trace.confirmed(tx.tx_hash, result, hsc_trace.get_response_size(result))
     if result.status != herapy.TxResultStatus.SUCCESS:
         err_print(result)
         raise RuntimeError("[{0}]:{1}: {2}".format(result.contract_address, result.status, result.detail))
@@ -130,28 +202,222 @@ def call_sc(aergo, hsc_address, func_name, args=None):
 
 def query_sc(aergo, hsc_address, func_name, args=None):
     # send TX
+    start = time.time()
     result = aergo.query_sc(hsc_address, func_name, args=args)
+    module, hsc_func_name = hsc_trace.split_hsc_function(func_name, args)
+    hsc_trace.queried(module, hsc_func_name, hsc_trace.get_call_size(func_name, args),
+                      time.time() - start, len(result or b''))
     return result
 
 
-def try_to_deploy(aergo, key, payload, deployed_info, args=None, force=False):
+def is_deployed(key, payload_hash, deployed_info):
+    if key not in deployed_info:
+        return False
+
+    deployed = deployed_info[key]
+    deployed_hash = deployed.get('payload_hash')
+    if deployed_hash is None and 'payload' in deployed:
+        deployed_hash = get_payload_hash(deployed['payload'])
+    return payload_hash == deployed_hash
+
+
+def record_deployed(key, payload_hash, address, deployed_info):
     if key not in deployed_info:
         deployed_info[key] = {}
 
-    if 'payload' in deployed_info[key] and not force:
-        if payload == deployed_info[key]['payload']:
-            # don't need to deploy
-            return False
+    deployed = deployed_info[key]
+    deployed['address'] = address
+    deployed['payload_hash'] = payload_hash
+    deployed.pop('payload', None)
 
-    address = deploy_sc(aergo, payload, args)
-    deployed_info[key]['address'] = address
 
-    deployed_info[key]['payload'] = payload
+def try_to_deploy(aergo, key, payload_hash, load_payload, deployed_info, args=None, force=False):
+    if not force and is_deployed(key, payload_hash, deployed_info):
+        # don't need to deploy
+        return False
+
+    address = deploy_sc(aergo, load_payload(), args, name=key)
+    record_deployed(key, payload_hash, address, deployed_info)
 
     return True
 
 
-def hsc_deploy(aergo, compiled_payload_file_path, deployed_payload_file_path):
+def pipeline_deploy(aergo, deploy_list, deployed_info):
+    """
+    Submit all deploy TXs back-to-back and then wait for their receipts.
+    An address is recorded into 'deployed_info' only after its TX confirms.
+    :param deploy_list: list of (key, payload_hash, load_payload, args)
+    :return: keys of confirmed modules
+    """
+    # sync the nonce once, then the following TXs take consecutive nonces
+    aergo.get_account()
+
+    error = None
+    submitted = []
+    for key, payload_hash, load_payload, args in deploy_list:
+        try:
+            tx = submit_deploy_sc(aergo, load_payload(), args, name=key)
+        except Exception as e:
+            # TXs after a rejected nonce would never be executed
+            error = e
+            break
+        submitted.append((key, payload_hash, tx))
+
+    confirmed = []
+    for key, payload_hash, tx in submitted:
+        try:
+            address = confirm_deploy_sc(aergo, tx)
+        except Exception as e:
+            if error is None:
+                error = e
+            continue
+        record_deployed(key, payload_hash, address, deployed_info)
+        confirmed.append(key)
+
+    if error is not None:
+        raise error
+
+    return confirmed
+
+
+def read_module_info(src):
+    """
+    Read the module name and the names of modules its constructor calls.
+    The constructor leaves state (e.g. tables) in those modules, so they are
+    the modules it depends on at deploy time.
+    :return: (module name, list of module names) or (None, None) if unreadable
+    """
+    try:
+        with open(src) as f:
+            lines = f.read().splitlines()
+    except (OSError, TypeError):
+        return None, None
+
+    module_name = None
+    names = {}
+    constructor = []
+    in_constructor = False
+    for line in lines:
+        m = re.match(r'^(MODULE_NAME\w*)\s*=\s*"([^"]+)"', line)
+        if m is not None:
+            names[m.group(1)] = m.group(2)
+            if 'MODULE_NAME' == m.group(1):
+                module_name = m.group(2)
+        elif line.startswith('function constructor('):
+            in_constructor = True
+        elif in_constructor:
+            if line.startswith('end'):
+                in_constructor = False
+            else:
+                constructor.append(line)
+
+    depends = []
+    for var in re.findall(r'__callFunction\(\s*(MODULE_NAME\w*)', '\n'.join(constructor)):
+        if var in names and names[var] not in depends:
+            depends.append(names[var])
+    return module_name, depends
+
+
+def get_dependency_graph(compiled_info):
+    """
+    :return: {key: set of keys}, a module must be deployed again when any of
+             its dependencies is deployed
+    """
+    keys = [k for k in compiled_info if k not in ('hsc_version', 'hsc_profile')]
+    module_info = {k: read_module_info(compiled_info[k].get('src')) for k in keys}
+    key_of_module = {name: k for k, (name, _) in module_info.items() if name is not None}
+
+    graph = {}
+    for k in keys:
+        if k == _MANIFEST:
+            graph[k] = set()
+            continue
+
+        # every module is constructed with the Manifest address and registers itself to it
+        graph[k] = {_MANIFEST}
+        _, depends = module_info[k]
+        if depends is None:
+            # cannot read the source, so depend on all manifest modules
+            graph[k] |= {d for d in keys if d != k and compiled_info[d]['is_manifest']}
+            continue
+        for name in depends:
+            if name in key_of_module and key_of_module[name] != k:
+                graph[k].add(key_of_module[name])
+    return graph
+
+
+def plan_deploy(compiled_info, deployed_info, manifest_alive=True):
+    """
+    Decide the minimal set of modules to deploy.
+    :return: list of (key, payload_hash, reason) in the deploying order
+    """
+    graph = get_dependency_graph(compiled_info)
+
+    # the Manifest at first, then other manifest modules, then HSC modules
+    order = [k for k in graph if k == _MANIFEST]
+    order += [k for k in graph if k != _MANIFEST and compiled_info[k]['is_manifest']]
+    order += [k for k in graph if not compiled_info[k]['is_manifest']]
+
+    reasons = {}
+    for k in order:
+        payload_hash = get_compiled_payload_hash(compiled_info[k])
+        if k not in deployed_info:
+            reasons[k] = 'new'
+        elif k == _MANIFEST and not manifest_alive:
+            reasons[k] = 'not found'
+        elif not is_deployed(k, payload_hash, deployed_info):
+            reasons[k] = 'changed'
+
+    # deploy again modules depending on a deployed one
+    updated = True
+    while updated:
+        updated = False
+        for k in order:
+            if k in reasons:
+                continue
+            for d in sorted(graph[k]):
+                if d in reasons:
+                    reasons[k] = 'depends on {}'.format(d)
+                    updated = True
+                    break
+
+    # keep dependencies deployed before their dependents
+    plan = []
+    planned = set()
+    while len(planned) < len(reasons):
+        for k in order:
+            if k in reasons and k not in planned and not (graph[k] & (set(reasons) - planned)):
+                plan.append((k, get_compiled_payload_hash(compiled_info[k]), reasons[k]))
+                planned.add(k)
+                break
+        else:
+            raise RuntimeError("circular dependency among {}".format(sorted(set(reasons) - planned)))
+    return plan
+
+
+def drops_data(plan, deployed_info, manifest_alive):
+    # a new DB module starts empty, and the tables of the live HSC are left behind
+    return manifest_alive and _MANIFEST_DB in deployed_info and any(k == _MANIFEST_DB for k, _, _ in plan)
+
+
+def print_deploy_plan(plan, compiled_info, set_version, drop_data=False):
+    out_print("Deploy Plan ({} profile)".format(compiled_info.get('hsc_profile', HSC_PROFILE_DEBUG)))
+    if len(plan) == 0 and not set_version:
+        out_print("  > nothing to deploy")
+    for k, _, reason in plan:
+        if k == _MANIFEST_DB and drop_data:
+            reason += ", DROPS ALL DATA"
+        out_print("  > deploy ....... {0} ({1})".format(k, reason))
+        if k != _MANIFEST:
+            module_name, _ = read_module_info(compiled_info[k].get('src'))
+            out_print("      + __init_module__({})".format(module_name or k))
+    if set_version:
+        out_print("  > setVersion ... {}".format(compiled_info['hsc_version']))
+    out_print()
+
+
+def hsc_deploy(aergo, compiled_payload_file_path, deployed_payload_file_path, pipeline=False, dry_run=False,
+               redeploy_db=False):
     # read compiled payload info.
     compiled_info = read_payload_info(compiled_payload_file_path)
 
@@ -159,90 +425,90 @@ def hsc_deploy(aergo, compiled_payload_file_path, deployed_payload_file_path):
     deployed_info = read_payload_info(deployed_payload_file_path)
     copy_deployed_info = deployed_info.copy()
     for k in copy_deployed_info:
-        if 'hsc_address' == k:
+        if k in ('hsc_address', 'hsc_version', 'hsc_profile'):
             continue
         if k not in compiled_info:
             deployed_info.pop(k)
 
     # at first check whether HSC is deployed or not
-    need_to_change_all = False
+    manifest_alive = False
     version_is_same = False
-    try:
-        if compiled_info['hsc_version'] != deployed_info['hsc_version']:
-            need_to_change_all = True
-        else:
-            hsc_address = deployed_info['hsc_address']
-
+    if _MANIFEST in deployed_info:
+        try:
             # read the version of deployed HSC
-            version = query_sc(aergo, hsc_address, "getVersion")
+            version = query_sc(aergo, deployed_info[_MANIFEST]['address'], "getVersion")
             version = version.decode('utf-8')
+            manifest_alive = True
 
             if compiled_info['hsc_version'] in version:
                 out_print("HSC is already deployed (Version: {})".format(version))
-                need_to_change_all = False
                 version_is_same = True
             else:
                 out_print("Version is different: (expect) \"{0}\" != (deployed) {1}".format(compiled_info['hsc_version'],
                                                                                             version))
-    except:
-        need_to_change_all = True
+        except Exception:
+            manifest_alive = False
+
+    plan = plan_deploy(compiled_info, deployed_info, manifest_alive)
+    set_version = not version_is_same or any(k == _MANIFEST for k, _, _ in plan)
+    drop_data = drops_data(plan, deployed_info, manifest_alive)
+    print_deploy_plan(plan, compiled_info, set_version, drop_data)
+
+    if dry_run:
+        if manifest_alive:
+            # only the deployed modules, the others are migrated once deployed
+            print_migrations(migrate_schemas(aergo, deployed_info[_MANIFEST]['address'], compiled_info,
+                                             dry_run=True), dry_run=True)
+        return deployed_info.get('hsc_address')
+
+    if drop_data and not redeploy_db:
+        raise RuntimeError("{} of the live HSC ({}) would be deployed again, and all its data would be lost; "
+                           "deploy again with --redeploy-db to allow it".format(_MANIFEST_DB,
+                                                                               deployed_info[_MANIFEST]['address']))
 
     deployed_info['hsc_version'] = compiled_info['hsc_version']
+    deployed_info['hsc_profile'] = compiled_info.get('hsc_profile', HSC_PROFILE_DEBUG)
 
-    out_print("Deploying Manifest")
+    def load_payload(key):
+        return partial(read_compiled_payload, compiled_payload_file_path, compiled_info[key])
 
-    # at first always check _MANIFEST
-    for k, v in compiled_info.items():
-        if k == _MANIFEST:
-            if try_to_deploy(aergo=aergo, key=k, payload=v['payload'],
-                             deployed_info=deployed_info,
-                             force=need_to_change_all):
-                need_to_change_all = True
-                out_print("  > deployed ...", k)
-            else:
-                need_to_change_all = False
-                out_print("  > ............", k)
-            break
+    # the Manifest at first, the other modules need its address
+    if len(plan) > 0 and plan[0][0] == _MANIFEST:
+        k, payload_hash, _ = plan.pop(0)
+        out_print("Deploying Manifest")
+        try_to_deploy(aergo=aergo, key=k, payload_hash=payload_hash, load_payload=load_payload(k),
+                      deployed_info=deployed_info, force=True)
+        out_print("  > deployed ...", k)
 
     hsc_address = deployed_info[_MANIFEST]['address']
 
-    # check other manifest modules
-    for k, v in compiled_info.items():
-        if k == 'hsc_version' or k == _MANIFEST:
-            continue
-
-        if v['is_manifest']:
-            if try_to_deploy(aergo=aergo, key=k, payload=v['payload'],
-                             deployed_info=deployed_info,
-                             args=hsc_address,
-                             force=need_to_change_all):
-                need_to_change_all = True
+    if len(plan) > 0:
+        out_print("Deploying Horde Smart Contract (HSC)")
+    try:
+        if pipeline:
+            # once the Manifest address is known, TXs are executed in the nonce order
+            pipeline_deploy(aergo, [(k, payload_hash, load_payload(k), hsc_address)
+                                    for k, payload_hash, _ in plan], deployed_info)
+            for k, _, _ in plan:
                 out_print("  > deployed ...", k)
-            else:
-                need_to_change_all = False
-                out_print("  > ............", k)
-
-    out_print('')
-    out_print("Deploying Horde Smart Contract (HSC)")
-
-    # check other sources
-    for k, v in compiled_info.items():
-        if k == 'hsc_version' or v['is_manifest']:
-            continue
-
-        if try_to_deploy(aergo=aergo, key=k, payload=v['payload'],
-                         deployed_info=deployed_info,
-                         args=hsc_address,
-                         force=need_to_change_all):
-            out_print("  > deployed ...", k)
         else:
-            out_print("  > ............", k)
+            for k, payload_hash, _ in plan:
+                try_to_deploy(aergo=aergo, key=k, payload_hash=payload_hash, load_payload=load_payload(k),
+                              deployed_info=deployed_info, args=hsc_address, force=True)
+                out_print("  > deployed ...", k)
+    except Exception:
+        # keep addresses of deployed modules
+        deployed_info['hsc_address'] = hsc_address
+        write_payload_info(payload_info=deployed_info, payload_path=deployed_payload_file_path)
+        raise
 
     # set HSC version
-    if need_to_change_all or not version_is_same:
+    if set_version:
         call_sc(aergo, hsc_address, "setVersion", [deployed_info['hsc_version']])
 
+    # upgrade the schema of tables, existing data is kept
     out_print()
+    print_migrations(migrate_schemas(aergo, hsc_address, compiled_info))
     out_print("Horde Smart Contract Address =", hsc_address)
 
     deployed_info['hsc_address'] = hsc_address
@@ -254,15 +520,76 @@ def hsc_deploy(aergo, compiled_payload_file_path, deployed_payload_file_path):
     return hsc_address
 
 
+def migrate_schemas(aergo, hsc_address, compiled_info, dry_run=False):
+    """
+    Apply pending schema migrations declared by each module through the
+    Manifest. The version applied is stored on-chain, so a migration runs
+    only once.
+    :return: list of (module name, applied version, latest version) migrated
+    """
+    migrated = []
+    for k in sorted(compiled_info):
+        if not isinstance(compiled_info[k], dict) or compiled_info[k].get('is_manifest'):
+            continue
+        module_name, _ = read_module_info(compiled_info[k].get('src'))
+        if module_name is None:
+            continue
+        try:
+            response = json.loads(query_sc(aergo, hsc_address, "getSchemaVersion", [module_name]))
+        except Exception:
+            # not deployed yet, or the module doesn't have migrations
+            continue
+        if not isinstance(response, dict):
+            continue
+        applied = response.get('schema_version', 0)
+        latest = response.get('latest_schema_version', 0)
+        if applied >= latest:
+            continue
+        if not dry_run:
+            call_sc(aergo, hsc_address, "migrateSchema", [module_name])
+        migrated.append((module_name, applied, latest))
+    return migrated
+
+
+def print_migrations(migrated, dry_run=False):
+    out_print("Schema Migrations")
+    if len(migrated) == 0:
+        out_print("  > schemas are up to date")
+    for module_name, applied, latest in migrated:
+        out_print("  > {} .... {} (v{} -> v{})".format("migrate" if dry_run else "migrated",
+                                                      module_name, applied, latest))
+    out_print()
+
+
+def print_trace_summary(trace):
+    out_print("Trace Summary")
+    for line in trace.format_summary():
+        out_print(line)
+    out_print()
+
+
 @click.group(invoke_without_command=True)
 @click.option('--target', default=AERGO_TARGET, help='target AERGO for Horde configuration')
 @click.option('--exported-key', help='the exported/encrypted key')
 @click.option('--password', help='the password of the exported/encrypted key')
-@click.option('--waiting-time', default=AERGO_WAITING_TIME, help='the private key to create Horde Smart Contract')
-def main(target, exported_key, password, waiting_time):
+@click.option('--waiting-time', default=AERGO_WAITING_TIME, type=float,
+              help='the maximum time (seconds) to wait for the receipt of a transaction')
+@click.option('--pipeline', is_flag=True,
+              help='submit module deploys back-to-back and wait for all receipts together')
+@click.option('--plan', '--dry-run', 'dry_run', is_flag=True,
+              help='print the modules to deploy without sending any transaction')
+@click.option('--redeploy-db', is_flag=True,
+              help='allow deploying _manifest_db.lua of the live HSC again, which drops all its data')
+@click.option('--trace', default=HSC_TRACE_FILE,
+              help='record gas, fee, latency and size of every TX into a JSONL file, '
+                   'or a Prometheus text file ending with ".prom"')
+def main(target, exported_key, password, waiting_time, pipeline, dry_run, redeploy_db, trace):
     global AERGO_WAITING_TIME
     AERGO_WAITING_TIME = waiting_time
 
+    if trace:
+        hsc_trace.start(trace)
+
     aergo = None
     try:
         aergo = check_aergo_conn_info(target, exported_key, password)
@@ -282,7 +609,7 @@ def main(target, exported_key, password, waiting_time):
             },
         ]
         for t in fixed_targets:
-            if target == t['target'] and int(aergo.account.balance) == 0:
+            if not dry_run and target == t['target'] and int(aergo.account.balance) == 0:
                 out_print("Not enough balance.\n")
                 out_print("You need to request AERGO tokens on\n\n  {}\n".format(t['faucet']))
                 out_print("with the address:")
@@ -293,8 +620,12 @@ def main(target, exported_key, password, waiting_time):
 
         hsc_address = hsc_deploy(aergo=aergo,
                                  compiled_payload_file_path=HSC_COMPILED_PAYLOAD_DATA_FILE,
-                                 deployed_payload_file_path=HSC_DEPLOYED_PAYLOAD_DATA_FILE)
-        out_print("Deployed HSC Address: {}".format(hsc_address))
+                                 deployed_payload_file_path=HSC_DEPLOYED_PAYLOAD_DATA_FILE,
+                                 pipeline=pipeline,
+                                 dry_run=dry_run,
+                                 redeploy_db=redeploy_db)
+        if not dry_run:
+            out_print("Deployed HSC Address: {}".format(hsc_address))
 
         exit(False)
     except Exception as e:
@@ -305,6 +636,9 @@ def main(target, exported_key, password, waiting_time):
     finally:
         if aergo is not None:
             aergo.disconnect()
+        trace = hsc_trace.stop()
+        if trace is not None:
+            print_trace_summary(trace)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,566 @@
+"""
+A local stand-in of an Aergo node for offline HSC tests.
+
+It implements the subset of herapy.Aergo used by hsc_deploy and hsc_client
+(account, deploy, call, query, TX result, events, blockchain status) and
+runs the Lua sources of contracts with lupa. Every TX is confirmed at once
+in its own block, and a failed TX rolls back every contract it touched.
+
+Contracts are "compiled" by the stand-in aergoluac written by
+'write_aergoluac', which makes a payload from the Lua source, so the real
+hsc_compile and hsc_deploy run against the stand-in without changes.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import stat
+import sys
+from types import SimpleNamespace
+
+import aergo.herapy as herapy
+from aergo.herapy.errors.exception import CommunicationException
+from aergo.herapy.utils.encoding import encode_address, encode_tx_hash
+
+try:
+    # PUC Lua counts instructions exactly (LuaJIT doesn't hook compiled code)
+    from lupa.lua51 import LuaRuntime, LuaError, lua_type
+except ImportError:
+    from lupa import LuaRuntime, LuaError, lua_type
+
+STANDIN_PAYLOAD_PREFIX = "standin:"
+STANDIN_GENESIS_TIME = 1546300800
+HSC_LUA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sc')
+
+AERGOLUAC = """#!{python}
+import sys
+with open(sys.argv[-1], 'rb') as f:
+    print({prefix!r} + f.read().hex())
+"""
+
+LUA_PRELUDE = """
+local py = ...
+
+system = {
+  print = function(...) py.print(...) end,
+  getContractID = function() return py.frame().contract end,
+  getSender = function() return py.frame().sender end,
+  getOrigin = function() return py.tx().origin end,
+  getCreator = function() return py.creator() end,
+  getTxhash = function() return py.tx().tx_hash end,
+  getBlockheight = function() return py.tx().block_no end,
+  getTimestamp = function() return py.tx().timestamp end,
+  setItem = function(key, value) py.set('item:' .. key, value) end,
+  getItem = function(key) return py.get('item:' .. key) end,
+}
+
+json = {}
+json.encode = function(a, b)
+  if a == json then a = b end
+  return py.json_encode(a)
+end
+json.decode = function(a, b)
+  if a == json then a = b end
+  return py.json_decode(a)
+end
+
+contract = {
+  call = function(address, func_name, ...) return py.call(address, func_name, ...) end,
+  event = function(name, ...) py.event(name, ...) end,
+}
+
+abi = {}
+local function register(view, ...)
+  for _, f in ipairs({...}) do
+    for name, v in pairs(_G) do
+      if v == f then py.register(name, view) end
+    end
+  end
+end
+abi.register = function(...) register(false, ...) end
+abi.register_view = function(...) register(true, ...) end
+
+state = {}
+state.value = function()
+  return {
+    get = function(self) return py.get('var:' .. self._name) end,
+    set = function(self, value) py.set('var:' .. self._name, value) end,
+  }
+end
+local function map_delete(self, key)
+  py.delete('map:' .. rawget(self, '_name') .. ':' .. tostring(key))
+end
+state.map = function()
+  local m = {}
+  return setmetatable(m, {
+    __index = function(self, key)
+      if 'delete' == key then
+        return map_delete
+      end
+      return py.get('map:' .. rawget(m, '_name') .. ':' .. tostring(key))
+    end,
+    __newindex = function(self, key, value)
+      py.set('map:' .. rawget(m, '_name') .. ':' .. tostring(key), value)
+    end,
+  })
+end
+state.var = function(vars)
+  for name, v in pairs(vars) do
+    rawset(v, '_name', name)
+    _G[name] = v
+  end
+end
+
+db = {
+  exec = function(sql) py.db_exec(sql) end,
+  prepare = function(sql)
+    return {
+      exec = function(self, ...) py.db_exec(sql, ...) end,
+      query = function(self, ...)
+        local cursor = py.db_query(sql, ...)
+        local row, n
+        return {
+          next = function(self)
+            row, n = py.db_next(cursor)
+            return row ~= nil
+          end,
+          get = function(self) return unpack(row, 1, n) end,
+        }
+      end,
+    }
+  end,
+}
+
+if table.getn == nil then
+  table.getn = function(t) return #t end
+end
+if unpack == nil then
+  unpack = table.unpack
+end
+"""
+
+
+def write_aergoluac(dir):
+    """
+    Write the stand-in aergoluac into 'dir' and return its path.
+    """
+    path = os.path.join(dir, 'aergoluac')
+    with open(path, 'w') as f:
+        f.write(AERGOLUAC.format(python=sys.executable, prefix=STANDIN_PAYLOAD_PREFIX))
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return path
+
+
+def deploy_hsc(node, work_dir, profile=None):
+    """
+    Compile HSC with the stand-in aergoluac in 'work_dir' and deploy it into
+    'node'. Module paths of hsc_compile are restored after that.
+    :return: (client with an account, HSC address)
+    """
+    import hsc_compile
+    import hsc_deploy
+
+    write_aergoluac(work_dir)
+    saved_env = os.environ.get('AERGO_PATH')
+    saved_lua_dir = os.environ.get('HSC_LUA_DIR')
+    saved = {name: getattr(hsc_compile, name)
+             for name in ['HSC_COMPILED_PAYLOAD_DATA_FILE', 'HSC_AERGO_LUAC_STATE_FILE',
+                          'HSC_SOURCE_INDEX_FILE', 'g_aergo_luac_path', 'QUIET_MODE']}
+    saved_quiet = hsc_deploy.QUIET_MODE
+    try:
+        os.environ['AERGO_PATH'] = work_dir
+        if saved_lua_dir is None:
+            # the sources next to this file, wherever it runs from
+            os.environ['HSC_LUA_DIR'] = HSC_LUA_DIR
+        hsc_compile.HSC_COMPILED_PAYLOAD_DATA_FILE = os.path.join(work_dir, 'hsc.compiled.payload.dat')
+        hsc_compile.HSC_AERGO_LUAC_STATE_FILE = os.path.join(work_dir, 'hsc.aergoluac.dat')
+        hsc_compile.HSC_SOURCE_INDEX_FILE = os.path.join(work_dir, 'hsc.source.index.dat')
+        hsc_compile.g_aergo_luac_path = ''
+        hsc_compile.QUIET_MODE = True
+        hsc_deploy.QUIET_MODE = True
+        hsc_compile.hsc_compile(profile=profile)
+
+        aergo = node.new_aergo()
+        aergo.new_account()
+        hsc_address = hsc_deploy.hsc_deploy(aergo=aergo,
+                                            compiled_payload_file_path=hsc_compile.HSC_COMPILED_PAYLOAD_DATA_FILE,
+                                            deployed_payload_file_path=os.path.join(work_dir,
+                                                                                    'hsc.deployed.payload.dat'))
+        return aergo, hsc_address
+    finally:
+        if saved_env is None:
+            os.environ.pop('AERGO_PATH', None)
+        else:
+            os.environ['AERGO_PATH'] = saved_env
+        if saved_lua_dir is None:
+            os.environ.pop('HSC_LUA_DIR', None)
+        for name, value in saved.items():
+            setattr(hsc_compile, name, value)
+        hsc_deploy.QUIET_MODE = saved_quiet
+
+
+def to_py(value):
+    # Lua table: a sequence is a list, otherwise a dict
+    if lua_type(value) == 'table':
+        items = list(value.items())
+        keys = [k for k, _ in items]
+        if len(keys) > 0 and all(isinstance(k, int) and k > 0 for k in keys):
+            array = [None] * max(keys)
+            for k, v in items:
+                array[k - 1] = to_py(v)
+            return array
+        return {str(k): to_py(v) for k, v in items}
+    if lua_type(value) is not None:
+        raise TypeError("cannot convert a Lua {}".format(lua_type(value)))
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def to_lua(runtime, value):
+    if isinstance(value, dict):
+        return runtime.table_from({k: to_lua(runtime, v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return runtime.table_from([to_lua(runtime, v) for v in value])
+    return value
+
+
+def encode_return(values):
+    values = [to_py(v) for v in values]
+    if len(values) == 0 or (len(values) == 1 and values[0] is None):
+        return ''
+    if len(values) == 1:
+        return json.dumps(values[0])
+    return json.dumps(values)
+
+
+class Contract:
+    def __init__(self, node, address, creator, source):
+        self.node = node
+        self.address = address
+        self.creator = creator
+        self.functions = {}
+        self.storage = {}
+        self.db = sqlite3.connect(':memory:', isolation_level=None)
+        self.runtime = LuaRuntime(unpack_returned_tuples=True)
+        self.runtime.execute(LUA_PRELUDE, self._host())
+        self._set_gas_hook()
+        self.runtime.execute(source)
+
+    def _set_gas_hook(self):
+        # count executed instructions as the gas, in Lua to keep it cheap
+        self.runtime.execute("__gas = 0; debug.sethook(function() __gas = __gas + 1 end, '', 1)")
+
+    @property
+    def gas(self):
+        return self.runtime.globals()['__gas']
+
+    def _host(self):
+        node = self.node
+        runtime = self.runtime
+
+        def get(key):
+            value = self.storage.get(key)
+            return None if value is None else to_lua(runtime, json.loads(value))
+
+        def set(key, value):
+            node.touch(self)
+            self.storage[key] = json.dumps(to_py(value))
+
+        def delete(key):
+            node.touch(self)
+            self.storage.pop(key, None)
+
+        def db_exec(sql, *args):
+            node.touch(self)
+            self.db.execute(sql, [to_py(a) for a in args])
+
+        def db_query(sql, *args):
+            node.touch(self)
+            return self.db.execute(sql, [to_py(a) for a in args])
+
+        def db_next(cursor):
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            # NULL columns are holes, so the number of columns is also returned
+            return runtime.table_from(list(row)), len(row)
+
+        def call(address, func_name, *args):
+            values = node.call_contract(self.address, address, func_name, [to_py(a) for a in args])
+            return tuple(to_lua(runtime, v) for v in values)
+
+        def event(name, *args):
+            node.add_event(self.address, name, [to_py(a) for a in args])
+
+        def register(name, view):
+            self.functions[name] = view
+
+        return runtime.table_from({
+            'print': node.print,
+            'frame': lambda: node.frames[-1],
+            'tx': lambda: node.tx_ctx,
+            'creator': lambda: self.creator,
+            'get': get,
+            'set': set,
+            'delete': delete,
+            'json_encode': lambda value: json.dumps(to_py(value)),
+            'json_decode': lambda raw: to_lua(runtime, json.loads(raw)),
+            'call': call,
+            'event': event,
+            'register': register,
+            'db_exec': db_exec,
+            'db_query': db_query,
+            'db_next': db_next,
+        })
+
+    def invoke(self, func_name, args, constructor=False):
+        if not constructor and func_name not in self.functions:
+            raise LuaError("not found function: {}".format(func_name))
+        func = self.runtime.globals()[func_name]
+        if func is None:
+            if constructor:
+                return ()
+            raise LuaError("not found function: {}".format(func_name))
+        values = func(*[to_lua(self.runtime, a) for a in args])
+        if not isinstance(values, tuple):
+            values = (values,)
+        return tuple(to_py(v) for v in values)
+
+
+class StandinNode:
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+        self.height = 0
+        self.contracts = {}
+        self.accounts = {}
+        self.tx_results = {}
+        self.events = []
+        self.logs = []
+        self.frames = []
+        self.tx_ctx = None
+        self.query_gas = None
+        self._touched = None
+        self._pending_events = None
+
+    def new_aergo(self):
+        return StandinAergo(self)
+
+    def print(self, *args):
+        line = ''.join(str(a) for a in args)
+        self.logs.append(line)
+        if self.verbose:
+            print(line)
+
+    def get_account_state(self, address):
+        if address not in self.accounts:
+            self.accounts[address] = SimpleNamespace(nonce=0, balance=0)
+        return self.accounts[address]
+
+    def touch(self, contract):
+        # keep the state before the TX changes it
+        if self._touched is None or contract.address in self._touched:
+            return
+        self._touched[contract.address] = dict(contract.storage)
+        contract.db.execute("SAVEPOINT standin_tx")
+
+    def add_event(self, address, name, args):
+        self._pending_events.append((address, name, args))
+
+    def call_contract(self, sender, address, func_name, args):
+        contract = self.contracts.get(address)
+        if contract is None:
+            raise LuaError("not found contract: {}".format(address))
+        self.frames.append(SimpleNamespace(contract=address, sender=sender))
+        try:
+            return contract.invoke(func_name, args)
+        finally:
+            self.frames.pop()
+
+    def _run(self, origin, tx_hash, func, commit=True):
+        """
+        Run 'func' in a TX. Changes are kept only if it succeeds and 'commit'.
+        :return: (error message or None, return value of func, events, gas)
+        """
+        # a block per second from the genesis, to be deterministic
+        block_no = self.height + (1 if commit else 0)
+        self.tx_ctx = SimpleNamespace(origin=origin, tx_hash=tx_hash, block_no=block_no,
+                                      timestamp=(STANDIN_GENESIS_TIME + block_no) * 10**9)
+        self._touched = {}
+        self._pending_events = []
+        gas = {address: contract.gas for address, contract in self.contracts.items()}
+        error = None
+        ret = None
+        try:
+            ret = func()
+        except (LuaError, sqlite3.Error, TypeError, ValueError) as e:
+            error = str(e)
+
+        for address, storage in self._touched.items():
+            contract = self.contracts[address]
+            if error is None and commit:
+                contract.db.execute("RELEASE standin_tx")
+            else:
+                contract.db.execute("ROLLBACK TO standin_tx")
+                contract.db.execute("RELEASE standin_tx")
+                contract.storage = storage
+        gas = sum(contract.gas - gas.get(address, 0) for address, contract in self.contracts.items())
+        events = self._pending_events
+        self._touched = None
+        self._pending_events = None
+        self.tx_ctx = None
+        return error, ret, events, gas
+
+    def _commit_tx(self, origin, nonce, tx_hash, error, ret, events, gas, contract_address=None,
+                   status=None):
+        self.height += 1
+        event_list = []
+        if error is None:
+            for i, (address, name, args) in enumerate(events):
+                event = SimpleNamespace(contract_address=address, name=name, arguments=args,
+                                        tx_hash=tx_hash, tx_index=0, block_height=self.height,
+                                        index=i)
+                event_list.append(event)
+                self.events.append(event)
+        self.tx_results[tx_hash] = SimpleNamespace(
+            tx_id=tx_hash, tx_hash=tx_hash, block_no=self.height,
+            status=herapy.TxResultStatus.ERROR if error is not None else status,
+            detail=error if error is not None else ret,
+            contract_address=contract_address or '',
+            from_address=origin, gas_used=gas, fee_used=0,
+            event_list=event_list,
+        )
+
+    def _check_nonce(self, origin, nonce):
+        account = self.get_account_state(origin)
+        if nonce <= account.nonce:
+            return herapy.CommitStatus.TX_NONCE_TOO_LOW
+        if nonce != account.nonce + 1:
+            return herapy.CommitStatus.TX_INVALID_FORMAT
+        account.nonce = nonce
+        return herapy.CommitStatus.TX_OK
+
+    def deploy(self, origin, nonce, payload, args):
+        tx_hash = encode_tx_hash(hashlib.sha256('{}:{}:deploy'.format(origin, nonce).encode()).digest())
+        status = self._check_nonce(origin, nonce)
+        if status != herapy.CommitStatus.TX_OK:
+            return tx_hash, status
+
+        address = encode_address(b'\x02' + hashlib.sha256('{}:{}'.format(origin, nonce).encode()).digest())
+
+        def construct():
+            if not payload.startswith(STANDIN_PAYLOAD_PREFIX):
+                raise ValueError("not a payload of the stand-in aergoluac")
+            source = bytes.fromhex(payload[len(STANDIN_PAYLOAD_PREFIX):]).decode('utf-8')
+            contract = Contract(self, address, origin, source)
+            self.contracts[address] = contract
+            self.frames.append(SimpleNamespace(contract=address, sender=origin))
+            try:
+                return contract.invoke('constructor', args, constructor=True)
+            finally:
+                self.frames.pop()
+
+        error, ret, events, gas = self._run(origin, tx_hash, construct)
+        if error is not None:
+            self.contracts.pop(address, None)
+        self._commit_tx(origin, nonce, tx_hash, error, encode_return(ret or ()), events, gas,
+                        contract_address=address, status=herapy.TxResultStatus.CREATED)
+        return tx_hash, status
+
+    def call(self, origin, nonce, address, func_name, args):
+        tx_hash = encode_tx_hash(hashlib.sha256('{}:{}:call'.format(origin, nonce).encode()).digest())
+        status = self._check_nonce(origin, nonce)
+        if status != herapy.CommitStatus.TX_OK:
+            return tx_hash, status
+
+        error, ret, events, gas = self._run(origin, tx_hash,
+                                            lambda: self.call_contract(origin, address, func_name, args))
+        self._commit_tx(origin, nonce, tx_hash, error, encode_return(ret or ()), events, gas,
+                        contract_address=address, status=herapy.TxResultStatus.SUCCESS)
+        return tx_hash, status
+
+    def query(self, origin, address, func_name, args):
+        error, ret, _, gas = self._run(origin, None,
+                                       lambda: self.call_contract(origin, address, func_name, args),
+                                       commit=False)
+        # a query has no receipt, so keep its gas here
+        self.query_gas = gas
+        if error is not None:
+            raise CommunicationException(RuntimeError(error))
+        return encode_return(ret).encode('utf-8')
+
+
+class StandinAergo:
+    """
+    A client of StandinNode with the same interface as herapy.Aergo.
+    """
+    def __init__(self, node):
+        self.node = node
+        self.account = None
+        self.target = None
+
+    def connect(self, target=None, *args, **kwargs):
+        self.target = target
+
+    def disconnect(self):
+        self.target = None
+
+    def new_account(self, private_key=None, skip_state=False):
+        seed = private_key or '{}:{}'.format(id(self), len(self.node.accounts))
+        address = encode_address(b'\x03' + hashlib.sha256(str(seed).encode()).digest())
+        self.account = SimpleNamespace(address=address, private_key=seed, nonce=0,
+                                       balance=SimpleNamespace(aergo=0))
+        if not skip_state:
+            self.get_account()
+        return self.account
+
+    def import_account(self, exported_data, password, skip_state=False, skip_self=False):
+        return self.new_account(private_key=exported_data, skip_state=skip_state)
+
+    def export_account(self, password=None):
+        return self.account.private_key
+
+    def get_account(self, *args, **kwargs):
+        state = self.node.get_account_state(self.account.address)
+        self.account.nonce = state.nonce
+        return self.account
+
+    def get_blockchain_status(self):
+        return hashlib.sha256(str(self.node.height).encode()).digest(), self.node.height
+
+    def _send(self, send):
+        nonce = self.account.nonce + 1
+        tx_hash, status = send(nonce)
+        if status == herapy.CommitStatus.TX_OK:
+            self.account.nonce = nonce
+        return (SimpleNamespace(tx_hash=tx_hash, nonce=nonce),
+                SimpleNamespace(status=status, detail='' if status == herapy.CommitStatus.TX_OK else status.name))
+
+    def deploy_sc(self, payload, amount=0, args=None, *_, **__):
+        if args is not None and not isinstance(args, (list, tuple)):
+            args = [args]
+        return self._send(lambda nonce: self.node.deploy(self.account.address, nonce, payload, list(args or [])))
+
+    def call_sc(self, sc_address, func_name, amount=0, args=None, *_, **__):
+        if args is not None and not isinstance(args, (list, tuple)):
+            args = [args]
+        return self._send(lambda nonce: self.node.call(self.account.address, nonce, str(sc_address),
+                                                       func_name, list(args or [])))
+
+    def query_sc(self, sc_address, func_name, args=None):
+        if args is not None and not isinstance(args, (list, tuple)):
+            args = [args]
+        origin = self.account.address if self.account is not None else None
+        return self.node.query(origin, str(sc_address), func_name, list(args or []))
+
+    def get_tx_result(self, tx_hash):
+        result = self.node.tx_results.get(str(tx_hash))
+        if result is None:
+            raise CommunicationException(RuntimeError("tx not found"))
+        return result
+
+    def get_events(self, sc_address, event_name, start_block_no=-1, end_block_no=-1, *_, **__):
+        return [e for e in self.node.events
+                if e.contract_address == str(sc_address) and e.name == event_name
+                and (start_block_no < 0 or e.block_height >= start_block_no)
+                and (end_block_no < 0 or e.block_height <= end_block_no)]
@@ -0,0 +1,192 @@
+import json
+import statistics
+import threading
+import time
+
+HSC_TRACE_PROMETHEUS_SUFFIX = ".prom"
+HSC_TRACE_METRIC_PREFIX = "hsc"
+
+# the running trace, None when tracing is off
+TRACE = None
+
+
+class Trace:
+    """
+    Records of deploys, calls and queries sent to HSC.
+    Each record is appended to a JSONL file at once, or the totals are written
+    in the Prometheus text format (a '.prom' file, e.g. for the textfile
+    collector of node_exporter) when the trace is closed.
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.records = []
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.jsonl = None
+        if path is not None and not path.endswith(HSC_TRACE_PROMETHEUS_SUFFIX):
+            self.jsonl = open(path, 'a')
+
+    def submitted(self, tx_hash, kind, module, func_name, tx_size):
+        with self.lock:
+            self.pending[str(tx_hash)] = (time.time(), kind, module, func_name, tx_size)
+
+    def confirmed(self, tx_hash, result, response_size=0):
+        now = time.time()
+        with self.lock:
+            pending = self.pending.pop(str(tx_hash), None)
+        if pending is None:
+            return
+        start, kind, module, func_name, tx_size = pending
+        fee = getattr(result, 'fee_used', None)
+        self.add({
+            'kind': kind,
+            'module': module,
+            'func_name': func_name,
+            'tx_hash': str(tx_hash),
+            'tx_size': tx_size,
+            'gas_used': getattr(result, 'gas_used', None),
+            'fee_used': int(fee) if fee is not None else None,
+            'latency': round(now - start, 6),
+            'response_size': response_size,
+            'status': str(getattr(result, 'status', '')),
+        })
+
+    def queried(self, module, func_name, tx_size, elapsed, response_size):
+        self.add({
+            'kind': 'query',
+            'module': module,
+            'func_name': func_name,
+            'tx_size': tx_size,
+            'latency': round(elapsed, 6),
+            'response_size': response_size,
+        })
+
+    def add(self, record):
+        record['time'] = time.time()
+        with self.lock:
+            self.records.append(record)
+            if self.jsonl is not None:
+                self.jsonl.write(json.dumps(record, sort_keys=True) + '\n')
+                self.jsonl.flush()
+
+    def summarize(self):
+        """
+        :return: {(kind, module, func_name): totals} sorted by fee and gas
+        """
+        groups = {}
+        with self.lock:
+            records = list(self.records)
+        for r in records:
+            groups.setdefault((r['kind'], r['module'], r['func_name']), []).append(r)
+
+        summary = {}
+        for key, rs in groups.items():
+            latency = [r['latency'] for r in rs]
+            summary[key] = {
+                'count': len(rs),
+                'gas_used': sum(r.get('gas_used') or 0 for r in rs),
+                'fee_used': sum(r.get('fee_used') or 0 for r in rs),
+                'latency_median': statistics.median(latency),
+                'latency_max': max(latency),
+                'tx_size': sum(r['tx_size'] for r in rs),
+                'response_size': sum(r['response_size'] for r in rs),
+            }
+        return dict(sorted(summary.items(), key=lambda kv: (-kv[1]['fee_used'], -kv[1]['gas_used'], kv[0])))
+
+    def format_summary(self):
+        lines = ["  {:<7} {:<40} {:>5} {:>12} {:>16} {:>9} {:>9} {:>9} {:>9}".format(
+            'kind', 'function', 'count', 'gas', 'fee (aer)', 'med (ms)', 'max (ms)', 'tx (B)', 'resp (B)')]
+        for (kind, module, func_name), s in self.summarize().items():
+            name = "{}.{}".format(module, func_name) if module else func_name
+            lines.append("  {:<7} {:<40} {:>5} {:>12} {:>16} {:>9.1f} {:>9.1f} {:>9} {:>9}".format(
+                kind, name, s['count'], s['gas_used'], s['fee_used'], s['latency_median'] * 1000,
+                s['latency_max'] * 1000, s['tx_size'], s['response_size']))
+        return lines
+
+    def format_prometheus(self):
+        metrics = [
+            ('calls_total', 'counter', 'the number of calls', lambda s: s['count']),
+            ('gas_used_total', 'counter', 'the gas used by calls', lambda s: s['gas_used']),
+            ('fee_used_aer_total', 'counter', 'the fee (aer) used by calls', lambda s: s['fee_used']),
+            ('latency_seconds_median', 'gauge', 'the median latency (submit to receipt for a TX)',
+             lambda s: s['latency_median']),
+            ('latency_seconds_max', 'gauge', 'the max latency (submit to receipt for a TX)',
+             lambda s: s['latency_max']),
+            ('tx_bytes_total', 'counter', 'the size of requests', lambda s: s['tx_size']),
+            ('response_bytes_total', 'counter', 'the size of responses', lambda s: s['response_size']),
+        ]
+        summary = self.summarize()
+        lines = []
+        for name, metric_type, help_text, value in metrics:
+            name = "{}_{}".format(HSC_TRACE_METRIC_PREFIX, name)
+            lines.append("# HELP {} {}".format(name, help_text))
+            lines.append("# TYPE {} {}".format(name, metric_type))
+            for (kind, module, func_name), s in sorted(summary.items()):
+                lines.append('{}{{kind="{}",module="{}",function="{}"}} {}'.format(
+                    name, kind, module, func_name, value(s)))
+        return '\n'.join(lines) + '\n'
+
+    def close(self):
+        if self.jsonl is not None:
+            self.jsonl.close()
+            self.jsonl = None
+        elif self.path is not None:
+            with open(self.path, 'w') as f:
+                f.write(self.format_prometheus())
+
+
+def start(path=None):
+    """
+    Start tracing, records are kept in memory only when 'path' is None.
+    """
+    global TRACE
+    TRACE = Trace(path)
+    return TRACE
+
+
+def stop():
+    global TRACE
+    trace, TRACE = TRACE, None
+    if trace is not None:
+        trace.close()
+    return trace
+
+
+def submitted(tx_hash, kind, module, func_name, tx_size):
+    if TRACE is not None:
+        TRACE.submitted(tx_hash, kind, module, func_name, tx_size)
+
+
+def confirmed(tx_hash, result, response_size=0):
+    if TRACE is not None:
+        TRACE.confirmed(tx_hash, result, response_size)
+
+
+def queried(module, func_name, tx_size, elapsed, response_size):
+    if TRACE is not None:
+        TRACE.queried(module, func_name, tx_size, elapsed, response_size)
+
+
+def get_call_size(func_name, args):
+    # the size of the call payload, '{"Name": ..., "Args": ...}'
+    return len(json.dumps({'Name': func_name, 'Args': args or []}, separators=(',', ':')))
+
+
+def get_response_size(result):
+    # a call of HSC returns its response by the 'HSC' event
+    if getattr(result, 'detail', None):
+        return len(result.detail)
+    for event in (getattr(result, 'event_list', None) or []):
+        if event.name == 'HSC' and len(event.arguments) > 2:
+            return len(str(event.arguments[2]))
+    return 0
+
+
+def split_hsc_function(func_name, args):
+    """
+    :return: (module, function) of a call, the HSC module function for
+             'callFunction' and 'queryFunction'
+    """
+    if func_name in ('callFunction', 'queryFunction') and args:
+        return args[0], args[1] if len(args) > 1 else ''
+    return '', func_name
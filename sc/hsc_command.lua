@@ -12,23 +12,42 @@ MODULE_NAME_CSPACE = "__HSC_SPACE_COMPUTING__"
 state.var {
   -- contant variables
   _MANIFEST_ADDRESS = state.value(),
+  -- addresses of the other modules, kept up to date by the Manifest
+  _MODULE_ADDRESS = state.map(),
 }
 
 local function __init__(manifestAddress)
   _MANIFEST_ADDRESS:set(manifestAddress)
   local scAddress = system.getContractID()
   system.print(MODULE_NAME .. "__init__: sc_address=" .. scAddress)
-  contract.call(_MANIFEST_ADDRESS:get(),
+  local modules = contract.call(_MANIFEST_ADDRESS:get(),
     "__init_module__", MODULE_NAME, scAddress)
+  for name, address in pairs(modules or {}) do
+    _MODULE_ADDRESS[name] = address
+  end
 end
 
 local function __callFunction(module_name, func_name, ...)
   system.print(MODULE_NAME .. "__callFucntion: module_name=" .. module_name
           .. ", func_name=" .. func_name)
+  local address = _MODULE_ADDRESS[module_name]
+  if address ~= nil then
+    return contract.call(address, func_name, ...)
+  end
+  -- not registered yet, through the Manifest
   return contract.call(_MANIFEST_ADDRESS:get(),
     "__call_module_function__", module_name, func_name, ...)
 end
 
+function __set_module_address__(module_name, address)
+  assert(system.getSender() == _MANIFEST_ADDRESS:get(),
+    "__set_module_address__:ERROR: only the Manifest can set a module address.")
+  _MODULE_ADDRESS[module_name] = address
+end
+
+-- internal functions
+abi.register(__set_module_address__)
+
 --[[ ====================================================================== ]]--
 
 function constructor(manifestAddress)
@@ -127,47 +146,51 @@ function addCommand(cmd_type, cmd_body, target_list)
 
   local orderer_list = res["user_list"]
 
-  -- insert a new command
-  __callFunction(MODULE_NAME_DB, "insert",
-    [[INSERT INTO commands(cmd_type,
-                           cmd_id,
-                           cmd_orderer,
-                           cmd_block_no,
-                           cmd_tx_id,
-                           cmd_body)
-             VALUES (?, ?, ?, ?, ?, ?)]],
-    cmd_type, cmd_id, orderer, block_no, cmd_id, cmd_body_raw)
+  -- insert a new command, all rows are inserted at once after checking targets
+  local statements = {
+    {
+      sql = [[INSERT INTO commands(cmd_type,
+                                   cmd_id,
+                                   cmd_orderer,
+                                   cmd_block_no,
+                                   cmd_tx_id,
+                                   cmd_body)
+                     VALUES (?, ?, ?, ?, ?, ?)]],
+      args = { cmd_type, cmd_id, orderer, block_no, cmd_id, cmd_body_raw },
+    },
+  }
+
+  -- owners of all targets at once
+  local owner_list = {}
+  if #target_list > 0 then
+    local targets = {}
+    for _, v in ipairs(target_list) do
+      table.insert(targets, { cluster_id = v['cluster_id'], machine_id = v['machine_id'] })
+    end
+    local res = __callFunction(MODULE_NAME_CSPACE, "getOwners", targets)
+    if "200" ~= res["__status_code"] then
+      return res
+    end
+    owner_list = res["owner_list"]
+  end
 
   -- one command to multiple Horde targets
   local exist = false
-  for _, v in pairs(target_list) do
+  for i, v in ipairs(target_list) do
     local target_index = v['target_index']
     local cluster_id = v['cluster_id']
     local machine_id = v['machine_id']
     system.print(MODULE_NAME .. "addCommand target: index=" .. target_index
             .. ", cluster_id=" .. cluster_id
-            .. ", machine_id=" .. machine_id)
+            .. ", machine_id=" .. tostring(machine_id))
 
     local owner
-    local is_public
     if isEmpty(machine_id) then
-      local res = __callFunction(MODULE_NAME_CSPACE, "getCluster", cluster_id)
-      system.print(MODULE_NAME .. "addCommand: res=" .. json:encode(res))
-      if "200" ~= res["__status_code"] then
-        return res
-      end
-      owner = res["cluster_owner"]
-      is_public = res["cluster_is_public"]
+      owner = owner_list[i]["cluster_owner"]
     else
-      local res = __callFunction(MODULE_NAME_CSPACE, "getMachine",
-        cluster_id, machine_id)
-      system.print(MODULE_NAME .. "addCommand: res=" .. json:encode(res))
-      if "200" ~= res["__status_code"] then
-        return res
-      end
-      owner = res["machine_list"][1]["machine_owner"]
-      is_public = res["cluster_is_public"]
+      owner = owner_list[i]["machine_owner"]
     end
+    local is_public = owner_list[i]["cluster_is_public"]
 
     system.print(MODULE_NAME .. "addCommand: owner=" .. tostring(owner))
 
@@ -197,16 +220,32 @@ function addCommand(cmd_type, cmd_body, target_list)
       end
     end
 
-    __callFunction(MODULE_NAME_DB, "insert",
-      [[INSERT INTO command_targets(cmd_id,
-                                    cluster_id,
-                                    machine_id,
-                                    target_index,
-                                    status,
-                                    status_block_no,
-                                    status_tx_id)
-               VALUES (?, ?, ?, ?, ?, ?, ?)]],
-      cmd_id, cluster_id, machine_id, target_index, "INIT", block_no, cmd_id)
+    -- 'args' cannot have a nil hole, so a missing machine_id leaves the column out (NULL)
+    --  and any other value, even "", is stored as it is
+    if nil == machine_id then
+      table.insert(statements, {
+        sql = [[INSERT INTO command_targets(cmd_id,
+                                            cluster_id,
+                                            target_index,
+                                            status,
+                                            status_block_no,
+                                            status_tx_id)
+                       VALUES (?, ?, ?, ?, ?, ?)]],
+        args = { cmd_id, cluster_id, target_index, "INIT", block_no, cmd_id },
+      })
+    else
+      table.insert(statements, {
+        sql = [[INSERT INTO command_targets(cmd_id,
+                                            cluster_id,
+                                            machine_id,
+                                            target_index,
+                                            status,
+                                            status_block_no,
+                                            status_tx_id)
+                       VALUES (?, ?, ?, ?, ?, ?, ?)]],
+        args = { cmd_id, cluster_id, machine_id, target_index, "INIT", block_no, cmd_id },
+      })
+    end
 
     exist = true
   end
@@ -237,15 +276,18 @@ function addCommand(cmd_type, cmd_body, target_list)
     --            So, 2/3 agreements makes execute the command on the MiniHorde.
 
     -- insert a system command for all Hordes
-    __callFunction(MODULE_NAME_DB, "insert",
-      [[INSERT INTO command_targets(cmd_id,
-                                    status,
-                                    status_block_no,
-                                    status_tx_id)
-                VALUES (?, ?, ?, ?)]],
-      cmd_id, "INIT", block_no, cmd_id)
+    table.insert(statements, {
+      sql = [[INSERT INTO command_targets(cmd_id,
+                                          status,
+                                          status_block_no,
+                                          status_tx_id)
+                     VALUES (?, ?, ?, ?)]],
+      args = { cmd_id, "INIT", block_no, cmd_id },
+    })
   end
 
+  __callFunction(MODULE_NAME_DB, "batch", statements)
+
   -- success to write (201 Created)
   return {
     __module = MODULE_NAME,
@@ -266,8 +308,9 @@ function addCommand(cmd_type, cmd_body, target_list)
   }
 end
 
-function getSystemCommands()
-  system.print(MODULE_NAME .. "getSystemCommands")
+function getSystemCommands(page_size, cursor)
+  system.print(MODULE_NAME .. "getSystemCommands: page_size=" .. tostring(page_size)
+          .. ", cursor=" .. tostring(cursor))
 
   local sender = system.getOrigin()
   local block_no = system.getBlockheight()
@@ -280,13 +323,16 @@ function getSystemCommands()
                         command_targets.cluster_id, command_targets.machine_id,
                         command_targets.status, command_targets.status_block_no,
                         command_targets.status_tx_id,
-                        command_targets.target_index
+                        command_targets.target_index,
+                        commands.cmd_block_no AS __block_no,
+                        command_targets.rowid AS __rowid
                   FROM commands INNER JOIN command_targets
                   WHERE commands.cmd_id = command_targets.cmd_id
                     AND command_targets.cluster_id IS NULL
-                    AND command_targets.machine_id IS NULL
-                  ORDER BY commands.cmd_block_no DESC]]
-  local rows = __callFunction(MODULE_NAME_DB, "select", sql)
+                    AND command_targets.machine_id IS NULL]]
+  local page = __callFunction(MODULE_NAME_DB, "selectPage", sql,
+    { size = page_size, cursor = cursor, desc = true })
+  local rows = page["rows"]
 
   local cmd_list = {}
   local exist = false
@@ -331,7 +377,8 @@ function getSystemCommands()
     __status_code = "200",
     __status_sub_code = "",
     sender = sender,
-    cmd_list = cmd_list
+    cmd_list = cmd_list,
+    next_cursor = page["next_cursor"]
   }
 end
 
@@ -433,10 +480,12 @@ function getCommand(cmd_id)
   }
 end
 
-function getCommandsOfTarget(cluster_id, machine_id, status)
+function getCommandsOfTarget(cluster_id, machine_id, status, page_size, cursor)
   system.print(MODULE_NAME .. "getCommandsOfTarget: cluster_id=" .. tostring(cluster_id)
           .. ", machine_id=" .. tostring(machine_id)
-          .. ", status=" .. tostring(status))
+          .. ", status=" .. tostring(status)
+          .. ", page_size=" .. tostring(page_size)
+          .. ", cursor=" .. tostring(cursor))
 
   local sender = system.getOrigin()
   local block_no = system.getBlockheight()
@@ -463,10 +512,13 @@ function getCommandsOfTarget(cluster_id, machine_id, status)
                         command_targets.cluster_id, command_targets.machine_id,
                         command_targets.status, command_targets.status_block_no,
                         command_targets.status_tx_id,
-                        command_targets.target_index
+                        command_targets.target_index,
+                        commands.cmd_block_no AS __block_no,
+                        command_targets.rowid AS __rowid
                   FROM commands INNER JOIN command_targets
                   WHERE commands.cmd_id = command_targets.cmd_id]]
-  local rows
+  local page_info = { size = page_size, cursor = cursor, desc = false }
+  local page
 
   if isEmpty(status) then
     sql = sql .. " AND ((command_targets.cluster_id = ?"
@@ -474,12 +526,11 @@ function getCommandsOfTarget(cluster_id, machine_id, status)
       sql = sql .. " AND command_targets.machine_id = ?"
     end
     sql = sql .. ") OR command_targets.cluster_id IS NULL)"
-    sql = sql .. " ORDER BY commands.cmd_block_no"
 
     if isEmpty(machine_id) then
-      rows = __callFunction(MODULE_NAME_DB, "select", sql, cluster_id)
+      page = __callFunction(MODULE_NAME_DB, "selectPage", sql, page_info, cluster_id)
     else
-      rows = __callFunction(MODULE_NAME_DB, "select", sql, cluster_id, machine_id)
+      page = __callFunction(MODULE_NAME_DB, "selectPage", sql, page_info, cluster_id, machine_id)
     end
   else
     sql = sql .. " AND ((command_targets.cluster_id = ?"
@@ -488,16 +539,16 @@ function getCommandsOfTarget(cluster_id, machine_id, status)
     end
     sql = sql .. ") OR command_targets.cluster_id IS NULL)"
     sql = sql .. " AND command_targets.status = ?"
-    sql = sql .. " ORDER BY commands.cmd_block_no"
 
     if isEmpty(machine_id) then
-      rows = __callFunction(MODULE_NAME_DB, "select",
-        sql, cluster_id, status)
+      page = __callFunction(MODULE_NAME_DB, "selectPage",
+        sql, page_info, cluster_id, status)
     else
-      rows = __callFunction(MODULE_NAME_DB, "select",
-        sql, cluster_id, machine_id, status)
+      page = __callFunction(MODULE_NAME_DB, "selectPage",
+        sql, page_info, cluster_id, machine_id, status)
     end
   end
+  local rows = page["rows"]
 
   local cmd_list = {}
   local exist = false
@@ -545,7 +596,106 @@ function getCommandsOfTarget(cluster_id, machine_id, status)
     __status_code = "200",
     __status_sub_code = "",
     sender = sender,
-    cmd_list = cmd_list
+    cmd_list = cmd_list,
+    next_cursor = page["next_cursor"]
+  }
+end
+
+-- commands and target status changes of a target after a watermark
+--  * since_block_no: the watermark, "watermark" of the previous response (0 or nil for all)
+--  * a new command and a status change both set status_block_no of the target,
+--    so the rows after the watermark are every change since the previous poll
+--  * always 200 OK, "watermark" is the block height this response covers and
+--    it is only returned with the last page (next_cursor is nil)
+function getCommandsOfTargetSince(cluster_id, machine_id, since_block_no, page_size, cursor)
+  system.print(MODULE_NAME .. "getCommandsOfTargetSince: cluster_id=" .. tostring(cluster_id)
+          .. ", machine_id=" .. tostring(machine_id)
+          .. ", since_block_no=" .. tostring(since_block_no)
+          .. ", page_size=" .. tostring(page_size)
+          .. ", cursor=" .. tostring(cursor))
+
+  local sender = system.getOrigin()
+  local block_no = system.getBlockheight()
+
+  -- if not exist, (400 Bad Request)
+  if isEmpty(cluster_id) then
+    return {
+      __module = MODULE_NAME,
+      __block_no = block_no,
+      __func_name = "getCommandsOfTargetSince",
+      __status_code = "400",
+      __status_sub_code = "",
+      __err_msg = "bad request: need a target to search",
+      sender = sender,
+      cluster_id = cluster_id,
+    }
+  end
+  since_block_no = tonumber(since_block_no) or 0
+
+  local sql = [[SELECT commands.cmd_type, commands.cmd_id,
+                        commands.cmd_orderer, commands.cmd_block_no,
+                        commands.cmd_tx_id, commands.cmd_body,
+                        command_targets.cluster_id, command_targets.machine_id,
+                        command_targets.status, command_targets.status_block_no,
+                        command_targets.status_tx_id,
+                        command_targets.target_index,
+                        command_targets.status_block_no AS __block_no,
+                        command_targets.rowid AS __rowid
+                  FROM commands INNER JOIN command_targets
+                  WHERE commands.cmd_id = command_targets.cmd_id
+                    AND command_targets.status_block_no > ?]]
+  local page_info = { size = page_size, cursor = cursor, desc = false }
+  local page
+
+  sql = sql .. " AND ((command_targets.cluster_id = ?"
+  if not isEmpty(machine_id) then
+    sql = sql .. " AND command_targets.machine_id = ?"
+  end
+  sql = sql .. ") OR (command_targets.cluster_id IS NULL"
+            .. " AND command_targets.machine_id IS NULL))"
+
+  if isEmpty(machine_id) then
+    page = __callFunction(MODULE_NAME_DB, "selectPage", sql, page_info,
+      since_block_no, cluster_id)
+  else
+    page = __callFunction(MODULE_NAME_DB, "selectPage", sql, page_info,
+      since_block_no, cluster_id, machine_id)
+  end
+
+  local cmd_list = {}
+  for _, v in pairs(page["rows"]) do
+    table.insert(cmd_list, {
+      cmd_type = v[1],
+      cmd_id = v[2],
+      cmd_orderer = v[3],
+      cmd_block_no = v[4],
+      cmd_tx_id = v[5],
+      cmd_body = json:decode(v[6]),
+      cluster_id = v[7],
+      machine_id = v[8],
+      status = v[9],
+      status_block_no = v[10],
+      status_tx_id = v[11],
+      target_index = v[12],
+    })
+  end
+
+  local watermark = nil
+  if nil == page["next_cursor"] then
+    watermark = block_no
+  end
+
+  -- 200 OK
+  return {
+    __module = MODULE_NAME,
+    __block_no = block_no,
+    __func_name = "getCommandsOfTargetSince",
+    __status_code = "200",
+    __status_sub_code = "",
+    sender = sender,
+    cmd_list = cmd_list,
+    next_cursor = page["next_cursor"],
+    watermark = watermark
   }
 end
 
@@ -577,25 +727,21 @@ function updateTarget(cmd_id, cluster_id, machine_id, target_index, status)
     }
   end
 
+  local res = __callFunction(MODULE_NAME_CSPACE, "getOwners",
+    { { cluster_id = cluster_id, machine_id = machine_id } })
+  system.print(MODULE_NAME .. "updateTarget: res=" .. json:encode(res))
+  if "200" ~= res["__status_code"] then
+    return res
+  end
+
   local c_or_m_owner
   local c_or_m_id
   if isEmpty(machine_id) then
-    local res = __callFunction(MODULE_NAME_CSPACE, "getCluster", cluster_id)
-    system.print(MODULE_NAME .. "updateTarget: res=" .. json:encode(res))
-    if "200" ~= res["__status_code"] then
-      return res
-    end
-    c_or_m_owner = res["cluster_owner"]
-    c_or_m_id = res["cluster_id"]
+    c_or_m_owner = res["owner_list"][1]["cluster_owner"]
+    c_or_m_id = cluster_id
   else
-    local res = __callFunction(MODULE_NAME_CSPACE, "getMachine",
-      cluster_id, machine_id)
-    system.print(MODULE_NAME .. "updateTarget: res=" .. json:encode(res))
-    if "200" ~= res["__status_code"] then
-      return res
-    end
-    c_or_m_owner = res["machine_list"][1]["machine_owner"]
-    c_or_m_id = res["machine_list"][1]["machine_id"]
+    c_or_m_owner = res["owner_list"][1]["machine_owner"]
+    c_or_m_id = machine_id
   end
 
   -- check permissions (403.3 Write access forbidden)
@@ -704,25 +850,21 @@ function addCommandResult(cmd_id, cluster_id, machine_id, target_index, result)
     }
   end
 
+  local res = __callFunction(MODULE_NAME_CSPACE, "getOwners",
+    { { cluster_id = cluster_id, machine_id = machine_id } })
+  system.print(MODULE_NAME .. "addCommandResult: res=" .. json:encode(res))
+  if "200" ~= res["__status_code"] then
+    return res
+  end
+
   local c_or_m_owner
   local c_or_m_id
   if isEmpty(machine_id) then
-    local res = __callFunction(MODULE_NAME_CSPACE, "getCluster", cluster_id)
-    system.print(MODULE_NAME .. "addCommandResult: res=" .. json:encode(res))
-    if "200" ~= res["__status_code"] then
-      return res
-    end
-    c_or_m_owner = res["cluster_owner"]
-    c_or_m_id = res["cluster_id"]
+    c_or_m_owner = res["owner_list"][1]["cluster_owner"]
+    c_or_m_id = cluster_id
   else
-    local res = __callFunction(MODULE_NAME_CSPACE, "getMachine",
-      cluster_id, machine_id)
-    system.print(MODULE_NAME .. "addCommandResult: res=" .. json:encode(res))
-    if "200" ~= res["__status_code"] then
-      return res
-    end
-    c_or_m_owner = res["machine_list"][1]["machine_owner"]
-    c_or_m_id = res["machine_list"][1]["machine_id"]
+    c_or_m_owner = res["owner_list"][1]["machine_owner"]
+    c_or_m_id = machine_id
   end
 
   -- check permissions (403.3 Write access forbidden)
@@ -898,5 +1040,33 @@ function getCommandResult(cmd_id)
   }
 end
 
+--[[ ====================================================================== ]]--
+
+-- schema migrations, MIGRATIONS[v] upgrades the schema to the version v
+--  * the Manifest applies them, and stores the applied version
+--  * never change a deployed migration, append a new version instead
+local MIGRATIONS = {
+  -- v1: indexes for the target filters and block order of commands
+  {
+    [[CREATE INDEX IF NOT EXISTS command_targets_target ON command_targets(cluster_id, machine_id, status)]],
+    [[CREATE INDEX IF NOT EXISTS commands_block_no ON commands(cmd_block_no)]],
+  },
+  -- v2: index for the watermark of getCommandsOfTargetSince
+  {
+    [[CREATE INDEX IF NOT EXISTS command_targets_status_block_no
+        ON command_targets(cluster_id, machine_id, status_block_no)]],
+  },
+  -- v3: index for the watermark of getCommandsOfTargetSince of a whole cluster
+  {
+    [[CREATE INDEX IF NOT EXISTS command_targets_cluster_status_block_no
+        ON command_targets(cluster_id, status_block_no)]],
+  },
+}
+
+function getMigrations()
+  return MIGRATIONS
+end
+
 abi.register(addCommand, getSystemCommands, getCommand, getCommandsOfTarget,
-  updateTarget, addCommandResult, getCommandResult)
+  getCommandsOfTargetSince, updateTarget, addCommandResult, getCommandResult)
+abi.register_view(getMigrations)
@@ -9,29 +9,63 @@ MODULE_NAME_DB = "__MANIFEST_DB__"
 state.var {
   -- contant variables
   _MANIFEST_ADDRESS = state.value(),
+  -- addresses of the other modules, kept up to date by the Manifest
+  _MODULE_ADDRESS = state.map(),
+  -- module names by address, to allow direct calls from modules
+  _MODULE_NAME = state.map(),
 }
 
+local function __setModuleAddress(module_name, address)
+  local old_address = _MODULE_ADDRESS[module_name]
+  if old_address ~= nil then
+    _MODULE_NAME:delete(old_address)
+  end
+  _MODULE_ADDRESS[module_name] = address
+  _MODULE_NAME[address] = module_name
+end
+
 local function __init__(manifestAddress)
   _MANIFEST_ADDRESS:set(manifestAddress)
   local scAddress = system.getContractID()
   system.print(MODULE_NAME .. "__init__: sc_address=" .. scAddress)
-  contract.call(_MANIFEST_ADDRESS:get(),
+  local modules = contract.call(_MANIFEST_ADDRESS:get(),
     "__init_module__", MODULE_NAME, scAddress)
+  for name, address in pairs(modules or {}) do
+    __setModuleAddress(name, address)
+  end
 end
 
 local function __callFunction(module_name, func_name, ...)
   system.print(MODULE_NAME .. "__callFucntion: module_name=" .. module_name
           .. ", func_name=" .. func_name)
+  local address = _MODULE_ADDRESS[module_name]
+  if address ~= nil then
+    return contract.call(address, func_name, ...)
+  end
+  -- not registered yet, through the Manifest
   return contract.call(_MANIFEST_ADDRESS:get(),
     "__call_module_function__", module_name, func_name, ...)
 end
 
+function __set_module_address__(module_name, address)
+  assert(system.getSender() == _MANIFEST_ADDRESS:get(),
+    "__set_module_address__:ERROR: only the Manifest can set a module address.")
+  __setModuleAddress(module_name, address)
+end
+
+-- internal functions
+abi.register(__set_module_address__)
+
 local function __getManifestAddress()
   local address = _MANIFEST_ADDRESS:get()
   system.print(MODULE_NAME .. "__getManifestAddress: address=" .. address) 
   return address
 end
 
+local function __isModuleAddress(address)
+  return _MODULE_NAME[address] ~= nil
+end
+
 --[[ ====================================================================== ]]--
 
 function constructor(manifestAddress)
@@ -173,7 +207,7 @@ function findUser(user_address)
   end
 
   -- check permissions (403.2 Read access forbidden)
-  if sender ~= __getManifestAddress() then
+  if sender ~= __getManifestAddress() and not __isModuleAddress(sender) then
     return {
       __module = MODULE_NAME,
       __block_no = block_no,
@@ -542,4 +576,21 @@ function updateUser(user_id, user_address, metadata)
   }
 end
 
+--[[ ====================================================================== ]]--
+
+-- schema migrations, MIGRATIONS[v] upgrades the schema to the version v
+--  * the Manifest applies them, and stores the applied version
+--  * never change a deployed migration, append a new version instead
+local MIGRATIONS = {
+  -- v1: indexes for the user_address filter of findUser
+  {
+    [[CREATE INDEX IF NOT EXISTS horde_users_address ON horde_users(user_address)]],
+  },
+}
+
+function getMigrations()
+  return MIGRATIONS
+end
+
 abi.register(createUser, findUser, getUser, deleteUser, updateUser)
+abi.register_view(getMigrations)
@@ -8,16 +8,31 @@
 
 MODULE_NAME = "__MANIFEST__"
 
+state.var {
+  -- module name -> address, to route calls without a SQL query
+  _MODULE_ADDRESS = state.map(),
+}
+
 local function __init__()
   local scAddress = system.getContractID()
   system.print(MODULE_NAME .. "__init__: sc_address=" .. scAddress)
 
+  -- the modules table is an audit copy of _MODULE_ADDRESS
   db.exec([[CREATE TABLE IF NOT EXISTS modules(
     name    TEXT PRIMARY KEY,
     address TEXT NOT NULL
   )]])
   local stmt = db.prepare("INSERT INTO modules(name, address) VALUES (?, ?)")
   stmt:exec(MODULE_NAME, scAddress)
+  _MODULE_ADDRESS[MODULE_NAME] = scAddress
+
+  -- the applied schema version of each module, see migrateSchema
+  db.exec([[CREATE TABLE IF NOT EXISTS schema_versions(
+    module_name TEXT PRIMARY KEY,
+    version     INTEGER NOT NULL,
+    block_no    INTEGER DEFAULT NULL,
+    tx_id       TEXT NOT NULL
+  )]])
 end
 
 local function __callFunction(module_name, func_name, ...)
@@ -27,16 +42,8 @@ local function __callFunction(module_name, func_name, ...)
 end
 
 local function __getModuleAddress(name)
-  system.print(MODULE_NAME .. "__getModuleAddress: name=" .. name)
-
-  local address
-  local stmt = db.prepare("SELECT address FROM modules WHERE name=?")
-  local rs = stmt:query(name)
-  while rs:next() do
-    address = rs:get()
-  end
-  system.print(MODULE_NAME .. "__getModuleAddress: address=" .. address)
-
+  local address = _MODULE_ADDRESS[name]
+  assert(address ~= nil, "__getModuleAddress:ERROR: cannot find the module: " .. tostring(name))
   return address
 end
 
@@ -47,17 +54,33 @@ function __init_module__(module_name, address, ...)
   system.print(MODULE_NAME .. "__init_module__: initialize module:" .. module_name .. ", address=" .. address)
 
   -- insert module name and address
+  _MODULE_ADDRESS[module_name] = address
   local stmt = db.prepare("INSERT OR REPLACE INTO modules(name, address) VALUES (?, ?)")
   stmt:exec(module_name, address)
-end
 
-function __call_module_function__(module_name, func_name, ...)
-  system.print(MODULE_NAME .. "__call_module_function__: module_name=" .. module_name .. ", func_name=" .. func_name)
+  -- a new DB module has none of the migrated schemas
+  if "__MANIFEST_DB__" == module_name then
+    db.exec("DELETE FROM schema_versions")
+  end
 
-  local address = __getModuleAddress(module_name)
-  system.print(MODULE_NAME .. "__call_module_function__: address=" .. address)
+  -- update the address cache of the other modules, and return the others to the new module
+  local modules = {}
+  stmt = db.prepare("SELECT name, address FROM modules WHERE name NOT IN (?, ?)")
+  local rs = stmt:query(MODULE_NAME, module_name)
+  while rs:next() do
+    local name, module_address = rs:get()
+    modules[name] = module_address
+  end
+  for _, module_address in pairs(modules) do
+    contract.call(module_address, "__set_module_address__", module_name, address)
+  end
 
-  return contract.call(address, func_name, ...)
+  return modules
+end
+
+function __call_module_function__(module_name, func_name, ...)
+  -- the innermost path of every call, keep it to a state lookup
+  return contract.call(__getModuleAddress(module_name), func_name, ...)
 end
 
 -- internal functions
@@ -82,6 +105,43 @@ function queryFunction(module, functionName, ...)
   return __callFunction(module, functionName, ...)
 end
 
+local function __getSchemaVersion(module_name)
+  local stmt = db.prepare("SELECT version FROM schema_versions WHERE module_name = ?")
+  local rs = stmt:query(module_name)
+  if rs:next() then
+    return rs:get()
+  end
+  return 0
+end
+
+-- apply pending schema migrations of a module in order, MIGRATIONS[v] upgrades
+--  its schema to the version v, the TX is rolled back if one fails
+function migrateSchema(module_name)
+  assert(system.getCreator() == system.getOrigin(), "migrateSchema:ERROR: only the creator can migrate a schema.")
+  system.print(MODULE_NAME .. "migrateSchema: module_name=" .. module_name)
+
+  local migrations = contract.call(__getModuleAddress(module_name), "getMigrations")
+  local version = __getSchemaVersion(module_name)
+  for v = version + 1, #migrations do
+    for _, sql in ipairs(migrations[v]) do
+      __callFunction("__MANIFEST_DB__", "alterTable", sql)
+    end
+  end
+  if version < #migrations then
+    local stmt = db.prepare([[INSERT OR REPLACE INTO schema_versions(module_name, version, block_no, tx_id)
+                                VALUES (?, ?, ?, ?)]])
+    stmt:exec(module_name, #migrations, system.getBlockheight(), system.getTxhash())
+  end
+
+  return { old_schema_version = version, schema_version = #migrations }
+end
+
+function getSchemaVersion(module_name)
+  system.print(MODULE_NAME .. "getSchemaVersion: module_name=" .. module_name)
+  local migrations = contract.call(__getModuleAddress(module_name), "getMigrations")
+  return { schema_version = __getSchemaVersion(module_name), latest_schema_version = #migrations }
+end
+
 function setVersion(version)
   system.print(MODULE_NAME .. "setVersion")
   system.setItem(MODULE_NAME .. "_VERSION__", version)
@@ -93,5 +153,5 @@ function getVersion()
 end
 
 -- exposed functions
-abi.register(setVersion, callFunction)
-abi.register_view(getVersion, queryFunction)
+abi.register(setVersion, callFunction, migrateSchema)
+abi.register_view(getVersion, queryFunction, getSchemaVersion)
@@ -8,26 +8,48 @@
 
 MODULE_NAME = "__MANIFEST_DB__"
 
+-- the Lua builtin, "select" is overridden by the DB function below
+local lua_select = select
+
 state.var {
   -- contant variables
   _MANIFEST_ADDRESS = state.value(),
+  -- addresses of the other modules, kept up to date by the Manifest
+  _MODULE_ADDRESS = state.map(),
 }
 
 local function __init__(manifestAddress)
   _MANIFEST_ADDRESS:set(manifestAddress)
   local scAddress = system.getContractID()
   system.print(MODULE_NAME .. "__init__: sc_address=" .. scAddress)
-  contract.call(_MANIFEST_ADDRESS:get(), "__init_module__",
-    MODULE_NAME, scAddress)
+  local modules = contract.call(_MANIFEST_ADDRESS:get(),
+    "__init_module__", MODULE_NAME, scAddress)
+  for name, address in pairs(modules or {}) do
+    _MODULE_ADDRESS[name] = address
+  end
 end
 
 local function __callFunction(module_name, func_name, ...)
   system.print(MODULE_NAME .. "__callFucntion: module_name=" .. module_name
           .. ", func_name=" .. func_name)
-  return contract.call(_MANIFEST_ADDRESS:get(), "__call_module_function__",
-    module_name, func_name, ...)
+  local address = _MODULE_ADDRESS[module_name]
+  if address ~= nil then
+    return contract.call(address, func_name, ...)
+  end
+  -- not registered yet, through the Manifest
+  return contract.call(_MANIFEST_ADDRESS:get(),
+    "__call_module_function__", module_name, func_name, ...)
 end
 
+function __set_module_address__(module_name, address)
+  assert(system.getSender() == _MANIFEST_ADDRESS:get(),
+    "__set_module_address__:ERROR: only the Manifest can set a module address.")
+  _MODULE_ADDRESS[module_name] = address
+end
+
+-- internal functions
+abi.register(__set_module_address__)
+
 --[[ ====================================================================== ]]--
 
 function constructor(manifestAddress)
@@ -81,4 +103,88 @@ function select(sql, ...)
   return rows
 end
 
-abi.register(createTable, alterTable, insert, update, delete, select)
+-- execute statements in one call, a statement is prepared once for the same SQL
+--  * statements: list of { sql = ..., args = { ... } }
+--    'args' cannot have a nil hole, so pass "" with NULLIF(?, '') for NULL
+function batch(statements)
+  system.print(MODULE_NAME .. "batch: statements=" .. #statements)
+
+  local prepared = {}
+  for _, s in ipairs(statements) do
+    local stmt = prepared[s.sql]
+    if nil == stmt then
+      stmt = db.prepare(s.sql)
+      prepared[s.sql] = stmt
+    end
+    stmt:exec(unpack(s.args))
+  end
+end
+
+local function __packRow(...)
+  -- the number of columns, a row can have NULL (nil) holes
+  return { ... }, lua_select('#', ...)
+end
+
+-- select a page of rows in the order of (__block_no, __rowid)
+--  * sql: a SELECT whose last 2 columns are "__block_no" and "__rowid"
+--  * page: { size = (nil for all rows), cursor = (from the previous page), desc = (boolean) }
+--  * returns: { rows = (without the cursor columns), next_cursor = (nil at the last page) }
+function selectPage(sql, page, ...)
+  system.print(MODULE_NAME .. "selectPage: sql="
+          .. sql .. ", page=" .. json:encode(page) .. ", args=" .. json:encode({...}))
+
+  local args = {...}
+  local n_args = lua_select('#', ...)
+  local op = ">"
+  local order = "ASC"
+  if page.desc then
+    op = "<"
+    order = "DESC"
+  end
+
+  local sql_page = "SELECT * FROM (" .. sql .. ")"
+  if nil ~= page.cursor and "" ~= page.cursor then
+    local cursor_block_no, cursor_rowid = string.match(page.cursor, "^(%d+):(%d+)$")
+    assert(nil ~= cursor_block_no, "selectPage:ERROR: invalid cursor: " .. tostring(page.cursor))
+    sql_page = sql_page .. " WHERE (__block_no " .. op .. " ? OR (__block_no = ? AND __rowid " .. op .. " ?))"
+    args[n_args + 1] = tonumber(cursor_block_no)
+    args[n_args + 2] = tonumber(cursor_block_no)
+    args[n_args + 3] = tonumber(cursor_rowid)
+    n_args = n_args + 3
+  end
+  sql_page = sql_page .. " ORDER BY __block_no " .. order .. ", __rowid " .. order
+
+  local page_size = tonumber(page.size)
+  if nil ~= page_size then
+    assert(page_size > 0, "selectPage:ERROR: invalid page size: " .. tostring(page.size))
+    -- one more row to know whether the next page exists
+    sql_page = sql_page .. " LIMIT ?"
+    args[n_args + 1] = page_size + 1
+    n_args = n_args + 1
+  end
+
+  local stmt = db.prepare(sql_page)
+  local rs = stmt:query(unpack(args, 1, n_args))
+  local rows = {}
+  local next_cursor
+  local last_key
+
+  while rs:next() do
+    local row, n_cols = __packRow(rs:get())
+    if nil ~= page_size and #rows >= page_size then
+      next_cursor = last_key
+      break
+    end
+    last_key = string.format("%d:%d", row[n_cols - 1], row[n_cols])
+    row[n_cols - 1] = nil
+    row[n_cols] = nil
+    table.insert(rows, row)
+  end
+
+  return {
+    rows = rows,
+    next_cursor = next_cursor,
+  }
+end
+
+abi.register(createTable, alterTable, insert, update, delete, select, selectPage, batch)
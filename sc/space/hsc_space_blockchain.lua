@@ -10,23 +10,42 @@ MODULE_NAME_COMPUTING = "__HSC_SPACE_COMPUTING__"
 state.var {
   -- contant variables
   _MANIFEST_ADDRESS = state.value(),
+  -- addresses of the other modules, kept up to date by the Manifest
+  _MODULE_ADDRESS = state.map(),
 }
 
 local function __init__(manifestAddress)
   _MANIFEST_ADDRESS:set(manifestAddress)
   local scAddress = system.getContractID()
   system.print(MODULE_NAME .. "__init__: sc_address=" .. scAddress)
-  contract.call(_MANIFEST_ADDRESS:get(),
+  local modules = contract.call(_MANIFEST_ADDRESS:get(),
     "__init_module__", MODULE_NAME, scAddress)
+  for name, address in pairs(modules or {}) do
+    _MODULE_ADDRESS[name] = address
+  end
 end
 
 local function __callFunction(module_name, func_name, ...)
   system.print(MODULE_NAME .. "__callFucntion: module_name=" .. module_name
           .. ", func_name=" .. func_name)
+  local address = _MODULE_ADDRESS[module_name]
+  if address ~= nil then
+    return contract.call(address, func_name, ...)
+  end
+  -- not registered yet, through the Manifest
   return contract.call(_MANIFEST_ADDRESS:get(),
     "__call_module_function__", module_name, func_name, ...)
 end
 
+function __set_module_address__(module_name, address)
+  assert(system.getSender() == _MANIFEST_ADDRESS:get(),
+    "__set_module_address__:ERROR: only the Manifest can set a module address.")
+  _MODULE_ADDRESS[module_name] = address
+end
+
+-- internal functions
+abi.register(__set_module_address__)
+
 --[[ ====================================================================== ]]--
 
 function constructor(manifestAddress)
@@ -138,6 +157,78 @@ local function generateDposGenesisJson(chain_info)
   end
 end
 
+-- check the permission to create a node of the chain, and return the statement to insert it
+--  * chain: { chain_id, chain_creator, chain_is_public } of a created Chain
+--  * returns: the statement, or nil and the error response
+local function prepareNode(chain, node_id, node_name, metadata, sender, block_no, tx_id)
+  if type(metadata) == 'string' then
+    metadata = json:decode(metadata)
+  end
+  local chain_id = chain["chain_id"]
+
+  -- if not exist critical arguments, (400 Bad Request)
+  if isEmpty(node_id) then
+    return nil, {
+      __module = MODULE_NAME,
+      __block_no = block_no,
+      __func_name = "createNode",
+      __status_code = "400",
+      __status_sub_code = "",
+      __err_msg = "bad request: miss critical arguments",
+      sender = sender,
+      chain_id = chain_id,
+      node_id = node_id,
+    }
+  end
+
+  local cluster_id = metadata["cluster"]["id"]
+  local machine_id = metadata["machine"]["id"]
+
+  -- check permissions (403.1 Execute access forbidden)
+  if sender ~= chain["chain_creator"]
+          and sender ~= cluster_id
+          and sender ~= machine_id then
+    if not chain["chain_is_public"] then
+      -- TODO: check sender's create Node permission of pond
+      return nil, {
+        __module = MODULE_NAME,
+        __block_no = block_no,
+        __func_name = "createNode",
+        __status_code = "403",
+        __status_sub_code = "1",
+        __err_msg = "sender doesn't allow to create a new node for the chain",
+        sender = sender,
+        chain_id = chain_id
+      }
+    end
+  end
+
+  -- 'args' cannot have a nil hole, so a missing node_name leaves the column out (NULL)
+  if nil == node_name then
+    return {
+      sql = [[INSERT OR REPLACE INTO nodes(chain_id,
+                                           node_creator,
+                                           node_id,
+                                           node_block_no,
+                                           node_tx_id,
+                                           node_metadata)
+                     VALUES (?, ?, ?, ?, ?, ?)]],
+      args = { chain_id, sender, node_id, block_no, tx_id, json:encode(metadata) },
+    }
+  end
+  return {
+    sql = [[INSERT OR REPLACE INTO nodes(chain_id,
+                                         node_creator,
+                                         node_name,
+                                         node_id,
+                                         node_block_no,
+                                         node_tx_id,
+                                         node_metadata)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)]],
+    args = { chain_id, sender, node_name, node_id, block_no, tx_id, json:encode(metadata) },
+  }
+end
+
 function createChain(chain_id, chain_name, is_public, metadata)
   if type(metadata) == 'string' then
     metadata = json:decode(metadata)
@@ -186,10 +277,18 @@ function createChain(chain_id, chain_name, is_public, metadata)
     metadata_raw = json:encode(metadata)
   end
 
+  -- tx id
+  local tx_id = system.getTxhash()
+  system.print(MODULE_NAME .. "createChain: tx_id=" .. tx_id)
+
   -- read created Chain
   local res = getChain(chain_id)
   system.print(MODULE_NAME .. "createChain: res=" .. json:encode(res))
 
+  -- the Chain and its new Nodes are inserted at once
+  local statements = {}
+  local chain = res
+
   if "404" == res["__status_code"] then
     -- check whether Chain is public
     local is_public_value = 0
@@ -199,33 +298,39 @@ function createChain(chain_id, chain_name, is_public, metadata)
       is_public_value = 0
     end
 
-    -- tx id
-    local tx_id = system.getTxhash()
-    system.print(MODULE_NAME .. "createChain: tx_id=" .. tx_id)
-
-    __callFunction(MODULE_NAME_DB, "insert",
-      [[INSERT INTO chains(chain_creator,
-                                chain_name,
-                                chain_id,
-                                chain_is_public,
-                                chain_block_no,
-                                chain_tx_id,
-                                chain_metadata)
-               VALUES (?, ?, ?, ?, ?, ?, ?)]],
-      creator, chain_name, chain_id, is_public_value,
-      block_no, tx_id, metadata_raw)
+    table.insert(statements, {
+      sql = [[INSERT INTO chains(chain_creator,
+                                 chain_name,
+                                 chain_id,
+                                 chain_is_public,
+                                 chain_block_no,
+                                 chain_tx_id,
+                                 chain_metadata)
+                     VALUES (?, ?, ?, ?, ?, ?, ?)]],
+      args = { creator, chain_name, chain_id, is_public_value,
+               block_no, tx_id, metadata_raw },
+    })
+    chain = {
+      chain_id = chain_id,
+      chain_creator = creator,
+      chain_is_public = is_public,
+    }
+  elseif "200" ~= res["__status_code"] and nil ~= next(new_node_list) then
+    return res
   end
 
-  -- check and insert the created Node info from Horde
+  -- check the created Node info from Horde
   for _, node in pairs(new_node_list) do
-    local node_id = node['node_id']
-    local node_name = node['node_name']
-    local node_metadata = node['node_metadata']
-
-    local res = createNode(chain_id, node_id, node_name, node_metadata)
-    if "201" ~= res["__status_code"] then
-      return res
+    local stmt, err = prepareNode(chain, node['node_id'], node['node_name'],
+      node['node_metadata'], creator, block_no, tx_id)
+    if nil == stmt then
+      return err
     end
+    table.insert(statements, stmt)
+  end
+
+  if nil ~= next(statements) then
+    __callFunction(MODULE_NAME_DB, "batch", statements)
   end
 
   -- read created all Nodes of Chain
@@ -275,6 +380,40 @@ function createChain(chain_id, chain_name, is_public, metadata)
   }
 end
 
+-- nodes of chains, grouped by chain_id
+--  * the IDs are bound in chunks, SQLite binds at most 999 of them in a query
+local function __getNodesOfChains(chain_ids)
+  local nodes = {}
+  local chunk_size = 500
+  for first = 1, #chain_ids, chunk_size do
+    local chunk = { unpack(chain_ids, first, math.min(first + chunk_size - 1, #chain_ids)) }
+    local rows = __callFunction(MODULE_NAME_DB, "select",
+      [[SELECT chain_id, node_creator, node_id, node_name, node_metadata,
+                node_block_no, node_tx_id
+          FROM nodes
+          WHERE chain_id IN (]] .. string.rep("?, ", #chunk - 1) .. [[?)
+          ORDER BY node_block_no DESC, rowid DESC]],
+      unpack(chunk))
+
+    for _, v in pairs(rows) do
+      local node_list = nodes[v[1]]
+      if nil == node_list then
+        node_list = {}
+        nodes[v[1]] = node_list
+      end
+      table.insert(node_list, {
+        node_creator = v[2],
+        node_id = v[3],
+        node_name = v[4],
+        node_metadata = json:decode(v[5]),
+        node_block_no = v[6],
+        node_tx_id = v[7]
+      })
+    end
+  end
+  return nodes
+end
+
 function getPublicChains()
   system.print(MODULE_NAME .. "getPublicChains")
 
@@ -289,17 +428,15 @@ function getPublicChains()
         WHERE chain_is_public = 1
         ORDER BY chain_block_no DESC]])
 
+  -- nodes of all chains at once
+  local chain_ids = {}
   for _, v in pairs(rows) do
-    local chain_id = v[1]
-    local node_list = {}
-
-    local res = getAllNodes(chain_id)
-    system.print(MODULE_NAME .. "getPublicChains: res=" .. json:encode(res))
-    if "200" ~= res["__status_code"] and "404" ~= res["__status_code"] then
-      return res
-    elseif "200" == res["__status_code"] then
-      node_list = res['node_list']
-    end
+    table.insert(chain_ids, v[1])
+  end
+  local nodes = __getNodesOfChains(chain_ids)
+
+  for _, v in pairs(rows) do
+    local node_list = nodes[v[1]] or {}
 
     local pond = {
       chain_id = v[1],
@@ -351,7 +488,6 @@ function getAllChains(creator)
 
   -- check all public Chains
   local res = getPublicChains()
-  system.print(MODULE_NAME .. "getAllChains: res=" .. json:encode(res))
   if isEmpty(creator) then
     return res
   end
@@ -372,43 +508,35 @@ function getAllChains(creator)
   system.print(MODULE_NAME .. "getAllChains: sender=" .. tostring(sender)
           .. ", block_no=" .. tostring(block_no))
 
-  -- check all creator's private Chains
+  -- check all private Chains created by the creator, or by its clusters or machines
+  --  * every branch is an index lookup: chains(chain_creator),
+  --    clusters(cluster_owner) and machines(machine_owner)
+  --  * "+" keeps the planner off chains(chain_is_public, ...), which would
+  --    scan the private chains of everyone
   local rows = __callFunction(MODULE_NAME_DB, "select",
-    [[SELECT DISTINCT chain_id, chain_name, chain_metadata,
-              chain_block_no, chain_tx_id
+    [[SELECT chain_id, chain_name, chain_metadata,
+              chain_block_no, chain_tx_id, chain_creator
         FROM chains
-          JOIN (
-            SELECT DISTINCT
-              clusters.cluster_id AS c_id,
-              machines.machine_id AS m_id
-            FROM clusters JOIN machines
-            WHERE clusters.cluster_owner=? OR machines.machine_owner=?
-          ) AS cm
-        WHERE
-          chains.chain_is_public = 0
-          AND (
-            chains.chain_creator=?
-            OR chains.chain_creator=cm.c_id
-            OR chains.chain_creator=cm.m_id
-          )
+        WHERE +chain_is_public = 0
+          AND (chain_creator = ?
+            OR chain_creator IN (SELECT cluster_id FROM clusters WHERE cluster_owner = ?)
+            OR chain_creator IN (SELECT machine_id FROM machines WHERE machine_owner = ?))
         ORDER BY chain_block_no DESC]],
     creator, creator, creator)
 
+  -- nodes of all chains at once
+  local chain_ids = {}
+  for _, v in pairs(rows) do
+    table.insert(chain_ids, v[1])
+  end
+  local nodes = __getNodesOfChains(chain_ids)
+
   for _, v in pairs(rows) do
     local chain_id = v[1]
-    local node_list = {}
-
-    -- read all Nodes of Chain
-    local res = getAllNodes(chain_id)
-    system.print(MODULE_NAME .. "getAllChains: res=" .. json:encode(res))
-    if "200" ~= res["__status_code"] and "404" ~= res["__status_code"] then
-      return res
-    elseif "200" == res["__status_code"] then
-      node_list = res['node_list']
-    end
+    local node_list = nodes[chain_id] or {}
 
     local pond = {
-      chain_creator = creator,
+      chain_creator = v[6],
       chain_id = chain_id,
       chain_name = v[2],
       chain_metadata = json:decode(v[3]),
@@ -791,43 +919,15 @@ function createNode(chain_id, node_id, node_name, metadata)
   local chain_creator = res["chain_creator"]
   local chain_is_public = res["chain_is_public"]
 
-  local cluster_id = metadata["cluster"]["id"]
-  local machine_id = metadata["machine"]["id"]
-
-  -- check permissions (403.1 Execute access forbidden)
-  if sender ~= chain_creator
-          and sender ~= cluster_id
-          and sender ~= machine_id then
-    if not chain_is_public then
-      -- TODO: check sender's create Node permission of pond
-      return {
-        __module = MODULE_NAME,
-        __block_no = block_no,
-        __func_name = "createNode",
-        __status_code = "403",
-        __status_sub_code = "1",
-        __err_msg = "sender doesn't allow to create a new node for the chain",
-        sender = sender,
-        chain_id = chain_id
-      }
-    end
-  end
-
   -- tx id
   local tx_id = system.getTxhash()
   system.print(MODULE_NAME .. "createNode: tx_id=" .. tx_id)
 
-  __callFunction(MODULE_NAME_DB, "insert",
-    [[INSERT OR REPLACE INTO nodes(chain_id,
-                               node_creator,
-                               node_name,
-                               node_id,
-                               node_block_no,
-                               node_tx_id,
-                               node_metadata)
-             VALUES (?, ?, ?, ?, ?, ?, ?)]],
-    chain_id, sender, node_name, node_id,
-    block_no, tx_id, metadata_raw)
+  local stmt, err = prepareNode(res, node_id, node_name, metadata, sender, block_no, tx_id)
+  if nil == stmt then
+    return err
+  end
+  __callFunction(MODULE_NAME_DB, "insert", stmt.sql, unpack(stmt.args))
 
   -- TODO: save this activity
 
@@ -863,8 +963,10 @@ function createNode(chain_id, node_id, node_name, metadata)
   }
 end
 
-function getAllNodes(chain_id)
-  system.print(MODULE_NAME .. "getAllNodes: chain_id=" .. tostring(chain_id))
+function getAllNodes(chain_id, page_size, cursor)
+  system.print(MODULE_NAME .. "getAllNodes: chain_id=" .. tostring(chain_id)
+          .. ", page_size=" .. tostring(page_size)
+          .. ", cursor=" .. tostring(cursor))
 
   local sender = system.getOrigin()
   local block_no = system.getBlockheight()
@@ -900,12 +1002,14 @@ function getAllNodes(chain_id)
   local chain_tx_id = res['chain_tx_id']
 
   -- check inserted data
-  local rows = __callFunction(MODULE_NAME_DB, "select",
+  local page = __callFunction(MODULE_NAME_DB, "selectPage",
     [[SELECT node_creator, node_id, node_name, node_metadata,
-              node_block_no, node_tx_id
+              node_block_no, node_tx_id,
+              node_block_no AS __block_no, rowid AS __rowid
         FROM nodes
-        WHERE chain_id = ? ORDER BY node_block_no DESC]],
-    chain_id)
+        WHERE chain_id = ?]],
+    { size = page_size, cursor = cursor, desc = true }, chain_id)
+  local rows = page["rows"]
 
   local node_list = {}
 
@@ -959,7 +1063,8 @@ function getAllNodes(chain_id)
     chain_block_no = chain_block_no,
     chain_tx_id = chain_tx_id,
     chain_is_public = chain_is_public,
-    node_list = node_list
+    node_list = node_list,
+    next_cursor = page["next_cursor"]
   }
 end
 
@@ -1257,7 +1362,24 @@ function updateNode(chain_id, node_id, node_name, metadata)
   }
 end
 
--- exposed functions
+--[[ ====================================================================== ]]--
+
+-- schema migrations, MIGRATIONS[v] upgrades the schema to the version v
+--  * the Manifest applies them, and stores the applied version
+--  * never change a deployed migration, append a new version instead
+local MIGRATIONS = {
+  -- v1: indexes for the public and creator filters of chains
+  {
+    [[CREATE INDEX IF NOT EXISTS chains_public ON chains(chain_is_public, chain_block_no)]],
+    [[CREATE INDEX IF NOT EXISTS chains_creator ON chains(chain_creator)]],
+  },
+}
+
+function getMigrations()
+  return MIGRATIONS
+end
+
 abi.register(createChain, getPublicChains, getAllChains,
   getChain, deleteChain, updateChain,
   createNode, getAllNodes, getNode, deleteNode, updateNode)
+abi.register_view(getMigrations)
@@ -9,23 +9,42 @@ MODULE_NAME_DB = "__MANIFEST_DB__"
 state.var {
   -- contant variables
   _MANIFEST_ADDRESS = state.value(),
+  -- addresses of the other modules, kept up to date by the Manifest
+  _MODULE_ADDRESS = state.map(),
 }
 
 local function __init__(manifestAddress)
   _MANIFEST_ADDRESS:set(manifestAddress)
   local scAddress = system.getContractID()
   system.print(MODULE_NAME .. "__init__: sc_address=" .. scAddress)
-  contract.call(_MANIFEST_ADDRESS:get(),
+  local modules = contract.call(_MANIFEST_ADDRESS:get(),
     "__init_module__", MODULE_NAME, scAddress)
+  for name, address in pairs(modules or {}) do
+    _MODULE_ADDRESS[name] = address
+  end
 end
 
 local function __callFunction(module_name, func_name, ...)
   system.print(MODULE_NAME .. "__callFucntion: module_name=" .. module_name
           .. ", func_name=" .. func_name)
+  local address = _MODULE_ADDRESS[module_name]
+  if address ~= nil then
+    return contract.call(address, func_name, ...)
+  end
+  -- not registered yet, through the Manifest
   return contract.call(_MANIFEST_ADDRESS:get(),
     "__call_module_function__", module_name, func_name, ...)
 end
 
+function __set_module_address__(module_name, address)
+  assert(system.getSender() == _MANIFEST_ADDRESS:get(),
+    "__set_module_address__:ERROR: only the Manifest can set a module address.")
+  _MODULE_ADDRESS[module_name] = address
+end
+
+-- internal functions
+abi.register(__set_module_address__)
+
 --[[ ====================================================================== ]]--
 
 function constructor(manifestAddress)
@@ -186,30 +205,72 @@ function addCluster(cluster_id, cluster_name, is_public, metadata)
   }
 end
 
-function getPublicClusters()
-  system.print(MODULE_NAME .. "getPublicClusters")
+-- machines of clusters, grouped by cluster_id
+--  * the IDs are bound in chunks, SQLite binds at most 999 of them in a query
+local function __getMachinesOfClusters(cluster_ids)
+  local machines = {}
+  local chunk_size = 500
+  for first = 1, #cluster_ids, chunk_size do
+    local chunk = { unpack(cluster_ids, first, math.min(first + chunk_size - 1, #cluster_ids)) }
+    local rows = __callFunction(MODULE_NAME_DB, "select",
+      [[SELECT cluster_id, machine_owner, machine_id, machine_name, machine_metadata,
+                machine_block_no, machine_tx_id
+          FROM machines
+          WHERE cluster_id IN (]] .. string.rep("?, ", #chunk - 1) .. [[?)
+          ORDER BY machine_block_no DESC]],
+      unpack(chunk))
+
+    for _, v in pairs(rows) do
+      local machine_list = machines[v[1]]
+      if nil == machine_list then
+        machine_list = {}
+        machines[v[1]] = machine_list
+      end
+      table.insert(machine_list, {
+        machine_owner = v[2],
+        machine_id = v[3],
+        machine_name = v[4],
+        machine_metadata = json:decode(v[5]),
+        machine_block_no = v[6],
+        machine_tx_id = v[7]
+      })
+    end
+  end
+  return machines
+end
+
+function getPublicClusters(page_size, cursor, include_machines)
+  system.print(MODULE_NAME .. "getPublicClusters: page_size=" .. tostring(page_size)
+          .. ", cursor=" .. tostring(cursor)
+          .. ", include_machines=" .. tostring(include_machines))
 
   local cluster_list = {}
   local exist = false
 
   -- check all public Hordes
-  local rows = __callFunction(MODULE_NAME_DB, "select",
+  local page = __callFunction(MODULE_NAME_DB, "selectPage",
     [[SELECT cluster_id, cluster_owner, cluster_name, cluster_metadata,
-              cluster_block_no, cluster_tx_id
+              cluster_block_no, cluster_tx_id,
+              cluster_block_no AS __block_no, rowid AS __rowid
         FROM clusters
-        WHERE cluster_is_public = 1
-        ORDER BY cluster_block_no DESC]])
+        WHERE cluster_is_public = 1]],
+    { size = page_size, cursor = cursor, desc = true })
+  local rows = page["rows"]
+
+  -- machines of all clusters in the page at once, unless not wanted
+  local machines = {}
+  if false ~= include_machines then
+    local cluster_ids = {}
+    for _, v in pairs(rows) do
+      table.insert(cluster_ids, v[1])
+    end
+    machines = __getMachinesOfClusters(cluster_ids)
+  end
 
   for _, v in pairs(rows) do
-    local cluster_id = v[1]
-    local machine_list = {}
-
-    local res = getAllMachines(cluster_id)
-    system.print(MODULE_NAME .. "getPublicClusters: res=" .. json:encode(res))
-    if "200" ~= res["__status_code"] and "404" ~= res["__status_code"] then
-      return res
-    elseif "200" == res["__status_code"] then
-      machine_list = res['machine_list']
+    local machine_list
+    if false ~= include_machines then
+      machine_list = machines[v[1]] or {}
     end
 
     local horde = {
@@ -253,16 +314,17 @@ function getPublicClusters()
     __status_code = "200",
     __status_sub_code = "",
     sender = sender,
-    cluster_list = cluster_list
+    cluster_list = cluster_list,
+    next_cursor = page["next_cursor"]
   }
 end
 
-function getAllClusters(owner)
-  system.print(MODULE_NAME .. "getAllClusters: owner=" .. tostring(owner))
+function getAllClusters(owner, include_machines)
+  system.print(MODULE_NAME .. "getAllClusters: owner=" .. tostring(owner)
+          .. ", include_machines=" .. tostring(include_machines))
 
   -- check all public Hordes
-  local res = getPublicClusters()
-  system.print(MODULE_NAME .. "getAllClusters: res=" .. json:encode(res))
+  local res = getPublicClusters(nil, nil, include_machines)
   if isEmpty(owner) then
     return res
   end
@@ -292,17 +354,21 @@ function getAllClusters(owner)
         ORDER BY cluster_block_no DESC]],
     owner)
 
+  -- read all Machines of the private Hordes at once, unless not wanted
+  local machines = {}
+  if false ~= include_machines then
+    local cluster_ids = {}
+    for _, v in pairs(rows) do
+      table.insert(cluster_ids, v[1])
+    end
+    machines = __getMachinesOfClusters(cluster_ids)
+  end
+
   for _, v in pairs(rows) do
     local cluster_id = v[1]
-    local machine_list = {}
-
-    -- read all Machines of Horde
-    local res = getAllMachines(cluster_id)
-    system.print(MODULE_NAME .. "getAllClusters: res=" .. json:encode(res))
-    if "200" ~= res["__status_code"] and "404" ~= res["__status_code"] then
-      return res
-    elseif "200" == res["__status_code"] then
-      machine_list = res['machine_list']
+    local machine_list
+    if false ~= include_machines then
+      machine_list = machines[cluster_id] or {}
     end
 
     local horde = {
@@ -471,6 +537,151 @@ function getCluster(cluster_id)
   }
 end
 
+-- owners of targets, to check permissions of many targets at once
+--  * target_list: list of { cluster_id = ..., machine_id = (nil or "" for the cluster) }
+--  * owner_list has the same order: { cluster_id, machine_id, cluster_owner,
+--    cluster_is_public, machine_owner }
+--  * (404 Not Found) for the first target which is not found
+function getOwners(target_list)
+  local sender = system.getOrigin()
+  local block_no = system.getBlockheight()
+  system.print(MODULE_NAME .. "getOwners: sender=" .. tostring(sender)
+          .. ", block_no=" .. tostring(block_no)
+          .. ", targets=" .. #target_list)
+
+  -- distinct IDs, machines by their cluster
+  local cluster_ids = {}
+  local machine_ids = {}
+  local seen = {}
+  for _, v in ipairs(target_list) do
+    local cluster_id = v['cluster_id']
+    local machine_id = v['machine_id']
+
+    -- if not exist critical arguments, (400 Bad Request)
+    if isEmpty(cluster_id) then
+      return {
+        __module = MODULE_NAME,
+        __block_no = block_no,
+        __func_name = "getOwners",
+        __status_code = "400",
+        __status_sub_code = "",
+        __err_msg = "bad request: miss critical arguments",
+        sender = sender,
+        cluster_id = cluster_id,
+        machine_id = machine_id,
+      }
+    end
+
+    if not seen['c:' .. cluster_id] then
+      seen['c:' .. cluster_id] = true
+      table.insert(cluster_ids, cluster_id)
+      machine_ids[cluster_id] = {}
+    end
+    local key = 'm:' .. cluster_id .. ':' .. tostring(machine_id)
+    if not isEmpty(machine_id) and not seen[key] then
+      seen[key] = true
+      table.insert(machine_ids[cluster_id], machine_id)
+    end
+  end
+
+  -- SQLite binds at most 999 arguments, so IDs are queried by chunks
+  local chunk_size = 500
+  local function selectChunks(sql, ids, ...)
+    local rows = {}
+    local n_args = select('#', ...)
+    for first = 1, #ids, chunk_size do
+      local chunk = { ... }
+      for i = first, math.min(first + chunk_size - 1, #ids) do
+        chunk[n_args + i - first + 1] = ids[i]
+      end
+      for _, v in pairs(__callFunction(MODULE_NAME_DB, "select",
+                                       sql .. " IN (" .. string.rep("?, ", #chunk - n_args - 1) .. "?)",
+                                       unpack(chunk))) do
+        table.insert(rows, v)
+      end
+    end
+    return rows
+  end
+
+  local clusters = {}
+  for _, v in ipairs(selectChunks([[SELECT cluster_id, cluster_owner, cluster_is_public
+                                      FROM clusters
+                                      WHERE cluster_id]], cluster_ids)) do
+    clusters[v[1]] = { owner = v[2], is_public = (1 == v[3]), machines = {} }
+  end
+
+  -- only the target machines, by the primary key (cluster_id, machine_id)
+  for _, cluster_id in ipairs(cluster_ids) do
+    local cluster = clusters[cluster_id]
+    if nil ~= cluster and #machine_ids[cluster_id] > 0 then
+      for _, v in ipairs(selectChunks([[SELECT machine_id, machine_owner
+                                          FROM machines
+                                          WHERE cluster_id = ? AND machine_id]],
+                                      machine_ids[cluster_id], cluster_id)) do
+        cluster.machines[v[1]] = v[2]
+      end
+    end
+  end
+
+  local owner_list = {}
+  for _, v in ipairs(target_list) do
+    local cluster_id = v['cluster_id']
+    local machine_id = v['machine_id']
+    local cluster = clusters[cluster_id]
+
+    -- if not exist, (404 Not Found)
+    if nil == cluster then
+      return {
+        __module = MODULE_NAME,
+        __block_no = block_no,
+        __func_name = "getOwners",
+        __status_code = "404",
+        __status_sub_code = "",
+        __err_msg = "cannot find the cluster",
+        sender = sender,
+        cluster_id = cluster_id
+      }
+    end
+
+    local machine_owner
+    if not isEmpty(machine_id) then
+      machine_owner = cluster.machines[machine_id]
+      if nil == machine_owner then
+        return {
+          __module = MODULE_NAME,
+          __block_no = block_no,
+          __func_name = "getOwners",
+          __status_code = "404",
+          __status_sub_code = "",
+          __err_msg = "cannot find the machine info in the cluster",
+          sender = sender,
+          cluster_id = cluster_id,
+          machine_id = machine_id
+        }
+      end
+    end
+
+    table.insert(owner_list, {
+      cluster_id = cluster_id,
+      machine_id = machine_id,
+      cluster_owner = cluster.owner,
+      cluster_is_public = cluster.is_public,
+      machine_owner = machine_owner,
+    })
+  end
+
+  -- 200 OK
+  return {
+    __module = MODULE_NAME,
+    __block_no = block_no,
+    __func_name = "getOwners",
+    __status_code = "200",
+    __status_sub_code = "",
+    sender = sender,
+    owner_list = owner_list
+  }
+end
+
 function dropCluster(cluster_id)
   system.print(MODULE_NAME .. "dropCluster: cluster_id=" .. tostring(cluster_id))
 
@@ -1142,6 +1353,25 @@ function updateMachine(cluster_id, machine_id, machine_name, metadata)
   }
 end
 
-abi.register(addCluster, getPublicClusters, getAllClusters, getCluster,
+--[[ ====================================================================== ]]--
+
+-- schema migrations, MIGRATIONS[v] upgrades the schema to the version v
+--  * the Manifest applies them, and stores the applied version
+--  * never change a deployed migration, append a new version instead
+local MIGRATIONS = {
+  -- v1: indexes for the public and owner filters of clusters and machines
+  {
+    [[CREATE INDEX IF NOT EXISTS clusters_public ON clusters(cluster_is_public, cluster_block_no)]],
+    [[CREATE INDEX IF NOT EXISTS clusters_owner ON clusters(cluster_owner)]],
+    [[CREATE INDEX IF NOT EXISTS machines_owner ON machines(machine_owner)]],
+  },
+}
+
+function getMigrations()
+  return MIGRATIONS
+end
+
+abi.register(addCluster, getPublicClusters, getAllClusters, getCluster, getOwners,
   dropCluster, updateCluster, addMachine, getAllMachines,
   getMachine, dropMachine, updateMachine)
+abi.register_view(getMigrations)
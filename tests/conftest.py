@@ -0,0 +1,42 @@
+import pytest
+
+from types import SimpleNamespace
+
+import hsc_trace
+
+
+def pytest_addoption(parser):
+    parser.addoption('--hsc-trace', nargs='?', const='', default=None, metavar='PATH',
+                     help='trace HSC calls and print a summary, '
+                          'and write the records into a JSONL (or ".prom") file with PATH')
+
+
+def pytest_sessionstart(session):
+    path = session.config.getoption('--hsc-trace')
+    if path is not None:
+        hsc_trace.start(path or None)
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    trace = hsc_trace.stop()
+    if trace is None:
+        return
+    terminalreporter.section('HSC trace')
+    for line in trace.format_summary():
+        terminalreporter.write_line(line)
+
+
+@pytest.fixture(scope='session')
+def standin(tmp_path_factory):
+    """
+    Compile HSC with the stand-in aergoluac and deploy it into a stand-in
+    node. Nothing needs network, and every TX is confirmed at once.
+    :return: namespace of 'node', 'aergo' (a client with an account) and
+             'hsc_address'
+    """
+    pytest.importorskip('lupa')
+    import hsc_standin
+
+    node = hsc_standin.StandinNode()
+    aergo, hsc_address = hsc_standin.deploy_hsc(node, str(tmp_path_factory.mktemp('standin')))
+    return SimpleNamespace(node=node, aergo=aergo, hsc_address=hsc_address)
@@ -0,0 +1,25 @@
+import pytest
+
+import hsc_bench
+
+
+def test_bench(standin):
+    hsc_bench.QUIET_MODE = True
+    try:
+        report = hsc_bench.hsc_bench(standin.aergo, standin.hsc_address, [5], repeat=1, node=standin.node)
+    finally:
+        hsc_bench.QUIET_MODE = False
+
+    size = report['sizes'][0]
+    assert 5 == size['size']
+    assert 5 == size['rows']['machines'] == size['rows']['nodes'] == size['rows']['command_results']
+
+    functions = size['functions']
+    assert 'query' == functions['__HSC_COMMAND__.getSystemCommands']['kind']
+    assert 'call' == functions['__HSC_COMMAND__.addCommand']['kind']
+    assert 'query' == functions['__HSC_SPACE_COMPUTING__.getOwners']['kind']
+    assert 'query' == functions['__HSC_COMMAND__.getCommandsOfTargetSince']['kind']
+    for key, f in functions.items():
+        assert f['status'] in (['200'], ['201']), key
+        assert 0 < f['gas'], key
+        assert 0 < f['sql_steps'], key
@@ -0,0 +1,285 @@
+import pytest
+
+import asyncio
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import aergo.herapy as herapy
+import hsc_client
+import hsc_deploy
+
+
+class FakeAergo:
+    def __init__(self, query_delay=0.05):
+        self.query_delay = query_delay
+        self.lock = threading.Lock()
+        self.nonce = 0
+        self.nonces = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def query_sc(self, hsc_address, func_name, args=None):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.query_delay)
+        with self.lock:
+            self.in_flight -= 1
+
+        module, hsc_func_name, target = args
+        if target == 'unknown':
+            return json.dumps({"__func_name": hsc_func_name, "__status_code": "404",
+                               "__status_sub_code": "", "__err_msg": "cannot find any command"}).encode()
+        return json.dumps({"__func_name": hsc_func_name, "__status_code": "200",
+                           "target": target}).encode()
+
+    def call_sc(self, hsc_address, func_name, args=None):
+        with self.lock:
+            self.nonce += 1
+            self.nonces.append(self.nonce)
+            tx_hash = 'tx{}'.format(self.nonce)
+        return (SimpleNamespace(tx_hash=tx_hash),
+                SimpleNamespace(status=herapy.CommitStatus.TX_OK, detail=''))
+
+    def get_tx_result(self, tx_hash):
+        response = json.dumps({"__func_name": "addCommand", "__status_code": "201", "cmd_id": tx_hash})
+        event = SimpleNamespace(name='HSC', arguments=['__HSC_COMMAND__', tx_hash, response])
+        return SimpleNamespace(status=herapy.TxResultStatus.SUCCESS, detail='', tx_id=tx_hash,
+                               contract_address='hsc', event_list=[event])
+
+
+def test_decode_response():
+    assert '1' == hsc_client.decode_response(b'{"__status_code": "200", "a": "1"}')['a']
+    with pytest.raises(hsc_client.HscForbidden) as e:
+        hsc_client.decode_response('{"__status_code": "403", "__err_msg": "not allowed"}')
+    assert 403 == e.value.status_code
+    assert 'not allowed' == e.value.err_msg
+    with pytest.raises(hsc_client.HscError):
+        hsc_client.decode_response('{"__status_code": "500"}')
+
+
+def test_concurrent_queries():
+    aergo = FakeAergo()
+
+    async def run():
+        async with hsc_client.AsyncHscClient(aergo, 'hsc', max_workers=10) as hsc:
+            return await asyncio.gather(*[hsc.query('__HSC_COMMAND__', 'getCommandsOfTarget', 'm{}'.format(i))
+                                          for i in range(10)])
+
+    start = time.time()
+    responses = asyncio.run(run())
+    assert time.time() - start < 10 * aergo.query_delay
+    assert 1 < aergo.max_in_flight
+    assert ['m{}'.format(i) for i in range(10)] == [r['target'] for r in responses]
+
+
+def test_query_error():
+    async def run():
+        async with hsc_client.AsyncHscClient(FakeAergo(), 'hsc') as hsc:
+            await hsc.query('__HSC_COMMAND__', 'getCommandsOfTarget', 'unknown')
+
+    with pytest.raises(hsc_client.HscNotFound):
+        asyncio.run(run())
+
+
+def test_concurrent_calls():
+    aergo = FakeAergo()
+
+    async def run():
+        async with hsc_client.AsyncHscClient(aergo, 'hsc') as hsc:
+            return await asyncio.gather(*[hsc.call('__HSC_COMMAND__', 'addCommand', 'cmd{}'.format(i))
+                                          for i in range(5)])
+
+    responses = asyncio.run(run())
+    assert [1, 2, 3, 4, 5] == aergo.nonces
+    assert sorted(['tx{}'.format(i) for i in range(1, 6)]) == sorted(r['cmd_id'] for r in responses)
+
+
+class FakeNode:
+    def __init__(self):
+        self.connected = []
+        self.disconnected = 0
+        self.down = set()
+        self.height = 1
+        self.n_queries = 0
+
+    def new_aergo(self):
+        node = self
+
+        class PooledAergo(FakeAergo):
+            def __init__(self):
+                super().__init__(query_delay=0.01)
+                self.target = None
+
+            def connect(self, target):
+                if target in node.down:
+                    raise ConnectionError(target)
+                self.target = target
+                node.connected.append(target)
+
+            def disconnect(self):
+                node.disconnected += 1
+
+            def get_blockchain_status(self):
+                if self.target in node.down:
+                    raise hsc_client.CommunicationException(ConnectionError(self.target))
+                return b'hash', node.height
+
+            def query_sc(self, hsc_address, func_name, args=None):
+                self.get_blockchain_status()
+                node.n_queries += 1
+                return super().query_sc(hsc_address, func_name, args)
+
+        return PooledAergo()
+
+
+def test_pooled_client():
+    node = FakeNode()
+    client = hsc_client.HscClient(['node1', 'node2'], 'hsc', pool_size=3, new_aergo=node.new_aergo)
+
+    def query(i):
+        return client.query('__HSC_COMMAND__', 'getCommandsOfTarget', 'm{}'.format(i))['target']
+
+    with hsc_client.ThreadPoolExecutor(max_workers=8) as executor:
+        assert ['m{}'.format(i) for i in range(40)] == list(executor.map(query, range(40)))
+    # connections are reused and bounded by the pool size
+    assert len(node.connected) <= 3
+
+    # a broken connection is reconnected to another endpoint
+    node.down.add('node1')
+    n_connected = len(node.connected)
+    for i in range(10):
+        assert 'm{}'.format(i) == query(i)
+    assert ['node2'] * (len(node.connected) - n_connected) == node.connected[n_connected:]
+
+    client.close()
+    assert len(node.connected) == node.disconnected
+    with pytest.raises(RuntimeError):
+        query(0)
+
+
+def test_async_client_with_pool():
+    node = FakeNode()
+
+    async def run(client):
+        async with hsc_client.AsyncHscClient(client, 'hsc') as hsc:
+            return await asyncio.gather(*[hsc.query('__HSC_COMMAND__', 'getCommandsOfTarget', 'm{}'.format(i))
+                                          for i in range(20)])
+
+    with hsc_client.HscClient('node1', 'hsc', pool_size=4, new_aergo=node.new_aergo) as client:
+        assert 20 == len(asyncio.run(run(client)))
+    assert len(node.connected) <= 4
+
+
+def test_query_cache():
+    cache = hsc_client.QueryCache(max_size=2)
+    cache.put(('hsc', 'M1', 'f', '[1]'), 10, 'a')
+    cache.put(('hsc', 'M2', 'f', '[1]'), 10, 'b')
+    assert (True, 'a') == cache.get(('hsc', 'M1', 'f', '[1]'), 10)
+
+    # LRU
+    cache.put(('hsc', 'M1', 'f', '[2]'), 10, 'c')
+    assert (False, None) == cache.get(('hsc', 'M2', 'f', '[1]'), 10)
+    assert 2 == len(cache)
+
+    # an HSC event invalidates the module
+    event = SimpleNamespace(name='HSC', arguments=['M1', 'tx', '{}'])
+    cache.on_events([event])
+    assert 0 == len(cache)
+
+    # a new block invalidates all
+    cache.put(('hsc', 'M1', 'f', '[1]'), 10, 'a')
+    assert (False, None) == cache.get(('hsc', 'M1', 'f', '[1]'), 11)
+    cache.put(('hsc', 'M1', 'f', '[1]'), 10, 'old')
+    assert 0 == len(cache)
+
+
+def test_query_cache_ttl(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(hsc_client.time, 'time', lambda: now[0])
+    cache = hsc_client.QueryCache(ttl=1)
+    cache.put('key', 1, 'a')
+    assert (True, 'a') == cache.get('key', 1)
+    now[0] += 2
+    assert (False, None) == cache.get('key', 1)
+
+
+def test_cached_client_query():
+    node = FakeNode()
+    client = hsc_client.HscClient('node1', 'hsc', pool_size=2, new_aergo=node.new_aergo,
+                                  query_cache=hsc_client.QueryCache(), height_interval=0)
+    for _ in range(5):
+        assert 'm1' == client.query('__HSC_COMMAND__', 'getCommandsOfTarget', 'm1')['target']
+    assert 1 == node.n_queries
+
+    node.height += 1
+    assert 'm1' == client.query('__HSC_COMMAND__', 'getCommandsOfTarget', 'm1')['target']
+    assert 2 == node.n_queries
+
+    # an error response is also decoded from the cache
+    for _ in range(2):
+        with pytest.raises(hsc_client.HscNotFound):
+            client.query('__HSC_COMMAND__', 'getCommandsOfTarget', 'unknown')
+    assert 3 == node.n_queries
+    client.close()
+
+
+def hsc_deploy_call(standin, module, func_name, *args):
+    hsc_deploy.call_sc(standin.aergo, standin.hsc_address, 'callFunction', [module, func_name] + list(args))
+
+
+def test_query_pages(standin):
+    address = str(standin.aergo.account.address)
+    hsc_deploy_call(standin, '__HSC_USER__', 'createUser', 'page-user', address, '{}')
+    for i in range(5):
+        hsc_deploy_call(standin, '__HSC_COMMAND__', 'addCommand', 'page{}'.format(i), '{}', '[]')
+
+    client = hsc_client.HscClient('standin', standin.hsc_address, pool_size=1, new_aergo=standin.node.new_aergo)
+    cmd_list = client.query('__HSC_COMMAND__', 'getSystemCommands')['cmd_list']
+    assert 5 <= len(cmd_list)
+
+    pages = list(client.query_pages('__HSC_COMMAND__', 'getSystemCommands', page_size=2))
+    assert [2] * (len(pages) - 1) == [len(p['cmd_list']) for p in pages[:-1]]
+    assert 'next_cursor' not in pages[-1]
+    assert cmd_list == [cmd for p in pages for cmd in p['cmd_list']]
+
+    # a generator reads pages lazily
+    assert 1 == len(next(client.query_pages('__HSC_COMMAND__', 'getSystemCommands', page_size=1))['cmd_list'])
+    with pytest.raises(hsc_client.HscNotFound):
+        next(client.query_pages('__HSC_SPACE_BLOCKCHAIN__', 'getAllNodes', 'no-chain'))
+    assert address == cmd_list[0]['cmd_orderer']
+    client.close()
+
+
+def test_command_poller(standin):
+    address = str(standin.aergo.account.address)
+    hsc_deploy_call(standin, '__HSC_USER__', 'createUser', 'poll-user', address, '{}')
+    hsc_deploy_call(standin, '__HSC_SPACE_COMPUTING__', 'addCluster', 'poll-cluster', 'poll-cluster', False, '{}')
+    hsc_deploy_call(standin, '__HSC_SPACE_COMPUTING__', 'addMachine', 'poll-cluster', 'poll-machine',
+                    'poll-machine', '{}')
+
+    client = hsc_client.HscClient('standin', standin.hsc_address, pool_size=1, new_aergo=standin.node.new_aergo)
+    poller = hsc_client.CommandPoller(client, 'poll-cluster', 'poll-machine', page_size=2)
+    poller.poll()
+    assert standin.node.height == poller.watermark
+    assert [] == poller.poll()
+
+    # a new command of the target
+    target_list = [{'target_index': 0, 'cluster_id': 'poll-cluster', 'machine_id': 'poll-machine'}]
+    hsc_deploy_call(standin, '__HSC_COMMAND__', 'addCommand', 'poll', '{}', json.dumps(target_list))
+    cmd_list = poller.poll()
+    assert [('poll', 'INIT')] == [(cmd['cmd_type'], cmd['status']) for cmd in cmd_list]
+    assert [] == poller.poll()
+
+    # a status change of the target, and system commands over pages
+    hsc_deploy_call(standin, '__HSC_COMMAND__', 'updateTarget', cmd_list[0]['cmd_id'],
+                    'poll-cluster', 'poll-machine', 0, 'DONE')
+    for i in range(3):
+        hsc_deploy_call(standin, '__HSC_COMMAND__', 'addCommand', 'poll-system', '{}', '[]')
+    cmd_list = poller.poll()
+    assert [('poll', 'DONE')] + [('poll-system', 'INIT')] * 3 == [(cmd['cmd_type'], cmd['status'])
+                                                                  for cmd in cmd_list]
+    assert [] == poller.poll()
+    client.close()
@@ -0,0 +1,294 @@
+import pytest
+
+import os
+import shutil
+import stat
+
+import hsc_compile
+
+
+FAKE_AERGOLUAC = """#!/usr/bin/env python3
+import hashlib
+import sys
+
+with open({log!r}, 'a') as f:
+    f.write(sys.argv[-1] + '\\n')
+with open(sys.argv[-1], 'rb') as f:
+    print(hashlib.sha256(f.read()).hexdigest())
+"""
+
+
+@pytest.fixture
+def setup(tmp_path, monkeypatch):
+    bin_dir = tmp_path / 'bin'
+    bin_dir.mkdir()
+    log = tmp_path / 'aergoluac.log'
+    aergoluac = bin_dir / 'aergoluac'
+    aergoluac.write_text(FAKE_AERGOLUAC.format(log=str(log)))
+    aergoluac.chmod(aergoluac.stat().st_mode | stat.S_IEXEC)
+
+    lua_dir = tmp_path / 'sc'
+    (lua_dir / 'manifest').mkdir(parents=True)
+    (lua_dir / 'manifest' / '_manifest.lua').write_text('MODULE_NAME = "__MANIFEST__"\n')
+    (lua_dir / 'manifest' / '_manifest_db.lua').write_text('MODULE_NAME = "__MANIFEST_DB__"\n')
+    (lua_dir / 'hsc_command.lua').write_text('MODULE_NAME = "__HSC_COMMAND__"\n')
+
+    monkeypatch.setenv('AERGO_PATH', str(bin_dir))
+    monkeypatch.setenv('HSC_LUA_DIR', str(lua_dir))
+    monkeypatch.setattr(hsc_compile, 'HSC_COMPILED_PAYLOAD_DATA_FILE',
+                        str(tmp_path / 'hsc.compiled.payload.dat'))
+    monkeypatch.setattr(hsc_compile, 'HSC_AERGO_LUAC_STATE_FILE',
+                        str(tmp_path / 'hsc.aergoluac.dat'))
+    monkeypatch.setattr(hsc_compile, 'HSC_SOURCE_INDEX_FILE',
+                        str(tmp_path / 'hsc.source.index.dat'))
+    monkeypatch.setattr(hsc_compile, 'g_aergo_luac_path', '')
+    monkeypatch.setattr(hsc_compile, 'QUIET_MODE', True)
+
+    def compiled():
+        if not log.exists():
+            return []
+        return [os.path.basename(l) for l in log.read_text().splitlines()]
+
+    return lua_dir, compiled
+
+
+def test_unchanged_sources_are_not_compiled(setup):
+    lua_dir, compiled = setup
+
+    hsc_compile.hsc_compile()
+    assert sorted(compiled()) == ['_manifest.lua', '_manifest_db.lua', 'hsc_command.lua']
+
+    hsc_compile.hsc_compile()
+    assert 3 == len(compiled())
+
+    payload_info = hsc_compile.read_payload_info()
+    assert 'hsc_command.lua' in payload_info
+    assert 'cache_key' in payload_info['hsc_command.lua']
+
+
+def test_changed_source_is_compiled(setup):
+    lua_dir, compiled = setup
+
+    hsc_compile.hsc_compile()
+    old_payload = hsc_compile.read_payload_info()['hsc_command.lua']['payload_hash']
+
+    (lua_dir / 'hsc_command.lua').write_text('MODULE_NAME = "__HSC_COMMAND_V2__"\n')
+    hsc_compile.hsc_compile()
+    assert 4 == len(compiled())
+    assert 'hsc_command.lua' == compiled()[-1]
+
+    new_payload = hsc_compile.read_payload_info()['hsc_command.lua']['payload_hash']
+    assert old_payload != new_payload
+
+
+def test_parallel_compile(setup):
+    lua_dir, compiled = setup
+    for i in range(8):
+        (lua_dir / 'hsc_module{}.lua'.format(i)).write_text('MODULE_NAME = "{}"\n'.format(i))
+
+    hsc_compile.hsc_compile(jobs=4)
+    assert 11 == len(compiled())
+
+    payload_info = hsc_compile.read_payload_info()
+    assert payload_info['_manifest.lua']['is_manifest']
+    assert not payload_info['hsc_module0.lua']['is_manifest']
+    for i in range(8):
+        assert 'hsc_module{}.lua'.format(i) in payload_info
+
+
+def test_aergoluac_path_is_cached(setup, tmp_path, monkeypatch):
+    hsc_compile.check_aergo_path()
+    hsc_compile.check_aergo_luac_path()
+    found = hsc_compile.g_aergo_luac_path
+    assert str(tmp_path / 'bin' / 'aergoluac') == found
+    assert found == hsc_compile.read_aergo_luac_state()
+
+    # the cached path is used even if AERGO_PATH is gone
+    monkeypatch.delenv('AERGO_PATH')
+    monkeypatch.setattr(hsc_compile, 'get_aergo_luac_candidates', lambda: [])
+    hsc_compile.check_aergo_path()
+    hsc_compile.check_aergo_luac_path()
+    assert found == hsc_compile.g_aergo_luac_path
+
+    # a modified binary invalidates the cache
+    with open(found, 'a') as f:
+        f.write('\n')
+    assert hsc_compile.read_aergo_luac_state() is None
+
+
+def test_search_aergoluac_is_bounded(setup, tmp_path):
+    deep = tmp_path / 'go' / 'src' / 'github.com' / 'aergoio' / 'aergo' / 'bin'
+    deep.mkdir(parents=True)
+    aergoluac = deep / 'aergoluac'
+    aergoluac.write_text('#!/bin/sh\n')
+    aergoluac.chmod(aergoluac.stat().st_mode | stat.S_IEXEC)
+
+    assert str(aergoluac) == hsc_compile.search_file(str(tmp_path / 'go'))
+    assert hsc_compile.search_file(str(tmp_path / 'go'), max_depth=2) is None
+
+
+def test_scan_lua_files(setup, monkeypatch):
+    lua_dir, _ = setup
+    deep = lua_dir / 'space' / 'computing' / 'cluster'
+    deep.mkdir(parents=True)
+    (deep / 'hsc_cluster.lua').write_text('MODULE_NAME = "__HSC_CLUSTER__"\n')
+
+    index, added, changed, removed = hsc_compile.scan_lua_files(str(lua_dir))
+    assert ['_manifest.lua', '_manifest_db.lua', 'hsc_cluster.lua', 'hsc_command.lua'] == added
+    assert [] == changed
+    assert [] == removed
+    assert str(deep / 'hsc_cluster.lua') == index['hsc_cluster.lua']['path']
+
+    # unchanged modules are not read again
+    hashed = []
+    get_src_hash = hsc_compile.get_src_hash
+    monkeypatch.setattr(hsc_compile, 'get_src_hash',
+                        lambda src: hashed.append(src) or get_src_hash(src))
+
+    (lua_dir / 'hsc_command.lua').write_text('MODULE_NAME = "__HSC_COMMAND_V2__"\n')
+    (deep / 'hsc_cluster.lua').unlink()
+    index, added, changed, removed = hsc_compile.scan_lua_files(str(lua_dir), index)
+    assert [] == added
+    assert ['hsc_command.lua'] == changed
+    assert ['hsc_cluster.lua'] == removed
+    assert [str(lua_dir / 'hsc_command.lua')] == hashed
+
+
+def test_polling_watcher(setup):
+    lua_dir, _ = setup
+    watcher = hsc_compile.PollingWatcher(str(lua_dir), interval=0.01)
+    assert not watcher.wait(0.05)
+
+    (lua_dir / 'hsc_user.lua').write_text('MODULE_NAME = "__HSC_USER__"\n')
+    assert watcher.wait(1)
+    assert not watcher.wait(0.05)
+
+
+def test_inotify_watcher_recreated_dir(setup):
+    if hsc_compile.INotify is None:
+        pytest.skip('needs inotify_simple')
+    lua_dir, _ = setup
+    watcher = hsc_compile.INotifyWatcher(str(lua_dir))
+    try:
+        shutil.rmtree(str(lua_dir / 'manifest'))
+        assert watcher.wait(1)
+        while watcher.wait(0.1):
+            pass
+        assert str(lua_dir / 'manifest') not in watcher.watched
+
+        (lua_dir / 'manifest').mkdir()
+        assert watcher.wait(1)
+        while watcher.wait(0.1):
+            pass
+
+        # a save into the recreated directory is still seen
+        (lua_dir / 'manifest' / '_manifest.lua').write_text('MODULE_NAME = "__MANIFEST__"\n')
+        assert watcher.wait(1)
+    finally:
+        watcher.close()
+
+
+def test_watch_survives_broken_start(setup, monkeypatch):
+    lua_dir, compiled = setup
+    watcher = hsc_compile.PollingWatcher(str(lua_dir), interval=0.01)
+    waits = []
+
+    def wait(timeout=None):
+        waits.append(timeout)
+        raise KeyboardInterrupt
+
+    def broken_compile(**kwargs):
+        raise SyntaxError("broken source")
+
+    monkeypatch.setattr(watcher, 'wait', wait)
+    monkeypatch.setattr(hsc_compile, 'new_watcher', lambda *args: watcher)
+    monkeypatch.setattr(hsc_compile, 'hsc_compile', broken_compile)
+
+    # a broken source at the start waits for the next save
+    hsc_compile.hsc_watch()
+    assert [None] == waits
+
+
+def test_rebuild_returns_only_updated_modules(setup):
+    lua_dir, compiled = setup
+
+    assert 3 == len(hsc_compile.hsc_compile(show_timing=True))
+
+    (lua_dir / 'hsc_command.lua').write_text('MODULE_NAME = "__HSC_COMMAND_V2__"\n')
+    assert ['hsc_command.lua'] == hsc_compile.hsc_compile(check_env=False, show_timing=True)
+    assert 4 == len(compiled())
+
+
+def test_payload_store(setup, tmp_path):
+    lua_dir, compiled = setup
+
+    hsc_compile.hsc_compile()
+    payload_info = hsc_compile.read_payload_info()
+    entry = payload_info['hsc_command.lua']
+    assert 'payload' not in entry
+    payload = hsc_compile.read_payload(entry['payload_hash'])
+    assert entry['payload_hash'] == hsc_compile.get_payload_hash(payload)
+
+    store_dir = tmp_path / hsc_compile.HSC_COMPILED_PAYLOAD_STORE_DIR
+    assert 3 == len(list(store_dir.iterdir()))
+
+    # an old payload is removed from the store once it isn't used
+    (lua_dir / 'hsc_command.lua').write_text('MODULE_NAME = "__HSC_COMMAND_V2__"\n')
+    hsc_compile.hsc_compile()
+    assert 3 == len(list(store_dir.iterdir()))
+    assert not (store_dir / entry['payload_hash']).exists()
+
+
+def test_lost_payload_is_compiled_again(setup, tmp_path):
+    lua_dir, compiled = setup
+
+    hsc_compile.hsc_compile()
+    entry = hsc_compile.read_payload_info()['hsc_command.lua']
+    (tmp_path / hsc_compile.HSC_COMPILED_PAYLOAD_STORE_DIR / entry['payload_hash']).unlink()
+
+    hsc_compile.hsc_compile()
+    assert 4 == len(compiled())
+    assert 'hsc_command.lua' == compiled()[-1]
+
+
+def test_strip_lua_prints():
+    src = ('local a = 1\n'
+           'system.print("f(", a, [[ ) ]], f(g(1)))\n'
+           '-- system.print("comment")\n'
+           'local s = "system.print(1)"\n'
+           'mysystem.print(2)\n'
+           'if a then system.print(\n'
+           '  a) end\n')
+    assert ('local a = 1\n'
+            '\n'
+            '-- system.print("comment")\n'
+            'local s = "system.print(1)"\n'
+            'mysystem.print(2)\n'
+            'if a then \n'
+            ' end\n') == hsc_compile.strip_lua_prints(src)
+
+
+def test_release_profile(setup):
+    lua_dir, compiled = setup
+    (lua_dir / 'hsc_command.lua').write_text('MODULE_NAME = "__HSC_COMMAND__"\nsystem.print(MODULE_NAME)\n')
+
+    hsc_compile.hsc_compile()
+    payload_info = hsc_compile.read_payload_info()
+    assert 'debug' == payload_info['hsc_profile']
+    debug_payload = payload_info['hsc_command.lua']['payload_hash']
+
+    # the release profile compiles HSC modules again without 'system.print'
+    hsc_compile.hsc_compile(profile='release')
+    assert 4 == len(compiled())
+    payload_info = hsc_compile.read_payload_info()
+    assert 'release' == payload_info['hsc_profile']
+    assert 'release' == payload_info['hsc_command.lua']['profile']
+
+    # the Manifest modules are kept, not to change the HSC address and its DB
+    assert 'debug' == payload_info['_manifest.lua']['profile']
+    assert 'debug' == payload_info['_manifest_db.lua']['profile']
+    release_payload = payload_info['hsc_command.lua']['payload_hash']
+    assert debug_payload != release_payload
+
+    hsc_compile.hsc_compile(profile='release')
+    assert 4 == len(compiled())
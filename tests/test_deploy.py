@@ -0,0 +1,233 @@
+import pytest
+
+import json
+import os
+from types import SimpleNamespace
+
+import aergo.herapy as herapy
+import hsc_deploy
+from aergo.herapy.errors.exception import CommunicationException
+
+
+class TxNotFound:
+    def details(self):
+        return "tx not found"
+
+
+class FakeAergo:
+    def __init__(self, n_pending):
+        self.n_pending = n_pending
+        self.n_polls = 0
+
+    def get_tx_result(self, tx_hash):
+        self.n_polls += 1
+        if self.n_polls <= self.n_pending:
+            raise CommunicationException(TxNotFound())
+        return tx_hash
+
+
+def test_wait_tx_result_returns_when_receipt_exists(monkeypatch):
+    monkeypatch.setattr(hsc_deploy, 'AERGO_POLLING_INTERVAL', 0.001)
+    aergo = FakeAergo(n_pending=3)
+    assert 'tx' == hsc_deploy.wait_tx_result(aergo, 'tx', timeout=5)
+    assert 4 == aergo.n_polls
+
+
+def test_wait_tx_result_timeout(monkeypatch):
+    monkeypatch.setattr(hsc_deploy, 'AERGO_POLLING_INTERVAL', 0.001)
+    aergo = FakeAergo(n_pending=1000000)
+    with pytest.raises(TimeoutError):
+        hsc_deploy.wait_tx_result(aergo, 'tx', timeout=0.05)
+
+
+class FakeDeployAergo:
+    def __init__(self):
+        self.log = []
+        self.n_deployed = 0
+
+    def get_account(self):
+        self.log.append(('get_account',))
+
+    def deploy_sc(self, payload, args=None):
+        self.n_deployed += 1
+        tx_hash = 'tx{}'.format(self.n_deployed)
+        self.log.append(('deploy_sc', payload, tx_hash))
+        return (SimpleNamespace(tx_hash=tx_hash),
+                SimpleNamespace(status=herapy.CommitStatus.TX_OK, detail=''))
+
+    def get_tx_result(self, tx_hash):
+        self.log.append(('get_tx_result', tx_hash))
+        status = herapy.TxResultStatus.CREATED
+        if tx_hash == 'setVersion':
+            status = herapy.TxResultStatus.SUCCESS
+        return SimpleNamespace(status=status, detail='', contract_address='address_' + tx_hash)
+
+    def call_sc(self, hsc_address, func_name, args=None):
+        self.log.append(('call_sc', func_name))
+        return (SimpleNamespace(tx_hash=func_name),
+                SimpleNamespace(status=herapy.CommitStatus.TX_OK, detail=''))
+
+    def query_sc(self, hsc_address, func_name, args=None):
+        raise RuntimeError("not deployed")
+
+
+@pytest.fixture
+def compiled(tmp_path):
+    compiled_info = {'hsc_version': 'v0.0.1'}
+    for key, is_manifest in [('_manifest.lua', True), ('_manifest_db.lua', True),
+                             ('hsc_command.lua', False), ('hsc_user.lua', False)]:
+        compiled_info[key] = {
+            'src': key,
+            'payload': 'payload_' + key,
+            'is_manifest': is_manifest,
+        }
+    compiled_path = tmp_path / 'hsc.compiled.payload.dat'
+    compiled_path.write_text(json.dumps(compiled_info))
+    return str(compiled_path), str(tmp_path / 'hsc.deployed.payload.dat')
+
+
+def test_pipeline_deploy(compiled, monkeypatch):
+    monkeypatch.setattr(hsc_deploy, 'QUIET_MODE', True)
+    compiled_path, deployed_path = compiled
+    aergo = FakeDeployAergo()
+
+    hsc_address = hsc_deploy.hsc_deploy(aergo, compiled_path, deployed_path, pipeline=True)
+    assert 'address_tx1' == hsc_address
+
+    # the Manifest at first, then the others are submitted before any receipt
+    ops = [op[0] for op in aergo.log]
+    assert ['deploy_sc', 'get_tx_result', 'get_account',
+            'deploy_sc', 'deploy_sc', 'deploy_sc',
+            'get_tx_result', 'get_tx_result', 'get_tx_result',
+            'call_sc', 'get_tx_result'] == ops
+
+    deployed_info = json.loads(open(deployed_path).read())
+    assert 'address_tx2' == deployed_info['_manifest_db.lua']['address']
+    assert 'address_tx4' == deployed_info['hsc_user.lua']['address']
+
+    # nothing to deploy at the second time
+    aergo = FakeDeployAergo()
+    aergo.query_sc = lambda *args, **kwargs: b'"v0.0.1"'
+    hsc_deploy.hsc_deploy(aergo, compiled_path, deployed_path, pipeline=True)
+    assert 0 == aergo.n_deployed
+
+
+def get_sc_compiled_info():
+    sc_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sc')
+    compiled_info = {'hsc_version': 'v0.0.1'}
+    for root, _, files in os.walk(sc_dir):
+        for name in sorted(files):
+            if name.endswith('.lua'):
+                compiled_info[name] = {
+                    'src': os.path.join(root, name),
+                    'payload_hash': 'hash_' + name,
+                    'is_manifest': name.startswith('_manifest'),
+                }
+    return compiled_info
+
+
+def get_deployed_info(compiled_info):
+    deployed_info = {'hsc_version': compiled_info['hsc_version'], 'hsc_address': 'address_manifest'}
+    for k, v in compiled_info.items():
+        if k != 'hsc_version':
+            deployed_info[k] = {'address': 'address_' + k, 'payload_hash': v['payload_hash']}
+    return deployed_info
+
+
+def test_dependency_graph():
+    graph = hsc_deploy.get_dependency_graph(get_sc_compiled_info())
+    assert set() == graph['_manifest.lua']
+    assert {'_manifest.lua'} == graph['_manifest_db.lua']
+    assert {'_manifest.lua', '_manifest_db.lua'} == graph['hsc_command.lua']
+    assert {'_manifest.lua', '_manifest_db.lua'} == graph['hsc_space_blockchain.lua']
+
+
+def test_plan_deploy():
+    compiled_info = get_sc_compiled_info()
+    deployed_info = get_deployed_info(compiled_info)
+    assert [] == hsc_deploy.plan_deploy(compiled_info, deployed_info)
+
+    # only a changed module is deployed
+    compiled_info['hsc_space_computing.lua']['payload_hash'] = 'hash_v2'
+    plan = hsc_deploy.plan_deploy(compiled_info, deployed_info)
+    assert [('hsc_space_computing.lua', 'hash_v2', 'changed')] == plan
+
+    # modules creating tables in _manifest_db are deployed again with it
+    compiled_info['_manifest_db.lua']['payload_hash'] = 'hash_v2'
+    plan = [k for k, _, _ in hsc_deploy.plan_deploy(compiled_info, deployed_info)]
+    assert '_manifest_db.lua' == plan[0]
+    assert sorted(k for k in compiled_info if k.endswith('.lua') and k.startswith('hsc_')) == sorted(plan[1:])
+
+    # everything is deployed again with a new Manifest
+    plan = hsc_deploy.plan_deploy(compiled_info, deployed_info, manifest_alive=False)
+    assert '_manifest.lua' == plan[0][0]
+    assert len(compiled_info) - 1 == len(plan)
+
+
+def test_version_change_sets_version_only(tmp_path, monkeypatch):
+    monkeypatch.setattr(hsc_deploy, 'QUIET_MODE', True)
+    compiled_info = get_sc_compiled_info()
+    compiled_info['hsc_version'] = 'v0.0.2'
+    deployed_info = get_deployed_info(get_sc_compiled_info())
+    compiled_path = tmp_path / 'hsc.compiled.payload.dat'
+    compiled_path.write_text(json.dumps(compiled_info))
+    deployed_path = tmp_path / 'hsc.deployed.payload.dat'
+    deployed_path.write_text(json.dumps(deployed_info))
+
+    aergo = FakeDeployAergo()
+    aergo.query_sc = lambda *args, **kwargs: b'"v0.0.1"'
+    hsc_deploy.hsc_deploy(aergo, str(compiled_path), str(deployed_path), dry_run=True)
+    assert [] == aergo.log
+
+    hsc_deploy.hsc_deploy(aergo, str(compiled_path), str(deployed_path))
+    assert 0 == aergo.n_deployed
+    assert ('call_sc', 'setVersion') in aergo.log
+    assert 'v0.0.2' == json.loads(deployed_path.read_text())['hsc_version']
+
+
+def test_redeploy_db_needs_flag(tmp_path, monkeypatch):
+    monkeypatch.setattr(hsc_deploy, 'QUIET_MODE', True)
+    compiled_info = get_sc_compiled_info()
+    compiled_info['_manifest_db.lua']['payload_hash'] = 'hash_v2'
+    for k in compiled_info:
+        if k.endswith('.lua'):
+            compiled_info[k]['payload'] = 'payload_' + k
+    compiled_path = tmp_path / 'hsc.compiled.payload.dat'
+    compiled_path.write_text(json.dumps(compiled_info))
+    deployed_path = tmp_path / 'hsc.deployed.payload.dat'
+    deployed_path.write_text(json.dumps(get_deployed_info(get_sc_compiled_info())))
+
+    # a new DB module of the live HSC drops all data
+    aergo = FakeDeployAergo()
+    aergo.query_sc = lambda *args, **kwargs: b'"v0.0.1"'
+    with pytest.raises(RuntimeError, match='--redeploy-db'):
+        hsc_deploy.hsc_deploy(aergo, str(compiled_path), str(deployed_path))
+    assert 0 == aergo.n_deployed
+
+    hsc_deploy.hsc_deploy(aergo, str(compiled_path), str(deployed_path), redeploy_db=True)
+    assert 'hash_v2' == json.loads(deployed_path.read_text())['_manifest_db.lua']['payload_hash']
+
+
+def test_trace(standin, tmp_path, monkeypatch):
+    import hsc_trace
+
+    path = str(tmp_path / 'trace.jsonl')
+    monkeypatch.setattr(hsc_trace, 'TRACE', hsc_trace.Trace(path))
+    hsc_deploy.call_sc(standin.aergo, standin.hsc_address, 'callFunction',
+                       ['__HSC_USER__', 'createUser', 'trace-user', 'addr', '{}'])
+    hsc_deploy.query_sc(standin.aergo, standin.hsc_address, 'queryFunction',
+                        ['__HSC_USER__', 'getUser', 'trace-user'])
+    hsc_trace.TRACE.close()
+
+    with open(path) as f:
+        call, query = [json.loads(line) for line in f]
+    assert ('call', '__HSC_USER__', 'createUser') == (call['kind'], call['module'], call['func_name'])
+    assert 0 < call['gas_used'] and 0 < call['tx_size'] and 0 < call['response_size']
+    assert ('query', 'getUser') == (query['kind'], query['func_name'])
+
+    summary = hsc_trace.TRACE.summarize()
+    assert 1 == summary[('call', '__HSC_USER__', 'createUser')]['count']
+    assert 'query' in hsc_trace.TRACE.format_summary()[-1]
+
+    prom = hsc_trace.TRACE.format_prometheus()
+    assert 'hsc_gas_used_total{kind="call",module="__HSC_USER__",function="createUser"} ' in prom
@@ -2,36 +2,80 @@ import pytest
 
 import json
 
-import hsc_compile
+import hsc_client
 import hsc_deploy
 
 aergo = None
 hsc_address = None
 
 def call_function(func_name, args):
-    return hsc_deploy.call_sc(aergo, hsc_address, 'callFunction',
-                              ['__HSC_SPACE_BLOCKCHAIN__', func_name] + args)
+    # the response is emitted as the "HSC" event
+    result = hsc_deploy.call_sc(aergo, hsc_address, 'callFunction',
+                                ['__HSC_SPACE_BLOCKCHAIN__', func_name] + args)
+    return hsc_client.get_tx_response(result)
 
 def query_function(func_name, args):
-    return hsc_deploy.query_sc(aergo, hsc_address, 'callFunction',
+    return hsc_deploy.query_sc(aergo, hsc_address, 'queryFunction',
                                ['__HSC_SPACE_BLOCKCHAIN__', func_name] + args)
 
 @pytest.fixture(scope='session')
-def setup():
-    hsc_compile.QUIET_MODE = False
-    hsc_compile.hsc_compile()
-
-    hsc_deploy.QUIET_MODE = False
+def setup(standin):
     global aergo
-    aergo = hsc_deploy.check_aergo_conn_info(target=hsc_deploy.AERGO_TARGET,
-                                             private_key=hsc_deploy.AERGO_PRIVATE_KEY)
+    aergo = standin.aergo
     global hsc_address
-    hsc_address = hsc_deploy.hsc_deploy(aergo=aergo,
-                                        compiled_payload_file_path=hsc_deploy.HSC_COMPILED_PAYLOAD_DATA_FILE,
-                                        deployed_payload_file_path=hsc_deploy.HSC_DEPLOYED_PAYLOAD_DATA_FILE)
+    hsc_address = standin.hsc_address
     print('HSC Address:', hsc_address)
 
 
+# every test creates its own chain, so the tests don't depend on each other
+
+def create_chain(chain_id, chain_name, metadata):
+    response = call_function('createChain', [chain_id, chain_name, True, json.dumps(metadata)])
+    return_value = json.loads(response)
+    print("Return of 'createChain':\n{}".format(json.dumps(return_value, indent=2)))
+    status_code = int(return_value["__status_code"])
+    assert 201 == status_code
+
+
+def create_node(chain_id, node_id, node_name, metadata):
+    response = call_function('createNode', [chain_id, node_id, node_name, json.dumps(metadata)])
+    return_value = json.loads(response)
+    print("Return of 'createNode':\n{}".format(json.dumps(return_value, indent=2)))
+    status_code = int(return_value["__status_code"])
+    assert 201 == status_code
+
+
+def node_metadata(node_id, name, cluster_id, machine_id, **kwargs):
+    # a node runs on a machine of a cluster
+    metadata = {
+        "id": node_id,
+        "name": name,
+        "cluster": {"id": cluster_id},
+        "machine": {"id": machine_id},
+        "ip": "localhost",
+        "port": {
+            "rpc": 7845,
+            "p2p": 7846,
+            "rest": 8080,
+            "profile": 6060,
+        },
+    }
+    metadata.update(kwargs)
+    return metadata
+
+
+def assert_node_metadata(metadata, node):
+    assert metadata['id'] == node['node_metadata']['id']
+    assert metadata['name'] == node['node_metadata']['name']
+    assert metadata['cluster']['id'] == node['node_metadata']['cluster']['id']
+    assert metadata['machine']['id'] == node['node_metadata']['machine']['id']
+    assert metadata['ip'] == node['node_metadata']['ip']
+    assert metadata['port']['rpc'] == node['node_metadata']['port']['rpc']
+    assert metadata['port']['p2p'] == node['node_metadata']['port']['p2p']
+    assert metadata['port']['rest'] == node['node_metadata']['port']['rest']
+    assert metadata['port']['profile'] == node['node_metadata']['port']['profile']
+
+
 def test_create_chain(setup):
     print("test_create_chain:", hsc_address)
     metadata = {
@@ -39,12 +83,7 @@ def test_create_chain(setup):
         "who create it?": "YP",
         "what for?": "just for HSC test",
     }
-    metadata_raw = json.dumps(metadata)
-    response = call_function('createChain', ['wonderland1', 'wonderland', True, metadata_raw])
-    return_value = json.loads(response.detail)
-    print("Return of 'createChain':\n{}".format(json.dumps(return_value, indent=2)))
-    status_code = int(return_value["__status_code"])
-    assert 201 == status_code
+    create_chain('wonderland1', 'wonderland', metadata)
 
     response = query_function('getChain', ['wonderland1'])
     return_value = json.loads(response)
@@ -58,214 +97,164 @@ def test_create_chain(setup):
 
 def test_update_chain(setup):
     print("test_update_chain:", hsc_address)
+    create_chain('wonderland2', 'wonderland', {"name": "wonderland"})
+
+    node_names = [
+        "red-queen",
+        "cheshire-cat",
+        "caterpillar",
+        "tweedledee",
+        "alice",
+        "mad-hatter",
+        "tweedledum",
+        "white-rabbit",
+    ]
     metadata = {
-        "I will make nodes below": [
-            "red-queen",
-            "cheshire-cat",
-            "caterpillar",
-            "tweedledee",
-            "alice",
-            "mad-hatter",
-            "tweedledum",
-            "white-rabbit",
+        "I will make nodes below": node_names,
+        # updateChain checks whether the sender is a cluster or a machine of the nodes
+        "node_list": [
+            {
+                "node_id": name,
+                "cluster": {"id": "ogrima1"},
+                "machine": {"id": "machine1"},
+            } for name in node_names
         ],
     }
     metadata_raw = json.dumps(metadata)
-    response = call_function('updateChain', ['wonderland1', 'wonderland', True, metadata_raw])
-    return_value = json.loads(response.detail)
+    response = call_function('updateChain', ['wonderland2', 'wonderland', True, metadata_raw])
+    return_value = json.loads(response)
     print("Return of 'updateChain':\n{}".format(json.dumps(return_value, indent=2)))
     status_code = int(return_value["__status_code"])
     assert 201 == status_code
 
-    response = query_function('getChain', ['wonderland1'])
+    response = query_function('getChain', ['wonderland2'])
     return_value = json.loads(response)
     print("Return of 'getChain':\n{}".format(json.dumps(return_value, indent=2)))
     status_code = int(return_value["__status_code"])
     assert 200 == status_code
-    assert metadata['I will make nodes below'][0] == return_value['chain_metadata']['I will make nodes below'][0]
-    assert metadata['I will make nodes below'][1] == return_value['chain_metadata']['I will make nodes below'][1]
-    assert metadata['I will make nodes below'][2] == return_value['chain_metadata']['I will make nodes below'][2]
-    assert metadata['I will make nodes below'][3] == return_value['chain_metadata']['I will make nodes below'][3]
-    assert metadata['I will make nodes below'][4] == return_value['chain_metadata']['I will make nodes below'][4]
-    assert metadata['I will make nodes below'][5] == return_value['chain_metadata']['I will make nodes below'][5]
-    assert metadata['I will make nodes below'][6] == return_value['chain_metadata']['I will make nodes below'][6]
-    assert metadata['I will make nodes below'][7] == return_value['chain_metadata']['I will make nodes below'][7]
+    assert node_names == return_value['chain_metadata']['I will make nodes below']
+    # the node list is not stored in the chain metadata
+    assert 'node_list' not in return_value['chain_metadata']
 
 
 def test_create_node(setup):
     print("test_create_node:", hsc_address)
+    create_chain('wonderland3', 'wonderland', {"name": "wonderland"})
 
-    node1_metadata = {
-        "id": "node1",
-        "name": "red-queen",
-        "ip": "localhost",
-        "port": {
-            "rpc": 7845,
-            "p2p": 7846,
-            "rest": 8080,
-            "profile": 6060,
-        },
-    }
-    node1_metadata_raw = json.dumps(node1_metadata)
-    response = call_function('createNode', ['wonderland1', 'node1', 'red-queen', node1_metadata_raw])
-    return_value = json.loads(response.detail)
-    print("Return of 'createNode':\n{}".format(json.dumps(return_value, indent=2)))
-    status_code = int(return_value["__status_code"])
-    assert 201 == status_code
+    node1_metadata = node_metadata("node1", "red-queen", "ogrima1", "machine1")
+    create_node('wonderland3', 'node1', 'red-queen', node1_metadata)
 
-    response = query_function('getNode', ['wonderland1', 'node1'])
+    response = query_function('getNode', ['wonderland3', 'node1'])
     return_value = json.loads(response)
     print("Return of 'getNode':\n{}".format(json.dumps(return_value, indent=2)))
     status_code = int(return_value["__status_code"])
     assert 200 == status_code
-    assert node1_metadata['id'] == return_value['node_list'][0]['node_metadata']['id']
-    assert node1_metadata['name'] == return_value['node_list'][0]['node_metadata']['name']
-    assert node1_metadata['ip'] == return_value['node_list'][0]['node_metadata']['ip']
-    assert node1_metadata['port']['rpc'] == return_value['node_list'][0]['node_metadata']['port']['rpc']
-    assert node1_metadata['port']['p2p'] == return_value['node_list'][0]['node_metadata']['port']['p2p']
-    assert node1_metadata['port']['rest'] == return_value['node_list'][0]['node_metadata']['port']['rest']
-    assert node1_metadata['port']['profile'] == return_value['node_list'][0]['node_metadata']['port']['profile']
-
-    node2_metadata = {
-        "id": "node2",
-        "name": "chashire-cat",
-        "ip": "127.0.0.1",
-        "port": {
-            "rpc": 17845,
-            "p2p": 17846,
-            "rest": 18080,
-            "profile": 16060,
-        },
-    }
-    node2_metadata_raw = json.dumps(node2_metadata)
-    response = call_function('createNode', ['wonderland1', 'node2', 'chashire-cat', node2_metadata_raw])
-    return_value = json.loads(response.detail)
-    print("Return of 'createNode':\n{}".format(json.dumps(return_value, indent=2)))
-    status_code = int(return_value["__status_code"])
-    assert 201 == status_code
+    assert_node_metadata(node1_metadata, return_value['node_list'][0])
+
+    node2_metadata = node_metadata("node2", "chashire-cat", "ogrima1", "machine2",
+                                   ip="127.0.0.1",
+                                   port={"rpc": 17845, "p2p": 17846, "rest": 18080, "profile": 16060})
+    create_node('wonderland3', 'node2', 'chashire-cat', node2_metadata)
 
-    response = query_function('getNode', ['wonderland1', 'node2'])
+    response = query_function('getNode', ['wonderland3', 'node2'])
     return_value = json.loads(response)
     print("Return of 'getNode':\n{}".format(json.dumps(return_value, indent=2)))
     status_code = int(return_value["__status_code"])
     assert 200 == status_code
-    assert node2_metadata['id'] == return_value['node_list'][0]['node_metadata']['id']
-    assert node2_metadata['name'] == return_value['node_list'][0]['node_metadata']['name']
-    assert node2_metadata['ip'] == return_value['node_list'][0]['node_metadata']['ip']
-    assert node2_metadata['port']['rpc'] == return_value['node_list'][0]['node_metadata']['port']['rpc']
-    assert node2_metadata['port']['p2p'] == return_value['node_list'][0]['node_metadata']['port']['p2p']
-    assert node2_metadata['port']['rest'] == return_value['node_list'][0]['node_metadata']['port']['rest']
-    assert node2_metadata['port']['profile'] == return_value['node_list'][0]['node_metadata']['port']['profile']
-
-    response = query_function('getAllNodes', ['wonderland1'])
+    assert_node_metadata(node2_metadata, return_value['node_list'][0])
+
+    # getAllNodes lists the newest node first
+    response = query_function('getAllNodes', ['wonderland3'])
     return_value = json.loads(response)
     print("Return of 'getAllNodes':\n{}".format(json.dumps(return_value, indent=2)))
     status_code = int(return_value["__status_code"])
     assert 200 == status_code
-    assert node1_metadata['id'] == return_value['node_list'][0]['node_metadata']['id']
-    assert node1_metadata['name'] == return_value['node_list'][0]['node_metadata']['name']
-    assert node1_metadata['ip'] == return_value['node_list'][0]['node_metadata']['ip']
-    assert node1_metadata['port']['rpc'] == return_value['node_list'][0]['node_metadata']['port']['rpc']
-    assert node1_metadata['port']['p2p'] == return_value['node_list'][0]['node_metadata']['port']['p2p']
-    assert node1_metadata['port']['rest'] == return_value['node_list'][0]['node_metadata']['port']['rest']
-    assert node1_metadata['port']['profile'] == return_value['node_list'][0]['node_metadata']['port']['profile']
-    assert node2_metadata['id'] == return_value['node_list'][1]['node_metadata']['id']
-    assert node2_metadata['name'] == return_value['node_list'][1]['node_metadata']['name']
-    assert node2_metadata['ip'] == return_value['node_list'][1]['node_metadata']['ip']
-    assert node2_metadata['port']['rpc'] == return_value['node_list'][1]['node_metadata']['port']['rpc']
-    assert node2_metadata['port']['p2p'] == return_value['node_list'][1]['node_metadata']['port']['p2p']
-    assert node2_metadata['port']['rest'] == return_value['node_list'][1]['node_metadata']['port']['rest']
-    assert node2_metadata['port']['profile'] == return_value['node_list'][1]['node_metadata']['port']['profile']
+    assert 2 == len(return_value['node_list'])
+    assert_node_metadata(node2_metadata, return_value['node_list'][0])
+    assert_node_metadata(node1_metadata, return_value['node_list'][1])
 
 
 def test_delete_node(setup):
     print("test_delete_node:", hsc_address)
+    create_chain('wonderland4', 'wonderland', {"name": "wonderland"})
+    create_node('wonderland4', 'node1', 'red-queen', node_metadata("node1", "red-queen", "ogrima1", "machine1"))
+    create_node('wonderland4', 'node2', 'chashire-cat',
+                node_metadata("node2", "chashire-cat", "ogrima1", "machine2"))
 
-    response = call_function('deleteNode', ['wonderland1', 'node1'])
-    return_value = json.loads(response.detail)
+    response = call_function('deleteNode', ['wonderland4', 'node1'])
+    return_value = json.loads(response)
     print("Return of 'deleteNode':\n{}".format(json.dumps(return_value, indent=2)))
     status_code = int(return_value["__status_code"])
     assert 201 == status_code
 
-    response = query_function('getNode', ['wonderland1', 'node1'])
+    response = query_function('getNode', ['wonderland4', 'node1'])
     return_value = json.loads(response)
     print("Return of 'getNode':\n{}".format(json.dumps(return_value, indent=2)))
     status_code = int(return_value["__status_code"])
     assert 404 == status_code
 
-    response = query_function('getAllNodes', ['wonderland1'])
+    response = query_function('getAllNodes', ['wonderland4'])
     return_value = json.loads(response)
     print("Return of 'getAllNodes':\n{}".format(json.dumps(return_value, indent=2)))
     status_code = int(return_value["__status_code"])
     assert 200 == status_code
+    assert ['node2'] == [n['node_id'] for n in return_value['node_list']]
 
-    node2_metadata = {
-        "id": "node2",
-        "name": "chashire-cat",
-        "ip": "localhost",
-        "port": {
-            "rpc": 7845,
-            "p2p": 7846,
-            "rest": 8080,
-            "profile": 6060,
-        },
-    }
-    response = call_function('updateNode', ['wonderland1', 'node2', None, json.dumps(node2_metadata)])
-    return_value = json.loads(response.detail)
+    node2_metadata = node_metadata("node2", "chashire-cat", "ogrima1", "machine1")
+    response = call_function('updateNode', ['wonderland4', 'node2', None, json.dumps(node2_metadata)])
+    return_value = json.loads(response)
     print("Return of 'updateNode':\n{}".format(json.dumps(return_value, indent=2)))
     status_code = int(return_value["__status_code"])
     assert 201 == status_code
 
-    response = query_function('getNode', ['wonderland1', 'node2'])
+    response = query_function('getNode', ['wonderland4', 'node2'])
     return_value = json.loads(response)
     print("Return of 'getNode':\n{}".format(json.dumps(return_value, indent=2)))
     status_code = int(return_value["__status_code"])
     assert 200 == status_code
+    assert 'chashire-cat' == return_value['node_list'][0]['node_name']
 
-    response = query_function('getAllNodes', ['wonderland1'])
+    response = query_function('getAllNodes', ['wonderland4'])
     return_value = json.loads(response)
     print("Return of 'getAllNodes':\n{}".format(json.dumps(return_value, indent=2)))
     status_code = int(return_value["__status_code"])
     assert 200 == status_code
-    assert node2_metadata['id'] == return_value['node_list'][0]['node_metadata']['id']
-    assert node2_metadata['name'] == return_value['node_list'][0]['node_metadata']['name']
-    assert node2_metadata['ip'] == return_value['node_list'][0]['node_metadata']['ip']
-    assert node2_metadata['port']['rpc'] == return_value['node_list'][0]['node_metadata']['port']['rpc']
-    assert node2_metadata['port']['p2p'] == return_value['node_list'][0]['node_metadata']['port']['p2p']
-    assert node2_metadata['port']['rest'] == return_value['node_list'][0]['node_metadata']['port']['rest']
-    assert node2_metadata['port']['profile'] == return_value['node_list'][0]['node_metadata']['port']['profile']
+    assert_node_metadata(node2_metadata, return_value['node_list'][0])
 
 
 def test_delete_chain(setup):
     print("test_delete_chain:", hsc_address)
+    create_chain('wonderland5', 'wonderland', {"name": "wonderland"})
+    create_node('wonderland5', 'node2', 'chashire-cat',
+                node_metadata("node2", "chashire-cat", "ogrima1", "machine2"))
 
-    response = call_function('deleteChain', ['civil_war_#1'])
-    return_value = json.loads(response.detail)
-    print("Return of 'deleteChain':\n{}".format(json.dumps(return_value, indent=2)))
-    status_code = int(return_value["__status_code"])
-    assert 201 == status_code
-
-    response = call_function('deleteChain', ['wonderland1'])
-    return_value = json.loads(response.detail)
+    response = call_function('deleteChain', ['wonderland5'])
+    return_value = json.loads(response)
     print("Return of 'deleteChain':\n{}".format(json.dumps(return_value, indent=2)))
     status_code = int(return_value["__status_code"])
     assert 201 == status_code
 
-    response = query_function('getChain', ['wonderland1'])
+    response = query_function('getChain', ['wonderland5'])
     return_value = json.loads(response)
     print("Return of 'getChain':\n{}".format(json.dumps(return_value, indent=2)))
     status_code = int(return_value["__status_code"])
     assert 404 == status_code
 
-    response = query_function('getNode', ['wonderland1', 'node2'])
+    response = query_function('getNode', ['wonderland5', 'node2'])
     return_value = json.loads(response)
     print("Return of 'getNode':\n{}".format(json.dumps(return_value, indent=2)))
     status_code = int(return_value["__status_code"])
     assert 404 == status_code
 
-    response = query_function('getAllNodes', ['wonderland1'])
+    response = query_function('getAllNodes', ['wonderland5'])
     return_value = json.loads(response)
-    print("Return of 'getNode':\n{}".format(json.dumps(return_value, indent=2)))
+    print("Return of 'getAllNodes':\n{}".format(json.dumps(return_value, indent=2)))
+    status_code = int(return_value["__status_code"])
+    assert 404 == status_code
+
+    response = call_function('deleteChain', ['wonderland5'])
+    return_value = json.loads(response)
+    print("Return of 'deleteChain':\n{}".format(json.dumps(return_value, indent=2)))
     status_code = int(return_value["__status_code"])
     assert 404 == status_code
 
@@ -276,32 +265,32 @@ def test_create_chain_from_tribe(setup):
     chain_name = "Civil War"
     chain_id = "civil_war_#1"
     bp_cnt = 2
-    balance_list = [
+    coin_holders = [
         {
             "address": "Tony Stark's account address",
-            "balance": "500000000000000000000000000"
+            "amount": "500000000000000000000000000"
         },
         {
             "address": "Peter Parker's account address",
-            "balance": "50000000"
+            "amount": "50000000"
         },
         {
             "address": "Natasha Romanoff's account address",
-            "balance": "50000000000000000000"
+            "amount": "50000000000000000000"
         },
         {
             "address": "Bucky Barns's account address",
-            "balance": "50000000000000000000"
+            "amount": "50000000000000000000"
         },
         {
             "address": "T'Challa's account address",
-            "balance": "50000000000000000000000"
+            "amount": "50000000000000000000000"
         },
     ]
     chain_metadata = {
         "consensus_alg": "dpos",
         "bp_cnt": bp_cnt,
-        "balance_list": balance_list,
+        "coin_holders": coin_holders,
         "new_node_list": [
             {
                 "node_id": "captain_1",
@@ -310,17 +299,20 @@ def test_create_chain_from_tribe(setup):
                     "type": "team_captain",
                     "is_bp": True,
                     "server_id": "team_captain_steve_as_captain_1",
+                    "cluster": {"id": "team_captain"},
+                    "machine": {"id": "steve"},
                 }
             }
         ],
     }
     metadata_raw = json.dumps(chain_metadata)
     response = call_function('createChain', [chain_id, chain_name, True, metadata_raw])
-    return_value = json.loads(response.detail)
+    return_value = json.loads(response)
     print("Return of 'createChain':\n{}".format(json.dumps(return_value, indent=2)))
     status_code = int(return_value["__status_code"])
     assert 201 == status_code
 
+    # not enough BPs for the genesis yet
     response = query_function('getAllNodes', [chain_id])
     return_value = json.loads(response)
     print("Return of 'getAllNodes':\n{}".format(json.dumps(return_value, indent=2)))
@@ -334,7 +326,7 @@ def test_create_chain_from_tribe(setup):
     chain_metadata = {
         "consensus_alg": "dpos",
         "bp_cnt": bp_cnt,
-        "balance_list": balance_list,
+        "coin_holders": coin_holders,
         "new_node_list": [
             {
                 "node_id": "iron_1",
@@ -343,6 +335,8 @@ def test_create_chain_from_tribe(setup):
                     "type": "team_iron",
                     "is_bp": True,
                     "server_id": "team_iron_spiderman_as_iron_1",
+                    "cluster": {"id": "team_iron"},
+                    "machine": {"id": "spiderman"},
                 }
             },
             {
@@ -352,13 +346,15 @@ def test_create_chain_from_tribe(setup):
                     "type": "team_iron",
                     "is_bp": True,
                     "server_id": "team_iron_vision_as_iron_2",
+                    "cluster": {"id": "team_iron"},
+                    "machine": {"id": "vision"},
                 }
             },
         ],
     }
     metadata_raw = json.dumps(chain_metadata)
     response = call_function('createChain', [chain_id, chain_name, True, metadata_raw])
-    return_value = json.loads(response.detail)
+    return_value = json.loads(response)
     print("Return of 'createChain':\n{}".format(json.dumps(return_value, indent=2)))
     status_code = int(return_value["__status_code"])
     assert 201 == status_code
@@ -368,9 +364,11 @@ def test_create_chain_from_tribe(setup):
     print("Return of 'getAllNodes':\n{}".format(json.dumps(return_value, indent=2)))
     status_code = int(return_value["__status_code"])
     assert 200 == status_code
+    assert 3 == len(return_value['node_list'])
     assert chain_metadata['bp_cnt'] == return_value['chain_metadata']['bp_cnt']
     assert chain_metadata['consensus_alg'] == return_value['chain_metadata']['consensus_alg']
     assert 'new_node_list' not in return_value['chain_metadata']
     assert 'genesis_json' in return_value['chain_metadata']
-    assert bp_cnt == len(return_value['chain_metadata']['genesis_json']['bps'])
-
+    genesis_json = return_value['chain_metadata']['genesis_json']
+    assert bp_cnt == len(genesis_json['bps'])
+    assert {h['address']: h['amount'] for h in coin_holders} == genesis_json['balance']
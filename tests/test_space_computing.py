@@ -2,36 +2,73 @@ import pytest
 
 import json
 
-import hsc_compile
+import hsc_client
 import hsc_deploy
 
 aergo = None
 hsc_address = None
 
 def call_function(func_name, args):
-    return hsc_deploy.call_sc(aergo, hsc_address, 'callFunction',
-                              ['__HSC_SPACE_COMPUTING__', func_name] + args)
+    # the response is emitted as the "HSC" event
+    result = hsc_deploy.call_sc(aergo, hsc_address, 'callFunction',
+                                ['__HSC_SPACE_COMPUTING__', func_name] + args)
+    return hsc_client.get_tx_response(result)
 
 def query_function(func_name, args):
-    return hsc_deploy.query_sc(aergo, hsc_address, 'callFunction',
+    return hsc_deploy.query_sc(aergo, hsc_address, 'queryFunction',
                                ['__HSC_SPACE_COMPUTING__', func_name] + args)
 
 @pytest.fixture(scope='session')
-def setup():
-    hsc_compile.QUIET_MODE = False
-    hsc_compile.hsc_compile()
-
-    hsc_deploy.QUIET_MODE = False
+def setup(standin):
     global aergo
-    aergo = hsc_deploy.check_aergo_conn_info(target=hsc_deploy.AERGO_TARGET,
-                                             private_key=hsc_deploy.AERGO_PRIVATE_KEY)
+    aergo = standin.aergo
     global hsc_address
-    hsc_address = hsc_deploy.hsc_deploy(aergo=aergo,
-                                        compiled_payload_file_path=hsc_deploy.HSC_COMPILED_PAYLOAD_DATA_FILE,
-                                        deployed_payload_file_path=hsc_deploy.HSC_DEPLOYED_PAYLOAD_DATA_FILE)
+    hsc_address = standin.hsc_address
     print('HSC Address:', hsc_address)
 
 
+# every test adds its own cluster, so the tests don't depend on each other
+
+def add_cluster(cluster_id, cluster_name, metadata):
+    response = call_function('addCluster', [cluster_id, cluster_name, True, json.dumps(metadata)])
+    return_value = json.loads(response)
+    print("Return of 'addCluster':\n{}".format(json.dumps(return_value, indent=2)))
+    status_code = int(return_value["__status_code"])
+    assert 201 == status_code
+
+
+def add_machine(cluster_id, machine_id, machine_name, metadata):
+    response = call_function('addMachine', [cluster_id, machine_id, machine_name, json.dumps(metadata)])
+    return_value = json.loads(response)
+    print("Return of 'addMachine':\n{}".format(json.dumps(return_value, indent=2)))
+    status_code = int(return_value["__status_code"])
+    assert 201 == status_code
+
+
+def machine_metadata(machine_id, name, ip):
+    return {
+        "id": machine_id,
+        "name": name,
+        "ip": ip,
+        "port": {
+            "rpc": 7845,
+            "p2p": 7846,
+            "rest": 8080,
+            "profile": 6060,
+        },
+    }
+
+
+def assert_machine_metadata(metadata, machine):
+    assert metadata['id'] == machine['machine_metadata']['id']
+    assert metadata['name'] == machine['machine_metadata']['name']
+    assert metadata['ip'] == machine['machine_metadata']['ip']
+    assert metadata['port']['rpc'] == machine['machine_metadata']['port']['rpc']
+    assert metadata['port']['p2p'] == machine['machine_metadata']['port']['p2p']
+    assert metadata['port']['rest'] == machine['machine_metadata']['port']['rest']
+    assert metadata['port']['profile'] == machine['machine_metadata']['port']['profile']
+
+
 def test_add_horde(setup):
     print("test_add_horde:", hsc_address)
     metadata = {
@@ -39,11 +76,7 @@ def test_add_horde(setup):
         "who create it?": "YP",
         "what for?": "just for HSC test",
     }
-    response = call_function('addCluster', ['ogrima1', 'Ogrima', True, json.dumps(metadata)])
-    return_value = json.loads(response.detail)
-    print("Return of 'addCluster':\n{}".format(json.dumps(return_value, indent=2)))
-    status_code = int(return_value["__status_code"])
-    assert 201 == status_code
+    add_cluster('ogrima1', 'Ogrima', metadata)
 
     response = query_function('getCluster', ['ogrima1'])
     return_value = json.loads(response)
@@ -57,6 +90,8 @@ def test_add_horde(setup):
 
 def test_update_horde(setup):
     print("test_update_horde:", hsc_address)
+    add_cluster('ogrima2', 'Ogrima', {"name": "Ogrima"})
+
     metadata = {
         "I will register Machines below": [
             "bbabam",
@@ -64,175 +99,114 @@ def test_update_horde(setup):
         ],
     }
     metadata_raw = json.dumps(metadata)
-    response = call_function('updateCluster', ['ogrima1', 'Thunder Bluff', True, metadata_raw])
-    return_value = json.loads(response.detail)
+    response = call_function('updateCluster', ['ogrima2', 'Thunder Bluff', True, metadata_raw])
+    return_value = json.loads(response)
     print("Return of 'updateCluster':\n{}".format(json.dumps(return_value, indent=2)))
     status_code = int(return_value["__status_code"])
     assert 201 == status_code
 
-    response = query_function('getCluster', ['ogrima1'])
+    response = query_function('getCluster', ['ogrima2'])
     return_value = json.loads(response)
     print("Return of 'getCluster':\n{}".format(json.dumps(return_value, indent=2)))
     status_code = int(return_value["__status_code"])
     assert 200 == status_code
+    assert 'Thunder Bluff' == return_value['cluster_name']
     assert metadata['I will register Machines below'][0] == return_value['cluster_metadata']['I will register Machines below'][0]
     assert metadata['I will register Machines below'][1] == return_value['cluster_metadata']['I will register Machines below'][1]
 
 
 def test_create_machine(setup):
     print("test_create_machine:", hsc_address)
+    add_cluster('ogrima3', 'Ogrima', {"name": "Ogrima"})
 
-    machine1_metadata = {
-        "id": "machine1",
-        "name": "bbabam",
-        "ip": "localhost",
-        "port": {
-            "rpc": 7845,
-            "p2p": 7846,
-            "rest": 8080,
-            "profile": 6060,
-        },
-    }
-    machine1_metadata_raw = json.dumps(machine1_metadata)
-    response = call_function('addMachine', ['ogrima1', 'machine1', 'bbabam', machine1_metadata_raw])
-    return_value = json.loads(response.detail)
-    print("Return of 'addMachine':\n{}".format(json.dumps(return_value, indent=2)))
-    status_code = int(return_value["__status_code"])
-    assert 201 == status_code
+    machine1_metadata = machine_metadata("machine1", "bbabam", "localhost")
+    add_machine('ogrima3', 'machine1', 'bbabam', machine1_metadata)
 
-    response = query_function('getMachine', ['ogrima1', 'machine1'])
+    response = query_function('getMachine', ['ogrima3', 'machine1'])
     return_value = json.loads(response)
     print("Return of 'getMachine':\n{}".format(json.dumps(return_value, indent=2)))
     status_code = int(return_value["__status_code"])
     assert 200 == status_code
-    assert machine1_metadata['id'] == return_value['machine_list'][0]['machine_metadata']['id']
-    assert machine1_metadata['name'] == return_value['machine_list'][0]['machine_metadata']['name']
-    assert machine1_metadata['ip'] == return_value['machine_list'][0]['machine_metadata']['ip']
-    assert machine1_metadata['port']['rpc'] == return_value['machine_list'][0]['machine_metadata']['port']['rpc']
-    assert machine1_metadata['port']['p2p'] == return_value['machine_list'][0]['machine_metadata']['port']['p2p']
-    assert machine1_metadata['port']['rest'] == return_value['machine_list'][0]['machine_metadata']['port']['rest']
-    assert machine1_metadata['port']['profile'] == return_value['machine_list'][0]['machine_metadata']['port']['profile']
-
-    machine2_metadata = {
-        "id": "machine2",
-        "name": "zzazan",
-        "ip": "127.0.0.1",
-        "port": {
-            "rpc": 7845,
-            "p2p": 7846,
-            "rest": 8080,
-            "profile": 6060,
-        },
-    }
-    machine2_metadata_raw = json.dumps(machine2_metadata)
-    response = call_function('addMachine', ['ogrima1', 'machine2', 'zzazan', machine2_metadata_raw])
-    return_value = json.loads(response.detail)
-    print("Return of 'addMachine':\n{}".format(json.dumps(return_value, indent=2)))
-    status_code = int(return_value["__status_code"])
-    assert 201 == status_code
+    assert_machine_metadata(machine1_metadata, return_value['machine_list'][0])
+
+    machine2_metadata = machine_metadata("machine2", "zzazan", "127.0.0.1")
+    add_machine('ogrima3', 'machine2', 'zzazan', machine2_metadata)
 
-    response = query_function('getMachine', ['ogrima1', 'machine2'])
+    response = query_function('getMachine', ['ogrima3', 'machine2'])
     return_value = json.loads(response)
     print("Return of 'getMachine':\n{}".format(json.dumps(return_value, indent=2)))
     status_code = int(return_value["__status_code"])
     assert 200 == status_code
-    assert machine2_metadata['id'] == return_value['machine_list'][0]['machine_metadata']['id']
-    assert machine2_metadata['name'] == return_value['machine_list'][0]['machine_metadata']['name']
-    assert machine2_metadata['ip'] == return_value['machine_list'][0]['machine_metadata']['ip']
-    assert machine2_metadata['port']['rpc'] == return_value['machine_list'][0]['machine_metadata']['port']['rpc']
-    assert machine2_metadata['port']['p2p'] == return_value['machine_list'][0]['machine_metadata']['port']['p2p']
-    assert machine2_metadata['port']['rest'] == return_value['machine_list'][0]['machine_metadata']['port']['rest']
-    assert machine2_metadata['port']['profile'] == return_value['machine_list'][0]['machine_metadata']['port']['profile']
+    assert_machine_metadata(machine2_metadata, return_value['machine_list'][0])
 
-    response = query_function('getAllMachines', ['ogrima1'])
+    # getAllMachines lists the newest machine first
+    response = query_function('getAllMachines', ['ogrima3'])
     return_value = json.loads(response)
     print("Return of 'getAllMachines':\n{}".format(json.dumps(return_value, indent=2)))
     status_code = int(return_value["__status_code"])
     assert 200 == status_code
-    assert machine1_metadata['id'] == return_value['machine_list'][0]['machine_metadata']['id']
-    assert machine1_metadata['name'] == return_value['machine_list'][0]['machine_metadata']['name']
-    assert machine1_metadata['ip'] == return_value['machine_list'][0]['machine_metadata']['ip']
-    assert machine1_metadata['port']['rpc'] == return_value['machine_list'][0]['machine_metadata']['port']['rpc']
-    assert machine1_metadata['port']['p2p'] == return_value['machine_list'][0]['machine_metadata']['port']['p2p']
-    assert machine1_metadata['port']['rest'] == return_value['machine_list'][0]['machine_metadata']['port']['rest']
-    assert machine1_metadata['port']['profile'] == return_value['machine_list'][0]['machine_metadata']['port']['profile']
-    assert machine2_metadata['id'] == return_value['machine_list'][1]['machine_metadata']['id']
-    assert machine2_metadata['name'] == return_value['machine_list'][1]['machine_metadata']['name']
-    assert machine2_metadata['ip'] == return_value['machine_list'][1]['machine_metadata']['ip']
-    assert machine2_metadata['port']['rpc'] == return_value['machine_list'][1]['machine_metadata']['port']['rpc']
-    assert machine2_metadata['port']['p2p'] == return_value['machine_list'][1]['machine_metadata']['port']['p2p']
-    assert machine2_metadata['port']['rest'] == return_value['machine_list'][1]['machine_metadata']['port']['rest']
-    assert machine2_metadata['port']['profile'] == return_value['machine_list'][1]['machine_metadata']['port']['profile']
+    assert 2 == len(return_value['machine_list'])
+    assert_machine_metadata(machine2_metadata, return_value['machine_list'][0])
+    assert_machine_metadata(machine1_metadata, return_value['machine_list'][1])
 
 
 def test_drop_machine(setup):
     print("test_drop_machine:", hsc_address)
+    add_cluster('ogrima4', 'Ogrima', {"name": "Ogrima"})
+    add_machine('ogrima4', 'machine1', 'bbabam', machine_metadata("machine1", "bbabam", "localhost"))
+    add_machine('ogrima4', 'machine2', 'zzazan', machine_metadata("machine2", "zzazan", "127.0.0.1"))
 
-    response = call_function('dropMachine', ['ogrima1', 'machine1'])
-    return_value = json.loads(response.detail)
+    response = call_function('dropMachine', ['ogrima4', 'machine1'])
+    return_value = json.loads(response)
     print("Return of 'dropMachine':\n{}".format(json.dumps(return_value, indent=2)))
     status_code = int(return_value["__status_code"])
     assert 201 == status_code
 
-    response = query_function('getMachine', ['ogrima1', 'machine1'])
+    response = query_function('getMachine', ['ogrima4', 'machine1'])
     return_value = json.loads(response)
     print("Return of 'getMachine':\n{}".format(json.dumps(return_value, indent=2)))
     status_code = int(return_value["__status_code"])
     assert 404 == status_code
 
-    response = query_function('getAllMachines', ['ogrima1'])
+    response = query_function('getAllMachines', ['ogrima4'])
     return_value = json.loads(response)
     print("Return of 'getAllMachines':\n{}".format(json.dumps(return_value, indent=2)))
     status_code = int(return_value["__status_code"])
     assert 200 == status_code
+    assert ['machine2'] == [m['machine_id'] for m in return_value['machine_list']]
 
-    machine2_metadata = {
-        "id": "machine2",
-        "name": "no-zzazan",
-        "ip": "localhost",
-        "port": {
-            "rpc": 7845,
-            "p2p": 7846,
-            "rest": 8080,
-            "profile": 6060,
-        },
-    }
-    response = call_function('updateMachine', ['ogrima1', 'machine2', None, json.dumps(machine2_metadata)])
-    return_value = json.loads(response.detail)
+    machine2_metadata = machine_metadata("machine2", "no-zzazan", "localhost")
+    response = call_function('updateMachine', ['ogrima4', 'machine2', None, json.dumps(machine2_metadata)])
+    return_value = json.loads(response)
     print("Return of 'updateMachine':\n{}".format(json.dumps(return_value, indent=2)))
     status_code = int(return_value["__status_code"])
     assert 201 == status_code
 
-    response = query_function('getMachine', ['ogrima1', 'machine2'])
+    response = query_function('getMachine', ['ogrima4', 'machine2'])
     return_value = json.loads(response)
     print("Return of 'getMachine':\n{}".format(json.dumps(return_value, indent=2)))
     status_code = int(return_value["__status_code"])
     assert 200 == status_code
 
-    response = query_function('getAllMachines', ['ogrima1'])
+    response = query_function('getAllMachines', ['ogrima4'])
     return_value = json.loads(response)
     print("Return of 'getAllMachines':\n{}".format(json.dumps(return_value, indent=2)))
     status_code = int(return_value["__status_code"])
     assert 200 == status_code
-    assert machine2_metadata['id'] == return_value['machine_list'][0]['machine_metadata']['id']
-    assert machine2_metadata['name'] == return_value['machine_list'][0]['machine_metadata']['name']
-    assert machine2_metadata['ip'] == return_value['machine_list'][0]['machine_metadata']['ip']
-    assert machine2_metadata['port']['rpc'] == return_value['machine_list'][0]['machine_metadata']['port']['rpc']
-    assert machine2_metadata['port']['p2p'] == return_value['machine_list'][0]['machine_metadata']['port']['p2p']
-    assert machine2_metadata['port']['rest'] == return_value['machine_list'][0]['machine_metadata']['port']['rest']
-    assert machine2_metadata['port']['profile'] == return_value['machine_list'][0]['machine_metadata']['port']['profile']
+    assert_machine_metadata(machine2_metadata, return_value['machine_list'][0])
 
 
 def test_drop_horde(setup):
-    print("test_drop_pond:", hsc_address)
+    print("test_drop_horde:", hsc_address)
+    add_cluster('ogrima5', 'Ogrima', {"name": "Ogrima"})
 
-    response = call_function('dropCluster', ['ogrima1'])
-    return_value = json.loads(response.detail)
+    response = call_function('dropCluster', ['ogrima5'])
+    return_value = json.loads(response)
     print("Return of 'dropCluster':\n{}".format(json.dumps(return_value, indent=2)))
     status_code = int(return_value["__status_code"])
     assert 201 == status_code
 
-    response = query_function('getCluster', ['ogrima1'])
+    response = query_function('getCluster', ['ogrima5'])
     return_value = json.loads(response)
     print("Return of 'getCluster':\n{}".format(json.dumps(return_value, indent=2)))
     status_code = int(return_value["__status_code"])
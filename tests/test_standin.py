@@ -0,0 +1,387 @@
+import pytest
+
+import json
+import os
+import sqlite3
+from types import SimpleNamespace
+
+import aergo.herapy as herapy
+import hsc_deploy
+
+hsc_standin = pytest.importorskip('hsc_standin')
+
+COUNTER = """
+state.var {
+  _COUNT = state.value(),
+}
+
+function constructor(init)
+  _COUNT:set(init)
+  db.exec("CREATE TABLE logs(n INTEGER, note TEXT)")
+end
+
+function inc(fail)
+  local n = _COUNT:get() + 1
+  _COUNT:set(n)
+  db.prepare("INSERT INTO logs(n, note) VALUES (?, ?)"):exec(n, nil)
+  contract.event("INC", n)
+  assert(not fail, "failed on purpose")
+  return n
+end
+
+function get()
+  local rs = db.prepare("SELECT count(*), max(n) FROM logs"):query()
+  rs:next()
+  local rows, max_n = rs:get()
+  return {count = _COUNT:get(), rows = rows}
+end
+
+abi.register(inc)
+abi.register_view(get)
+"""
+
+
+def call(hsc, module, func_name, *args, aergo=None):
+    """
+    Call a module function of HSC ('hsc' has 'aergo' and 'hsc_address') by
+    'aergo' or the account of 'hsc'.
+    :return: the response in the "HSC" event
+    """
+    result = hsc_deploy.call_sc(aergo or hsc.aergo, hsc.hsc_address, 'callFunction',
+                                [module, func_name] + list(args))
+    return json.loads(result.event_list[-1].arguments[2])
+
+
+def query(hsc, module, func_name, *args):
+    return json.loads(hsc_deploy.query_sc(hsc.aergo, hsc.hsc_address, 'queryFunction',
+                                          [module, func_name] + list(args)))
+
+
+def deploy_hsc(work_dir, profile=None):
+    node = hsc_standin.StandinNode()
+    aergo, hsc_address = hsc_standin.deploy_hsc(node, str(work_dir), profile=profile)
+    return SimpleNamespace(node=node, aergo=aergo, hsc_address=hsc_address)
+
+
+def get_db(hsc):
+    # the SQLite database of the DB module
+    db_address = json.loads(hsc.node.contracts[hsc.hsc_address].storage['map:_MODULE_ADDRESS:__MANIFEST_DB__'])
+    return hsc.node.contracts[db_address].db
+
+
+@pytest.fixture
+def counter():
+    node = hsc_standin.StandinNode()
+    aergo = node.new_aergo()
+    aergo.new_account()
+    payload = hsc_standin.STANDIN_PAYLOAD_PREFIX + COUNTER.encode().hex()
+    address = hsc_deploy.deploy_sc(aergo, payload, 10)
+    return node, aergo, address
+
+
+def test_call_and_query(counter):
+    node, aergo, address = counter
+    result = hsc_deploy.call_sc(aergo, address, 'inc', [False])
+    assert '11' == result.detail
+    assert 2 == result.block_no == node.height
+    assert [11] == result.event_list[0].arguments
+    assert 0 < result.gas_used
+
+    assert {'count': 11, 'rows': 1} == json.loads(aergo.query_sc(address, 'get'))
+
+
+def test_failed_tx_is_rolled_back(counter):
+    node, aergo, address = counter
+    with pytest.raises(RuntimeError) as e:
+        hsc_deploy.call_sc(aergo, address, 'inc', [True])
+    assert 'failed on purpose' in str(e.value)
+    assert {'count': 10, 'rows': 0} == json.loads(aergo.query_sc(address, 'get'))
+    assert [] == aergo.get_events(address, 'INC')
+
+    # a query doesn't change the state
+    aergo.query_sc(address, 'inc', [False])
+    assert {'count': 10, 'rows': 0} == json.loads(aergo.query_sc(address, 'get'))
+
+
+def test_nonce(counter):
+    node, aergo, address = counter
+    other = node.new_aergo()
+    other.import_account(aergo.export_account(), 'password', skip_state=True)
+    tx, result = other.call_sc(address, 'inc', args=[False])
+    assert herapy.CommitStatus.TX_NONCE_TOO_LOW == result.status
+
+    other.get_account()
+    tx, result = other.call_sc(address, 'inc', args=[False])
+    assert herapy.CommitStatus.TX_OK == result.status
+
+
+def test_deployed_hsc(standin):
+    version = hsc_deploy.query_sc(standin.aergo, standin.hsc_address, 'getVersion')
+    assert version.startswith(b'"v')
+
+
+def test_redeployed_module_address(tmp_path):
+    hsc = deploy_hsc(tmp_path)
+    with open(str(tmp_path / 'hsc.deployed.payload.dat')) as f:
+        deployed_info = json.load(f)
+    command_address = deployed_info['hsc_command.lua']['address']
+    old_user_address = deployed_info['hsc_user.lua']['address']
+
+    def cached_user_address():
+        return json.loads(hsc.node.contracts[command_address].storage['map:_MODULE_ADDRESS:__HSC_USER__'])
+
+    # a module caches the addresses of the others, and calls them directly
+    assert old_user_address == cached_user_address()
+
+    # the Manifest updates the cache when a module is registered again
+    with open(os.path.join(os.path.dirname(__file__), '..', 'sc', 'hsc_user.lua')) as f:
+        payload = hsc_standin.STANDIN_PAYLOAD_PREFIX + f.read().encode().hex()
+    user_address = hsc_deploy.deploy_sc(hsc.aergo, payload, hsc.hsc_address)
+    assert user_address != old_user_address
+    assert user_address == cached_user_address()
+
+    address = str(hsc.aergo.account.address)
+    assert '201' == call(hsc, '__HSC_USER__', 'createUser', 'user', address, '{}')['__status_code']
+    assert '201' == call(hsc, '__HSC_COMMAND__', 'addCommand', 'cmd', '{}', '[]')['__status_code']
+
+    # the user module forgets the old address of a module registered again
+    with open(os.path.join(os.path.dirname(__file__), '..', 'sc', 'hsc_command.lua')) as f:
+        payload = hsc_standin.STANDIN_PAYLOAD_PREFIX + f.read().encode().hex()
+    new_command_address = hsc_deploy.deploy_sc(hsc.aergo, payload, hsc.hsc_address)
+    user_storage = hsc.node.contracts[user_address].storage
+    assert 'map:_MODULE_NAME:' + command_address not in user_storage
+    assert '"__HSC_COMMAND__"' == user_storage['map:_MODULE_NAME:' + new_command_address]
+
+
+def test_batch_insert(standin):
+    metadata = {'cluster': {'id': 'batch-cluster'}, 'machine': {'id': 'batch-machine'}}
+    new_node_list = [{'node_id': 'batch-node{}'.format(i), 'node_name': 'batch-node{}'.format(i),
+                      'node_metadata': metadata} for i in range(3)]
+    res = call(standin, '__HSC_SPACE_BLOCKCHAIN__', 'createChain', 'batch-chain', 'batch-chain', False,
+               json.dumps({'new_node_list': new_node_list}))
+    assert '201' == res['__status_code']
+
+    node_list = query(standin, '__HSC_SPACE_BLOCKCHAIN__', 'getAllNodes', 'batch-chain')['node_list']
+    assert ['batch-node0', 'batch-node1', 'batch-node2'] == sorted(n['node_id'] for n in node_list)
+
+
+def test_release_profile(tmp_path):
+    def create_user(profile):
+        (tmp_path / profile).mkdir()
+        hsc = deploy_hsc(tmp_path / profile, profile=profile)
+        with open(str(tmp_path / profile / 'hsc.deployed.payload.dat')) as f:
+            assert profile == json.load(f)['hsc_profile']
+        result = hsc_deploy.call_sc(hsc.aergo, hsc.hsc_address, 'callFunction',
+                                    ['__HSC_USER__', 'createUser', 'user', str(hsc.aergo.account.address), '{}'])
+        assert '201' == json.loads(result.event_list[-1].arguments[2])['__status_code']
+        return result.gas_used
+
+    # the release profile doesn't spend gas for logs
+    assert create_user('release') < create_user('debug')
+
+
+def test_schema_migrations(standin):
+    # hsc_deploy applied every migration
+    for module in ['__HSC_USER__', '__HSC_COMMAND__', '__HSC_SPACE_COMPUTING__', '__HSC_SPACE_BLOCKCHAIN__']:
+        res = json.loads(hsc_deploy.query_sc(standin.aergo, standin.hsc_address, 'getSchemaVersion', [module]))
+        assert 0 < res['latest_schema_version'] == res['schema_version']
+
+    indexes = [r[0] for r in get_db(standin).execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'command_targets'")]
+    assert 'command_targets_target' in indexes
+
+    # a migration is applied only once
+    result = hsc_deploy.call_sc(standin.aergo, standin.hsc_address, 'migrateSchema', ['__HSC_COMMAND__'])
+    res = json.loads(result.detail)
+    assert res['old_schema_version'] == res['schema_version']
+
+    # only the creator migrates a schema
+    other = standin.node.new_aergo()
+    other.new_account()
+    with pytest.raises(RuntimeError, match='only the creator'):
+        hsc_deploy.call_sc(other, standin.hsc_address, 'migrateSchema', ['__HSC_COMMAND__'])
+    with pytest.raises(RuntimeError):
+        hsc_deploy.call_sc(other, standin.hsc_address, 'callFunction', ['__HSC_COMMAND__', 'migrate'])
+
+
+def test_get_owners(standin):
+    address = str(standin.aergo.account.address)
+    call(standin, '__HSC_SPACE_COMPUTING__', 'addCluster', 'owner-cluster', 'owner-cluster', True, '{}')
+    for machine_id in ['owner-machine0', 'owner-machine1']:
+        call(standin, '__HSC_SPACE_COMPUTING__', 'addMachine', 'owner-cluster', machine_id, machine_id, '{}')
+
+    # the Lua table of targets is passed through a module, as addCommand does
+    res = query(standin, '__HSC_SPACE_COMPUTING__', 'getOwners',
+                [{'cluster_id': 'owner-cluster', 'machine_id': 'owner-machine1'},
+                 {'cluster_id': 'owner-cluster'},
+                 {'cluster_id': 'owner-cluster', 'machine_id': 'owner-machine0'}])
+    assert '200' == res['__status_code']
+    assert ['owner-machine1', None, 'owner-machine0'] == [o.get('machine_id') for o in res['owner_list']]
+    assert all(address == o['cluster_owner'] and o['cluster_is_public'] for o in res['owner_list'])
+    assert address == res['owner_list'][0]['machine_owner']
+    assert 'machine_owner' not in res['owner_list'][1]
+
+    res = query(standin, '__HSC_SPACE_COMPUTING__', 'getOwners',
+                [{'cluster_id': 'owner-cluster', 'machine_id': 'owner-machine2'}])
+    assert '404' == res['__status_code']
+    assert 'owner-machine2' == res['machine_id']
+
+
+def test_clusters_with_machines(standin):
+    for i in range(3):
+        cluster_id = 'list-cluster{}'.format(i)
+        call(standin, '__HSC_SPACE_COMPUTING__', 'addCluster', cluster_id, cluster_id, i < 2, '{}')
+        for j in range(i):
+            machine_id = 'list-machine{}'.format(j)
+            call(standin, '__HSC_SPACE_COMPUTING__', 'addMachine', cluster_id, machine_id, machine_id, '{}')
+
+    address = str(standin.aergo.account.address)
+    for func_name, args in [('getPublicClusters', [None, None]), ('getAllClusters', [address])]:
+        cluster_list = [c for c in query(standin, '__HSC_SPACE_COMPUTING__', func_name, *args)['cluster_list']
+                        if c['cluster_id'].startswith('list-cluster')]
+        assert 3 - (func_name == 'getPublicClusters') == len(cluster_list)
+
+        # the machines are the same as getAllMachines of each cluster
+        for c in cluster_list:
+            res = query(standin, '__HSC_SPACE_COMPUTING__', 'getAllMachines', c['cluster_id'])
+            assert (res.get('machine_list') or []) == (c['machine_list'] or [])
+
+        # without machines
+        cluster_list = query(standin, '__HSC_SPACE_COMPUTING__', func_name, *(args + [False]))['cluster_list']
+        assert all('machine_list' not in c for c in cluster_list)
+
+    # the paging arguments come first, as before machines were listed
+    res = query(standin, '__HSC_SPACE_COMPUTING__', 'getPublicClusters', 1)
+    assert 1 == len(res['cluster_list']) and res['next_cursor'] is not None
+    assert 'machine_list' in res['cluster_list'][0]
+
+
+def test_visible_chains(tmp_path):
+    hsc = deploy_hsc(tmp_path)
+    machine = hsc.node.new_aergo()
+    machine.new_account()
+    other = hsc.node.new_aergo()
+    other.new_account()
+    creator = str(hsc.aergo.account.address)
+
+    # a chain of the creator, and a chain of a machine the creator owns
+    call(hsc, '__HSC_SPACE_BLOCKCHAIN__', 'createChain', 'own-chain', 'own-chain', False, '{}')
+    call(hsc, '__HSC_SPACE_COMPUTING__', 'addCluster', 'own-cluster', 'own-cluster', False, '{}')
+    call(hsc, '__HSC_SPACE_COMPUTING__', 'addMachine', 'own-cluster', str(machine.account.address),
+         'own-machine', '{}')
+    call(hsc, '__HSC_SPACE_BLOCKCHAIN__', 'createChain', 'machine-chain', 'machine-chain', False, '{}',
+         aergo=machine)
+    metadata = {'cluster': {'id': 'own-cluster'}, 'machine': {'id': str(machine.account.address)}}
+    call(hsc, '__HSC_SPACE_BLOCKCHAIN__', 'createNode', 'own-chain', 'own-node', 'own-node', json.dumps(metadata))
+
+    db = get_db(hsc)
+
+    def get_all_chains():
+        steps = []
+        db.set_progress_handler(lambda: steps.append(1) and 0, 1)
+        try:
+            res = query(hsc, '__HSC_SPACE_BLOCKCHAIN__', 'getAllChains', creator)
+        finally:
+            db.set_progress_handler(None, 1)
+        return res['chain_list'], len(steps)
+
+    def grow_others(first, last):
+        for i in range(first, last):
+            cluster_id = 'other-cluster{}'.format(i)
+            call(hsc, '__HSC_SPACE_COMPUTING__', 'addCluster', cluster_id, cluster_id, False, '{}', aergo=other)
+            for j in range(3):
+                call(hsc, '__HSC_SPACE_COMPUTING__', 'addMachine', cluster_id, '{}-{}'.format(cluster_id, j),
+                     'other-machine', '{}', aergo=other)
+            call(hsc, '__HSC_SPACE_BLOCKCHAIN__', 'createChain', 'other-chain{}'.format(i), 'other', False, '{}',
+                 aergo=other)
+
+    grow_others(0, 5)
+    chain_list, steps = get_all_chains()
+    assert ['machine-chain', 'own-chain'] == [c['chain_id'] for c in chain_list]
+    assert ['own-node'] == [n['node_id'] for n in chain_list[1]['node_list']]
+    assert str(machine.account.address) == chain_list[0]['chain_creator']
+
+    # the cost follows the creator's own rows, not the size of the tables
+    grow_others(5, 20)
+    chain_list, more_steps = get_all_chains()
+    assert 2 == len(chain_list)
+    assert steps == more_steps
+
+
+def test_empty_machine_id(tmp_path):
+    hsc = deploy_hsc(tmp_path)
+    address = str(hsc.aergo.account.address)
+    call(hsc, '__HSC_USER__', 'createUser', 'user', address, '{}')
+    call(hsc, '__HSC_SPACE_COMPUTING__', 'addCluster', 'c1', 'c1', False, '{}')
+
+    # an empty machine_id is kept as it is, so the target can be updated by it
+    res = call(hsc, '__HSC_COMMAND__', 'addCommand', 'cmd', '{}',
+               json.dumps([{'target_index': 0, 'cluster_id': 'c1', 'machine_id': ''},
+                           {'target_index': 1, 'cluster_id': 'c1'}]))
+    assert '201' == res['__status_code']
+    cmd_id = res['cmd_id']
+    assert '201' == call(hsc, '__HSC_COMMAND__', 'updateTarget', cmd_id, 'c1', '', 0, 'DONE')['__status_code']
+
+    rows = get_db(hsc).execute('SELECT machine_id, status FROM command_targets WHERE cmd_id = ? ORDER BY target_index',
+                               (cmd_id,)).fetchall()
+    assert [('', 'DONE'), (None, 'INIT')] == rows
+
+
+def test_get_owners_of_many_targets(tmp_path):
+    hsc = deploy_hsc(tmp_path)
+    call(hsc, '__HSC_SPACE_COMPUTING__', 'addCluster', 'many-cluster', 'many-cluster', False, '{}')
+    machine_ids = ['many-machine{}'.format(i) for i in range(1200)]
+    for machine_id in machine_ids:
+        call(hsc, '__HSC_SPACE_COMPUTING__', 'addMachine', 'many-cluster', machine_id, machine_id, '{}')
+
+    # as a real node, bind at most 999 arguments in a statement
+    get_db(hsc).setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 999)
+    res = query(hsc, '__HSC_SPACE_COMPUTING__', 'getOwners',
+                [{'cluster_id': 'many-cluster', 'machine_id': machine_id} for machine_id in machine_ids])
+    assert '200' == res['__status_code']
+    assert machine_ids == [o['machine_id'] for o in res['owner_list']]
+    assert all(str(hsc.aergo.account.address) == o['machine_owner'] for o in res['owner_list'])
+
+
+def test_commands_since_plan(standin):
+    db = get_db(standin)
+    for machine_id in [None, 'plan-machine']:
+        sql_list = []
+        db.set_trace_callback(sql_list.append)
+        try:
+            query(standin, '__HSC_COMMAND__', 'getCommandsOfTargetSince', 'plan-cluster', machine_id, 5)
+        finally:
+            db.set_trace_callback(None)
+        sql = [s for s in sql_list if 'command_targets' in s][-1]
+
+        # every branch of the target filter seeks the watermark in an index
+        plan = [r[3] for r in db.execute('EXPLAIN QUERY PLAN ' + sql) if 'command_targets' in r[3]]
+        assert plan and all('status_block_no>?' in p for p in plan), plan
+
+
+def test_get_owners_plan(standin):
+    db = get_db(standin)
+    sql_list = []
+    db.set_trace_callback(sql_list.append)
+    try:
+        query(standin, '__HSC_SPACE_COMPUTING__', 'getOwners',
+              [{'cluster_id': 'plan-cluster', 'machine_id': 'plan-machine'}])
+    finally:
+        db.set_trace_callback(None)
+    assert not [s for s in sql_list if 'FROM machines' in s]
+
+    call(standin, '__HSC_SPACE_COMPUTING__', 'addCluster', 'plan-cluster', 'plan-cluster', False, '{}')
+    call(standin, '__HSC_SPACE_COMPUTING__', 'addMachine', 'plan-cluster', 'plan-machine', 'plan-machine', '{}')
+    db.set_trace_callback(sql_list.append)
+    try:
+        res = query(standin, '__HSC_SPACE_COMPUTING__', 'getOwners',
+                    [{'cluster_id': 'plan-cluster', 'machine_id': 'plan-machine'}])
+    finally:
+        db.set_trace_callback(None)
+    assert '200' == res['__status_code']
+
+    # the target machines are found by the primary key (the autoindex of a rowid
+    # table), not by a scan of all machines
+    sql = [s for s in sql_list if 'FROM machines' in s][-1]
+    plan = [r[3] for r in db.execute('EXPLAIN QUERY PLAN ' + sql)]
+    assert ['SEARCH machines USING INDEX sqlite_autoindex_machines_1 (cluster_id=? AND machine_id=?)'] == plan